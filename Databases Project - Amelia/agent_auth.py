@@ -0,0 +1,106 @@
+# agent_auth.py : grant and revoke booking agent authorizations in bulk
+#
+# Agents and existing authorizations are resolved with IN queries, a batch
+# of emails at a time, and the changes are written with multi-row
+# INSERT IGNORE / DELETE in one transaction. Every email gets a result.
+
+import re
+
+# per-email results
+AUTHORIZED = "authorized"
+ALREADY_AUTHORIZED = "already authorized"
+REVOKED = "revoked"
+NOT_AUTHORIZED = "not authorized"
+NO_SUCH_AGENT = "no such agent"
+INVALID_EMAIL = "invalid email"
+
+
+def split_emails(text):
+    """Emails from free text separated by commas, semicolons or whitespace."""
+    return [e for e in re.split(r"[\s,;]+", text or "") if e]
+
+
+def authorize_agents(conn, airline_name, emails, batch_size=500):
+    """Authorize each agent for airline_name; returns [{"email", "result"}]."""
+    return _apply(conn, airline_name, emails, batch_size, _authorize_batch)
+
+
+def revoke_agents(conn, airline_name, emails, batch_size=500):
+    """Withdraw each agent's authorization; returns [{"email", "result"}]."""
+    return _apply(conn, airline_name, emails, batch_size, _revoke_batch)
+
+
+def _apply(conn, airline_name, emails, batch_size, apply_batch):
+    # one result per distinct email (MySQL compares them case-insensitively)
+    results = {}
+    valid = []
+    for email in emails:
+        email = (email or "").strip()
+        key = email.lower()
+        if key in results:
+            continue
+        if "@" not in email:
+            results[key] = {"email": email, "result": INVALID_EMAIL}
+            continue
+        results[key] = {"email": email, "result": None}
+        valid.append(email)
+
+    if valid:
+        conn.begin()
+        try:
+            with conn.cursor() as cur:
+                for i in range(0, len(valid), batch_size):
+                    batch = valid[i:i + batch_size]
+                    for email, result in apply_batch(cur, airline_name, batch):
+                        results[email.lower()]["result"] = result
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return list(results.values())
+
+
+def _authorize_batch(cur, airline_name, emails):
+    agents, authorized = _lookup(cur, airline_name, emails)
+    new = [e for e in emails if e.lower() in agents and e.lower() not in authorized]
+    if new:
+        cur.execute(
+            "INSERT IGNORE INTO agent_airline_authorization (agent_email, airline_name) VALUES "
+            + ",".join(["(%s,%s)"] * len(new)),
+            [value for e in new for value in (agents[e.lower()], airline_name)],
+        )
+    return [(e, _result(e, agents, authorized, ALREADY_AUTHORIZED, AUTHORIZED))
+            for e in emails]
+
+
+def _revoke_batch(cur, airline_name, emails):
+    agents, authorized = _lookup(cur, airline_name, emails)
+    if authorized:
+        cur.execute("""
+            DELETE FROM agent_airline_authorization
+            WHERE airline_name = %s AND agent_email IN %s
+        """, (airline_name, tuple(authorized.values())))
+    return [(e, _result(e, agents, authorized, REVOKED, NOT_AUTHORIZED))
+            for e in emails]
+
+
+def _result(email, agents, authorized, if_authorized, otherwise):
+    if email.lower() not in agents:
+        return NO_SUCH_AGENT
+    return if_authorized if email.lower() in authorized else otherwise
+
+
+def _lookup(cur, airline_name, emails):
+    """({lowercased: stored email} of agents, same for those already
+    authorized for airline_name)."""
+    cur.execute("SELECT email FROM booking_agent WHERE email IN %s", (tuple(emails),))
+    agents = {row["email"].lower(): row["email"] for row in cur.fetchall()}
+
+    cur.execute("""
+        SELECT agent_email FROM agent_airline_authorization
+        WHERE airline_name = %s AND agent_email IN %s
+        FOR UPDATE
+    """, (airline_name, tuple(emails)))
+    authorized = {row["agent_email"].lower(): row["agent_email"] for row in cur.fetchall()}
+    return agents, authorized
@@ -136,4 +136,156 @@ ALTER TABLE `purchases` ADD COLUMN `purchase_price` decimal(10,0) NOT NULL;
 
 ALTER TABLE `customer` CHANGE `password` `password_hash` VARCHAR(255);
 
-ALTER TABLE `staff` ADD COLUMN `staff_reg_hash` VARCHAR(255) NOT NULL;
\ No newline at end of file
+ALTER TABLE `staff` ADD COLUMN `staff_reg_hash` VARCHAR(255) NOT NULL;
+
+-- ticket id sequence, reserved in blocks by ticket_ids.py
+CREATE TABLE `ticket_sequence` (
+    `name` varchar(30) NOT NULL,
+    `next_id` int(11) NOT NULL,
+    PRIMARY KEY(`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+INSERT INTO `ticket_sequence` (`name`, `next_id`)
+SELECT 'ticket', COALESCE(MAX(`ticket_id`), 0) + 1 FROM `ticket`;
+
+-- seat counters per flight and seat class, kept by reservations.py
+CREATE TABLE `seat_inventory` (
+    `airline_name` varchar(50) NOT NULL,
+    `flight_num` int(11) NOT NULL,
+    `seat_class_id` int(11) NOT NULL,
+    `airplane_id` int(11) NOT NULL,
+    `seat_capacity` int(11) NOT NULL,
+    `seats_sold` int(11) NOT NULL DEFAULT 0,
+    `seats_remaining` int(11) AS (`seat_capacity` - `seats_sold`) STORED,
+    PRIMARY KEY(`airline_name`, `flight_num`, `seat_class_id`),
+    FOREIGN KEY(`airline_name`, `flight_num`) REFERENCES `flight`(`airline_name`,`flight_num`),
+    FOREIGN KEY(`airline_name`, `airplane_id`, `seat_class_id`)
+    REFERENCES `seat_class`(`airline_name`, `airplane_id`, `seat_class_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+-- backfill from existing tickets (same query as `flask rebuild-seat-inventory`)
+INSERT INTO `seat_inventory`
+(`airline_name`, `flight_num`, `seat_class_id`, `airplane_id`, `seat_capacity`, `seats_sold`)
+SELECT f.`airline_name`, f.`flight_num`, sc.`seat_class_id`, f.`airplane_id`, sc.`seat_capacity`,
+       (SELECT COUNT(*) FROM `ticket` t
+        WHERE t.`airline_name` = f.`airline_name`
+          AND t.`flight_num` = f.`flight_num`
+          AND t.`seat_class_id` = sc.`seat_class_id`)
+FROM `flight` f
+JOIN `seat_class` sc ON sc.`airline_name` = f.`airline_name`
+                    AND sc.`airplane_id` = f.`airplane_id`;
+
+-- search indexes (EXPLAIN before/after: bench/explain_search.py)
+-- public / customer search: status + route, then the departure_time range
+CREATE INDEX `idx_flight_status_route_time`
+    ON `flight` (`status`, `departure_airport`, `arrival_airport`, `departure_time`);
+-- searches by date only, and the upcoming-flight lists
+CREATE INDEX `idx_flight_status_time` ON `flight` (`status`, `departure_time`);
+-- staff dashboard: one airline's flights in a date range
+CREATE INDEX `idx_flight_airline_time` ON `flight` (`airline_name`, `departure_time`);
+-- city filters on the public search
+CREATE INDEX `idx_airport_city` ON `airport` (`airport_city`, `airport_name`);
+-- spending and commission windows, covering purchase_price
+CREATE INDEX `idx_purchases_customer_date`
+    ON `purchases` (`customer_email`, `purchase_date`, `purchase_price`);
+CREATE INDEX `idx_purchases_agent_date`
+    ON `purchases` (`booking_agent_email`, `purchase_date`, `purchase_price`);
+
+-- daily ticket sales per airline / agent / destination / seat class, kept by
+-- reservations.py and read by the staff analytics pages (sales_rollup.py)
+-- agent_email is '' for direct customer purchases
+CREATE TABLE `daily_sales` (
+    `airline_name` varchar(50) NOT NULL,
+    `sale_date` date NOT NULL,
+    `agent_email` varchar(50) NOT NULL DEFAULT '',
+    `arrival_airport` varchar(50) NOT NULL,
+    `seat_class_id` int(11) NOT NULL,
+    `tickets` int(11) NOT NULL DEFAULT 0,
+    `revenue` decimal(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY(`airline_name`, `sale_date`, `agent_email`, `arrival_airport`, `seat_class_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+-- backfill from existing purchases (same query as `flask rebuild-daily-sales`)
+INSERT INTO `daily_sales`
+(`airline_name`, `sale_date`, `agent_email`, `arrival_airport`, `seat_class_id`, `tickets`, `revenue`)
+SELECT t.`airline_name`, p.`purchase_date`, COALESCE(p.`booking_agent_email`, ''),
+       f.`arrival_airport`, t.`seat_class_id`, COUNT(*), SUM(p.`purchase_price`)
+FROM `purchases` p
+JOIN `ticket` t ON t.`ticket_id` = p.`ticket_id`
+JOIN `flight` f ON f.`airline_name` = t.`airline_name`
+               AND f.`flight_num` = t.`flight_num`
+GROUP BY t.`airline_name`, p.`purchase_date`, COALESCE(p.`booking_agent_email`, ''),
+         f.`arrival_airport`, t.`seat_class_id`;
+
+-- spending per customer and calendar month (month = first day), kept by
+-- reservations.py and read by the customer dashboard (customer_spending.py)
+CREATE TABLE `customer_monthly_spend` (
+    `customer_email` varchar(50) NOT NULL,
+    `month` date NOT NULL,
+    `tickets` int(11) NOT NULL DEFAULT 0,
+    `total` decimal(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY(`customer_email`, `month`),
+    FOREIGN KEY(`customer_email`) REFERENCES `customer`(`email`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+-- backfill from existing purchases (same query as `flask rebuild-customer-spending`)
+INSERT INTO `customer_monthly_spend` (`customer_email`, `month`, `tickets`, `total`)
+SELECT `customer_email`, DATE_FORMAT(`purchase_date`, '%Y-%m-01'),
+       COUNT(*), SUM(`purchase_price`)
+FROM `purchases`
+GROUP BY `customer_email`, DATE_FORMAT(`purchase_date`, '%Y-%m-01');
+
+-- booking agent commission ledger, one row per agent sale, and its daily
+-- rollups; kept by reservations.py, read by the agent dashboard
+-- (commission_ledger.py). The backfill uses AGENT_COMMISSION_RATE = 0.1.
+CREATE TABLE `agent_commission` (
+    `ticket_id` int(11) NOT NULL,
+    `agent_email` varchar(50) NOT NULL,
+    `customer_email` varchar(50) NOT NULL,
+    `airline_name` varchar(50) NOT NULL,
+    `sale_date` date NOT NULL,
+    `purchase_price` decimal(10,2) NOT NULL,
+    `commission` decimal(10,2) NOT NULL,
+    PRIMARY KEY(`ticket_id`),
+    KEY `idx_agent_commission_agent_date` (`agent_email`, `sale_date`),
+    FOREIGN KEY(`ticket_id`) REFERENCES `ticket`(`ticket_id`),
+    FOREIGN KEY(`agent_email`) REFERENCES `booking_agent`(`email`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+CREATE TABLE `agent_daily_commission` (
+    `agent_email` varchar(50) NOT NULL,
+    `sale_date` date NOT NULL,
+    `tickets` int(11) NOT NULL DEFAULT 0,
+    `commission` decimal(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY(`agent_email`, `sale_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+CREATE TABLE `agent_customer_commission` (
+    `agent_email` varchar(50) NOT NULL,
+    `sale_date` date NOT NULL,
+    `customer_email` varchar(50) NOT NULL,
+    `tickets` int(11) NOT NULL DEFAULT 0,
+    `commission` decimal(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY(`agent_email`, `sale_date`, `customer_email`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+-- backfill (same queries as `flask rebuild-commissions`)
+INSERT INTO `agent_commission`
+(`ticket_id`, `agent_email`, `customer_email`, `airline_name`, `sale_date`,
+ `purchase_price`, `commission`)
+SELECT p.`ticket_id`, p.`booking_agent_email`, p.`customer_email`, t.`airline_name`,
+       p.`purchase_date`, p.`purchase_price`, ROUND(p.`purchase_price` * 0.1, 2)
+FROM `purchases` p
+JOIN `ticket` t ON t.`ticket_id` = p.`ticket_id`
+WHERE p.`booking_agent_email` IS NOT NULL;
+
+INSERT INTO `agent_daily_commission` (`agent_email`, `sale_date`, `tickets`, `commission`)
+SELECT `agent_email`, `sale_date`, COUNT(*), SUM(`commission`)
+FROM `agent_commission`
+GROUP BY `agent_email`, `sale_date`;
+
+INSERT INTO `agent_customer_commission`
+(`agent_email`, `sale_date`, `customer_email`, `tickets`, `commission`)
+SELECT `agent_email`, `sale_date`, `customer_email`, COUNT(*), SUM(`commission`)
+FROM `agent_commission`
+GROUP BY `agent_email`, `sale_date`, `customer_email`;
@@ -0,0 +1,186 @@
+# api.py : pieces of the JSON API under /api/v1 (the routes are in app.py)
+#
+# Responses are compact JSON, encoded with orjson when it is installed and
+# with the standard library otherwise. ?fields=a,b trims each flight to the
+# fields a client reads; "seats", only sent when asked for, adds the seats
+# left per class, read from seat_inventory for the flights of the response. Lists page with the
+# keyset cursors of flight_search.py, and lookup_queries() fetches many
+# (airline, flight_num) keys in one round trip.
+
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Response
+
+from fleet_loader import STANDARD_CLASSES
+from flight_status import flight_key
+from inventory import SEATS_REMAINING_SQL
+from queries import Query
+
+try:
+    import orjson
+except ImportError:     # optional, only makes encoding faster
+    orjson = None
+
+# fields a flight can be trimmed to, in response order
+FLIGHT_FIELDS = (
+    "airline_name", "flight_num", "departure_airport", "dep_city",
+    "departure_time", "arrival_airport", "arr_city", "arrival_time",
+    "base_price", "status", "airplane_id", "seats_remaining", "seats",
+)
+
+# without ?fields=: everything but "seats", which costs a query of its own
+DEFAULT_FIELDS = FLIGHT_FIELDS[:-1]
+
+# flights with their cities (and seats left, when asked for) by primary key
+LOOKUP_SQL = """
+    SELECT f.*,
+           dep.airport_city AS dep_city,
+           arr.airport_city AS arr_city{}
+    FROM flight f
+    JOIN airport dep ON f.departure_airport = dep.airport_name
+    JOIN airport arr ON f.arrival_airport = arr.airport_name
+    WHERE (f.airline_name, f.flight_num) IN ({{}})
+"""
+
+# seats left and ticket price per seat class
+SEATS_SQL = """
+    SELECT si.airline_name, si.flight_num, si.seat_class_id,
+           si.seat_capacity, si.seats_remaining,
+           f.base_price * sc.multiplier AS price
+    FROM seat_inventory si
+    JOIN flight f ON f.airline_name = si.airline_name
+                 AND f.flight_num = si.flight_num
+    JOIN seat_class sc ON sc.airline_name = si.airline_name
+                      AND sc.airplane_id = si.airplane_id
+                      AND sc.seat_class_id = si.seat_class_id
+    WHERE (si.airline_name, si.flight_num) IN ({})
+    ORDER BY si.airline_name, si.flight_num, si.seat_class_id
+"""
+
+
+class ApiError(Exception):
+    """A bad API request; answered with {"error": message} and `status`."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_response(obj, status=200):
+    return Response(dumps(obj), status=status, mimetype="application/json")
+
+
+def parse_fields(value):
+    """Fields named by ?fields= (a comma-separated string or a list);
+    DEFAULT_FIELDS when empty."""
+    if not value:
+        return DEFAULT_FIELDS
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = [f.strip() for f in value if isinstance(f, str) and f.strip()]
+    unknown = [f for f in fields if f not in FLIGHT_FIELDS]
+    if unknown or not fields:
+        raise ApiError("unknown fields: " + ", ".join(unknown or map(str, value)))
+    return fields
+
+
+def project(rows, fields):
+    """Rows trimmed to `fields`; fields a search does not select are left out."""
+    return [{f: row[f] for f in fields if f in row} for row in rows]
+
+
+def parse_keys(items, limit):
+    """{(airline, flight_num): item as sent} from a batch lookup of
+    "Airline:123" strings, [airline, num] pairs or {"airline_name",
+    "flight_num"} objects. Duplicates are dropped; the order is kept."""
+    if not isinstance(items, list) or not items:
+        raise ApiError("flights must be a non-empty list")
+    if len(items) > limit:
+        raise ApiError(f"at most {limit} flights per lookup")
+    keys = {}
+    for item in items:
+        if isinstance(item, str):
+            airline, _, number = item.rpartition(":")
+        elif isinstance(item, dict):
+            airline, number = item.get("airline_name"), item.get("flight_num")
+        elif isinstance(item, list) and len(item) == 2:
+            airline, number = item
+        else:
+            raise ApiError(f"bad flight key: {item!r}")
+        try:
+            if not isinstance(airline, str) or not airline or isinstance(number, bool):
+                raise ValueError
+            key = flight_key(airline, number)
+        except (TypeError, ValueError):
+            raise ApiError(f"bad flight key: {item!r}") from None
+        keys.setdefault(key, item)
+    return keys
+
+
+def lookup_queries(keys, fields):
+    """{name: Query} for the flights with these keys and, when `fields` has
+    "seats", their seats per class; the queries are independent."""
+    seats_remaining = ""
+    if "seats_remaining" in fields:
+        seats_remaining = ",\n" + SEATS_REMAINING_SQL + " AS seats_remaining"
+    queries = {"flights": _by_keys(LOOKUP_SQL.format(seats_remaining), keys)}
+    if "seats" in fields:
+        queries["seats"] = seats_query(keys)
+    return queries
+
+
+def seats_query(keys):
+    return _by_keys(SEATS_SQL, keys)
+
+
+def _by_keys(sql, keys):
+    keys = list(keys)
+    return Query(sql.format(", ".join(["(%s, %s)"] * len(keys))),
+                 [v for key in keys for v in key])
+
+
+def with_seats(rows, seat_rows):
+    """Copies of rows with "seats": [{seat_class_id, class_name,
+    seats_remaining, seat_capacity, price}, ...]."""
+    classes = {}
+    for s in seat_rows:
+        classes.setdefault(flight_key(s["airline_name"], s["flight_num"]), []).append({
+            "seat_class_id": s["seat_class_id"],
+            "class_name": STANDARD_CLASSES.get(s["seat_class_id"], (None,))[0],
+            "seats_remaining": s["seats_remaining"],
+            "seat_capacity": s["seat_capacity"],
+            "price": s["price"],
+        })
+    return [dict(row, seats=classes.get(flight_key(row["airline_name"], row["flight_num"]), []))
+            for row in rows]
+
+
+def lookup_result(keys, results, fields):
+    """{"flights": [...], "missing": [keys as sent, ...]} in the order of
+    `keys` (from parse_keys), from the results of lookup_queries(keys, ..)."""
+    rows = {flight_key(r["airline_name"], r["flight_num"]): r for r in results["flights"]}
+    found = [rows[key] for key in keys if key in rows]
+    if "seats" in results:
+        found = with_seats(found, results["seats"])
+    return {
+        "flights": project(found, fields),
+        "missing": [sent for key, sent in keys.items() if key not in rows],
+    }
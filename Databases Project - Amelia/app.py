@@ -2,41 +2,87 @@
 
 from flask import (
     Flask, render_template, request,
-    redirect, url_for, session, flash
+    redirect, url_for, session, flash, jsonify
 )
-import pymysql
-from datetime import datetime, timedelta
+import click
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from config import DB_CONFIG, SECRET_KEY
+from config import (
+    SECRET_KEY, TICKET_ID_BLOCK_SIZE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE,
+    SEARCH_CACHE, REFERENCE_DATA_MAX_AGE, AGENT_COMMISSION_RATE,
+    EXPORT_FETCH_SIZE, EXPORT_CHUNK_BYTES, EXPORT_NET_WRITE_TIMEOUT, FLIGHT_EVENTS,
+    SQL_PROFILING, FRAGMENT_CACHE, API, DB_POOL_RETRY_AFTER
+)
+from db import PoolTimeout, db_connection, db_pool, get_db_connection
+from ticket_ids import TicketIdAllocator
+from reservations import ReservationError, reserve_seat
+from inventory import create_inventory, rebuild_inventory
+from flight_search import (
+    EARLIEST_DAY, LATEST_DAY, build_search, page_query, page_result,
+    search_flights, search_page
+)
+from schedule_import import (
+    ScheduleFormatError, import_schedule, json_rows, parse_schedule
+)
+from fleet_loader import (
+    STANDARD_CLASSES, FleetFormatError, json_fleet, load_fleet, parse_fleet
+)
+from agent_auth import authorize_agents, revoke_agents, split_emails
+from flight_status import (
+    INVALID, NOT_FOUND, BusFull, FlightEventBus, flight_key, sse_stream,
+    update_statuses
+)
+from api import (
+    ApiError, json_response, lookup_queries, lookup_result, parse_fields,
+    parse_keys, project, seats_query, with_seats
+)
+from exports import FORMATS as EXPORT_FORMATS, RowStream, export_response
+from result_cache import ResultCache, make_backend
+from fragment_cache import DataVersions, FragmentCache, FragmentCacheExtension
+from reference_data import ReferenceData
+from sales_rollup import months_before, rebuild_daily_sales
+from customer_spending import (
+    parse_date_range, rebuild_customer_spending, spending_queries, spending_summary
+)
+from queries import Query, QueryTimeout, run_concurrently, run_query
+from commission_ledger import rebuild_commissions
+import agent_auth
+import commission_ledger
+import reservations
+import sales_rollup
+import sql_profiling
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'user': 'root',
-    'password': '',         
-    'port': 3306,
-    'database': 'air_reservation',
-    'charset': 'utf8mb4'
-}
-
-
-
-# DB Connection
-
-def get_db_connection():
-    return pymysql.connect(
-        host=DB_CONFIG['host'],
-        user=DB_CONFIG['user'],
-        password=DB_CONFIG['password'],
-        port=DB_CONFIG['port'],
-        db=DB_CONFIG['database'],
-        charset=DB_CONFIG['charset'],
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=True
-    )
+ticket_ids = TicketIdAllocator(get_db_connection, block_size=TICKET_ID_BLOCK_SIZE)
+
+# airlines, airports, airplanes and seat classes; refresh() after writing them
+reference = ReferenceData(db_pool, max_age=REFERENCE_DATA_MAX_AGE)
+reference.warm(get_db_connection)
+
+# flight status changes, fanned out to /events/flights subscribers
+flight_events = FlightEventBus(history=FLIGHT_EVENTS["history"],
+                               max_queue=FLIGHT_EVENTS["max_queue"],
+                               max_subscribers=FLIGHT_EVENTS["max_streams"])
+
+
+# SQL profiling: statements are counted against the request's endpoint
+if SQL_PROFILING["enabled"]:
+    @app.before_request
+    def begin_sql_profile():
+        sql_profiling.begin_request(request.endpoint)
+
+    @app.after_request
+    def sql_profile_header(response):
+        profile = sql_profiling.end_request()
+        if profile is not None and SQL_PROFILING["header"]:
+            response.headers["X-DB-Queries"] = str(profile.queries)
+            response.headers["X-DB-Time-Ms"] = f"{profile.seconds * 1000:.1f}"
+        return response
 
 
 # Login require decorator
@@ -58,6 +104,179 @@ def login_required(role=None):
     return decorator
 
 
+# Keyset pagination: ?after=<cursor> / ?before=<cursor> and ?page_size=
+def page_args():
+    page_size = request.args.get("page_size", type=int) or DEFAULT_PAGE_SIZE
+    return {
+        "after": request.args.get("after"),
+        "before": request.args.get("before"),
+        "page_size": max(1, min(page_size, MAX_PAGE_SIZE)),
+    }
+
+
+def link_args(filters, page_size):
+    """Filters the user entered, carried over into the next/prev links."""
+    args = {k: v for k, v in filters.items() if v and k in request.values}
+    args["page_size"] = page_size
+    return args
+
+
+# Read-heavy pages are split into a plan, ({name: Query}, render), so the
+# same page can be served here or by the async server in asgi.py. Their
+# queries are independent, so they run side by side on pooled connections.
+def run_page(plan):
+    queries, render = plan
+    results = {}
+    if queries:
+        results = run_concurrently(db_pool, queries)
+    return render(results)
+
+
+@app.errorhandler(QueryTimeout)
+def query_timeout(e):
+    app.logger.warning("%s: %s", request.path, e)
+    return "This page is taking too long to load. Please try again shortly.", 503
+
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    # every connection stayed busy for checkout_timeout: the server is
+    # overloaded, so ask the client to come back rather than fail
+    app.logger.warning("%s: %s", request.path, e)
+    return ("The site is busy right now. Please try again shortly.", 503,
+            {"Retry-After": str(DB_POOL_RETRY_AFTER)})
+
+
+
+# Public search cache, invalidated per route (origin, destination).
+# A search without an airport filter uses "*" and is invalidated by any
+# change on a matching route.
+search_cache = ResultCache(make_backend(SEARCH_CACHE), ttl=SEARCH_CACHE["ttl"],
+                           namespace="search")
+
+
+def search_route_scope(origin, destination):
+    return "route:{}:{}".format(
+        (origin or "*").strip().lower(), (destination or "*").strip().lower()
+    )
+
+
+def invalidate_search_route(origin, destination):
+    search_cache.invalidate(*(
+        search_route_scope(o, d)
+        for o in (origin, None) for d in (destination, None)
+    ))
+
+
+# Rendered fragments (fragment_cache.py). The search results panel is kept
+# next to its cached page and shares its invalidation; the staff pages key
+# theirs on data versions:
+#   flights:<airline>  the airline's flights (created, imported, status)
+#   sales:<airline>    its sales rollups (every purchase)
+#   sales              all airlines' rollups (a full rebuild)
+#   flights            every airline's flights
+app.jinja_env.add_extension(FragmentCacheExtension)
+search_fragments = FragmentCache(search_cache)
+fragment_backend = make_backend(FRAGMENT_CACHE)
+data_versions = DataVersions(fragment_backend)
+fragments = FragmentCache(ResultCache(fragment_backend, ttl=FRAGMENT_CACHE["ttl"],
+                                      namespace="fragment"))
+
+
+def flights_version(airline_name):
+    return "flights:" + airline_name.lower()
+
+
+def sales_version(airline_name):
+    return "sales:" + airline_name.lower()
+
+
+def flights_changed(airline_name, routes):
+    """After writing flights: drop the cached searches on their routes and
+    move the airline's flight version on."""
+    for route in routes:
+        invalidate_search_route(*route)
+    data_versions.bump("flights", flights_version(airline_name))
+
+
+def versions_window():
+    """Number of the current FRAGMENT_CACHE["ttl"] window.
+
+    Version counters are only seen by other workers when the backend is
+    shared, so ETags built on them also carry the window: a write made in
+    another worker reaches this one's pages within ttl seconds, as its
+    cached fragments do.
+    """
+    return int(time.time()) // FRAGMENT_CACHE["ttl"]
+
+
+# Conditional GET: a view builds an ETag from cheap fingerprints of the data
+# it shows (data versions, cache generations, an index-only read) and gets a
+# 304 before its queries run. Never for a page that is about to show a
+# flashed message, which the browser's copy would then show again.
+#
+# The schema keeps no update times, so Last-Modified is the time the ETag
+# was first served, kept next to the data versions for as long as a
+# version window lasts (an ETag never outlives one). If-None-Match wins
+# when both are sent; If-Modified-Since is for clients that only keep
+# dates, with the one-second resolution of HTTP dates.
+PRIVATE = "private, no-cache"
+
+
+def etag_allowed():
+    return request.method == "GET" and "_flashes" not in session
+
+
+def page_etag(*parts):
+    if not etag_allowed():
+        return None
+    raw = repr((request.full_path, session.get("user_id")) + parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(etag, cache_control=PRIVATE):
+    """304 response when the browser already holds this version, else None."""
+    if etag is None:
+        return None
+    served = data_versions.served(etag)
+    if request.if_none_match:
+        if etag not in request.if_none_match:
+            return None
+    else:
+        since = request.if_modified_since
+        if since is None or served is None or served > since.timestamp():
+            return None
+    return _validated(app.response_class(status=304), etag, cache_control, served)
+
+
+def with_etag(body, etag, cache_control=PRIVATE):
+    response = app.make_response(body)
+    if etag is not None:
+        served = data_versions.first_served(etag, FRAGMENT_CACHE["ttl"])
+        _validated(response, etag, cache_control, served)
+    return response
+
+
+def _validated(response, etag, cache_control, served=None):
+    response.set_etag(etag)
+    if served is not None:
+        response.last_modified = datetime.fromtimestamp(served, timezone.utc)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def purchases_fingerprint(conn, column, email):
+    """(count, last ticket id) of one customer's or agent's purchases, which
+    are only ever inserted; an index-only read of idx_purchases_*_date."""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT COUNT(*) AS n, MAX(ticket_id) AS last_ticket
+            FROM purchases
+            WHERE {column} = %s
+        """, (email,))
+        row = cur.fetchone()
+    return row["n"], row["last_ticket"]
+
 
 #Public Routes
 @app.route("/")
@@ -68,78 +287,76 @@ def home():
 @app.route("/search", methods=["GET", "POST"])
 def public_search_page():
     """Public search for upcoming or in-progress flights."""
-    flights = []
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            sql = """
-                SELECT f.*, 
-                       dep.airport_city AS dep_city,
-                       arr.airport_city AS arr_city
-                FROM flight f
-                JOIN airport dep ON f.departure_airport = dep.airport_name
-                JOIN airport arr ON f.arrival_airport = arr.airport_name
-                WHERE 1=1
-            """
-            params = []
-
-            # get filters
-            status = request.form.get("status")
-            origin = request.form.get("origin")
-            destination = request.form.get("destination")
-            date = request.form.get("date")
-            dep_city = request.form.get("dep_city")
-            arr_city = request.form.get("arr_city")
-            airline_name = request.form.get("airline_name")
-            flight_num = request.form.get("flight_num")
-
-            # Status filter logic
-            if status:
-                sql += " AND status = %s"
-                params.append(status)
-            else:
-                # Default: show both upcoming + in-progress
-                sql += " AND status IN ('upcoming', 'in-progress')"
-
-            # Other filters
-            if airline_name:
-                sql += " AND f.airline_name = %s"
-                params.append(airline_name)
-
-            # flight number filter
-            if flight_num:
-                sql += " AND f.flight_num = %s"
-                params.append(flight_num)
-
-            # airport filters
-            if origin:
-                sql += " AND f.departure_airport = %s"
-                params.append(origin)
-            if destination:
-                sql += " AND f.arrival_airport = %s"
-                params.append(destination)
-
-            # city filters (using JOINed airport tables)
-            if dep_city:
-                sql += " AND dep.airport_city = %s"
-                params.append(dep_city)
-            if arr_city:
-                sql += " AND arr.airport_city = %s"
-                params.append(arr_city)
-
-            # date filter
-            if date:
-                sql += " AND DATE(f.departure_time) = %s"
-                params.append(date)
-
-            sql += " ORDER BY f.departure_time"
-
-            cur.execute(sql, params)
-            flights = cur.fetchall()
-    finally:
-        conn.close()
-
-    return render_template("search_page.html", flights=flights)
+    return run_page(public_search_plan())
+
+
+def public_search_args():
+    """(filters, paging, cache scope, cache key) of a public search."""
+    # default status: both upcoming + in-progress (see flight_search.py);
+    # values are stripped once, so the query and the cache key agree
+    filters = {
+        name: (request.values.get(name) or "").strip() or None
+        for name in ("status", "airline_name", "flight_num", "origin",
+                     "destination", "dep_city", "arr_city", "date")
+    }
+    paging = page_args()
+
+    # anonymous traffic repeats the same searches: serve them from the cache.
+    # Filters compare case-insensitively in MySQL, cursors are case-sensitive.
+    key = tuple(sorted(
+        [(k, (v or "").lower()) for k, v in filters.items()]
+        + [(k, str(v or "")) for k, v in paging.items()]
+    ))
+    scope = search_route_scope(filters["origin"], filters["destination"])
+    return filters, paging, scope, key
+
+
+def search_validators(scope, key):
+    """(ETag, Cache-Control) of a public search.
+
+    Anonymous searches may be kept by the browser or a shared cache for
+    what is left of the search cache's window; the ETag moves with the
+    window and with the route's invalidations, so no query runs for a 304.
+    """
+    window, age = divmod(int(time.time()), search_cache.ttl)
+    etag = page_etag(key, search_cache.generation(scope), window)
+    cache_control = (PRIVATE if session.get("user_id")
+                     else f"public, max-age={search_cache.ttl - age}")
+    return etag, cache_control
+
+
+def public_search_plan():
+    filters, paging, scope, key = public_search_args()
+    etag, cache_control = search_validators(scope, key)
+    cached = not_modified(etag, cache_control)
+    if cached is not None:
+        return {}, lambda results: cached
+
+    # the rendered results panel first, then the page's rows
+    fragment = search_fragments.lookup(scope, key + (("fragment", "results"),))
+    page = None
+    queries = {}
+    if fragment.html is None:
+        page_key = search_cache.key(scope, key)
+        page = search_cache.get(page_key)
+        if page is None:
+            query, state = page_query("public", filters, **paging)
+            queries["page"] = query
+
+    def render(results):
+        nonlocal page
+        if "page" in results:
+            page = page_result(results["page"], state)
+            search_cache.set(page_key, page)
+        return with_etag(render_template(
+            "search_page.html",
+            flights=page["rows"] if page else None,
+            page=page,
+            page_link_args=link_args(filters, paging["page_size"]),
+            fragment=fragment,
+        ), etag, cache_control)
+
+    return queries, render
 
 
 # Registration
@@ -160,8 +377,7 @@ def register_customer():
             flash("Email, name, and password are required.")
             return redirect(url_for("register_customer"))
 
-        conn = get_db_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 # check existing
                 cur.execute("SELECT email FROM customer WHERE email = %s", (form["email"],))
@@ -190,8 +406,6 @@ def register_customer():
 
             flash("Customer registered. Please log in.")
             return redirect(url_for("login"))
-        finally:
-            conn.close()
 
     return render_template("register_customer.html")
 
@@ -207,8 +421,7 @@ def register_agent():
             flash("Email and password are required.")
             return redirect(url_for("register_agent"))
 
-        conn = get_db_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT email FROM booking_agent WHERE email=%s", (email,))
                 if cur.fetchone():
@@ -224,8 +437,6 @@ def register_agent():
 
             flash("Booking agent registered. Please log in.")
             return redirect(url_for("login"))
-        finally:
-            conn.close()
 
     return render_template("register_agent.html")
 
@@ -233,13 +444,7 @@ def register_agent():
 # Staff Registration
 @app.route("/register/staff", methods=["GET", "POST"])
 def register_staff():
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT airline_name FROM airline")
-            airlines = [row["airline_name"] for row in cur.fetchall()]
-    finally:
-        conn.close()
+    airlines = reference.airlines()
 
     if request.method == "POST":
         form = request.form
@@ -254,11 +459,11 @@ def register_staff():
             return redirect(url_for("register_staff"))
 
         # validate airline exists
-        if airline_name not in airlines:
+        if not reference.has_airline(airline_name):
             flash("Selected airline does not exist. Please choose from the list.")
             return redirect(url_for("register_staff"))
-        conn = get_db_connection()
-        try:
+
+        with db_connection() as conn:
             with conn.cursor() as cur:
 
                 #validate registration
@@ -310,9 +515,6 @@ def register_staff():
                 flash("Staff registered successfully. Please log in.")
                 return redirect(url_for("login"))
 
-        finally:
-            conn.close()
-
     return render_template("register_staff.html", airlines=airlines)
         
 
@@ -324,8 +526,7 @@ def login():
         identifier = request.form.get("identifier")      # email or username
         password = request.form.get("password")
 
-        conn = get_db_connection()
-        try:
+        with db_connection() as conn:
             with conn.cursor() as cur:
 
                 # customer
@@ -364,9 +565,6 @@ def login():
                         session["staff_role"] = user["role"]
                         return redirect(url_for("staff_dashboard"))
 
-        finally:
-            conn.close()
-
         flash("Invalid credentials.")
     return render_template("login.html")
 
@@ -383,144 +581,102 @@ def logout():
 @app.route("/customer", methods=["GET", "POST"])
 @login_required("customer")
 def customer_dashboard():
-    email = session["user_id"]
-    conn = get_db_connection()
-
-    flights = []
-    total_last_12 = 0
-    default_month_labels = []
-    default_month_amounts = []
-
-    custom_total = None
-    custom_month_labels = []
-    custom_month_amounts = []
-
-    def last_n_month_labels(n, today):
-        labels = []
-        year = today.year
-        month = today.month
-        for k in range(n - 1, -1, -1):
-            m = month - k
-            y = year
-            while m <= 0:
-                m += 12
-                y -= 1
-            labels.append(f"{y:04d}-{m:02d}")
-        return labels
-
-    try:
-        with conn.cursor() as cur:
-
-            # flight filtering
-            base_query = """
-                SELECT f.*
-                FROM ticket t
-                JOIN purchases p ON p.ticket_id = t.ticket_id
-                JOIN flight f ON f.airline_name = t.airline_name
-                              AND f.flight_num = t.flight_num
-                WHERE p.customer_email = %s
-            """
-            params = [email]
-
-            filtering = request.method == "POST" and request.form.get("form_type") == "flight_filter"
-
-            if filtering:
-                start = request.form.get("filter_start")
-                end = request.form.get("filter_end")
-                origin = request.form.get("filter_origin")
-                destination = request.form.get("filter_destination")
-
-                if start:
-                    base_query += " AND DATE(f.departure_time) >= %s"
-                    params.append(start)
-                if end:
-                    base_query += " AND DATE(f.departure_time) <= %s"
-                    params.append(end)
-                if origin:
-                    base_query += " AND f.departure_airport = %s"
-                    params.append(origin)
-                if destination:
-                    base_query += " AND f.arrival_airport = %s"
-                    params.append(destination)
-            else:
-                base_query += " AND f.status = 'upcoming'"  # Default view: ONLY upcoming flights
-
-            base_query += " ORDER BY f.departure_time"
-
-            cur.execute(base_query, params)
-            flights = cur.fetchall()
-
-
-            # deafult spending
-            today = datetime.today().date()
-            year_start = today - timedelta(days=365)
-            six_months_start = today - timedelta(days=180)
-
-            cur.execute("""
-                SELECT COALESCE(SUM(purchase_price), 0) AS total
-                FROM purchases
-                WHERE customer_email = %s
-                  AND purchase_date BETWEEN %s AND %s
-            """, (email, year_start, today))
-            total_last_12 = cur.fetchone()["total"]
+    return run_page(customer_dashboard_plan())
 
-            cur.execute("""
-                SELECT DATE_FORMAT(purchase_date, '%%Y-%%m') AS month,
-                       SUM(purchase_price) AS total
-                FROM purchases
-                WHERE customer_email = %s
-                  AND purchase_date BETWEEN %s AND %s
-                GROUP BY month
-                ORDER BY month
-            """, (email, six_months_start, today))
-            rows = cur.fetchall()
 
-            month_map = {row["month"]: float(row["total"]) for row in rows}
+def customer_dashboard_plan():
+    email = session["user_id"]
 
-            default_month_labels = last_n_month_labels(6, today)
-            default_month_amounts = [month_map.get(m, 0) for m in default_month_labels]
+    # flight filtering
+    base_query = """
+        SELECT f.*
+        FROM ticket t
+        JOIN purchases p ON p.ticket_id = t.ticket_id
+        JOIN flight f ON f.airline_name = t.airline_name
+                      AND f.flight_num = t.flight_num
+        WHERE p.customer_email = %s
+    """
+    params = [email]
 
+    filtering = request.method == "POST" and request.form.get("form_type") == "flight_filter"
 
-            # custome spending
-            if request.method == "POST" and request.form.get("form_type") == "custom_spending":
-                start = request.form.get("start_date")
-                end = request.form.get("end_date")
+    if filtering:
+        start = request.form.get("filter_start")
+        end = request.form.get("filter_end")
+        origin = request.form.get("filter_origin")
+        destination = request.form.get("filter_destination")
 
-                cur.execute("""
-                    SELECT COALESCE(SUM(purchase_price), 0) AS total
-                    FROM purchases
-                    WHERE customer_email = %s
-                      AND purchase_date BETWEEN %s AND %s
-                """, (email, start, end))
-                custom_total = cur.fetchone()["total"]
+        if start:
+            base_query += " AND f.departure_time >= %s"
+            params.append(start)
+        if end:
+            base_query += " AND f.departure_time < %s + INTERVAL 1 DAY"
+            params.append(end)
+        if origin:
+            base_query += " AND f.departure_airport = %s"
+            params.append(origin)
+        if destination:
+            base_query += " AND f.arrival_airport = %s"
+            params.append(destination)
+    else:
+        base_query += " AND f.status = 'upcoming'"  # Default view: ONLY upcoming flights
 
-                cur.execute("""
-                    SELECT DATE_FORMAT(purchase_date, '%%Y-%%m') AS month,
-                           SUM(purchase_price) AS total
-                    FROM purchases
-                    WHERE customer_email = %s
-                      AND purchase_date BETWEEN %s AND %s
-                    GROUP BY month
-                    ORDER BY month
-                """, (email, start, end))
-                c_rows = cur.fetchall()
-
-                custom_month_labels = [r["month"] for r in c_rows]
-                custom_month_amounts = [float(r["total"]) for r in c_rows]
-
-    finally:
-        conn.close()
+    base_query += " ORDER BY f.departure_time"
+    queries = {"flights": Query(base_query, params)}
 
-    return render_template(
-        "customer_dashboard.html",
-        flights=flights,
-        total_last_12=total_last_12,
-        default_month_labels=default_month_labels,
-        default_month_amounts=default_month_amounts,
-        custom_total=custom_total,
-        custom_month_labels=custom_month_labels,
-        custom_month_amounts=custom_month_amounts,
-    )
+    # default spending: last 12 months, and the last 6 by month
+    # (from customer_monthly_spend, see customer_spending.py)
+    today = datetime.today().date()
+    year_start = today - timedelta(days=365)
+    six_months_start = today - timedelta(days=180)
+    default_ranges = [(year_start, today), (six_months_start, today)]
+    for name, q in spending_queries(email, default_ranges).items():
+        queries["spending_" + name] = q
+
+    # custome spending
+    custom_range = None
+    if request.method == "POST" and request.form.get("form_type") == "custom_spending":
+        custom_range = parse_date_range(
+            request.form.get("start_date"), request.form.get("end_date"))
+        if custom_range is None:
+            flash("Please enter a valid date range.")
+        else:
+            custom_range = tuple(sorted(custom_range))
+            for name, q in spending_queries(email, [custom_range]).items():
+                queries["custom_" + name] = q
+
+    def render(results):
+        spending = spending_summary(default_ranges, _prefixed(results, "spending_"))
+        last_six = spending.monthly(six_months_start, today)[-6:]
+
+        custom_total = None
+        custom_month_labels = []
+        custom_month_amounts = []
+        if custom_range is not None:
+            custom = spending_summary([custom_range], _prefixed(results, "custom_"))
+            custom_total = custom.total(*custom_range)
+
+            # months with spending only
+            c_rows = [(m, a) for m, a in custom.monthly(*custom_range) if a]
+            custom_month_labels = [m for m, _ in c_rows]
+            custom_month_amounts = [a for _, a in c_rows]
+
+        return render_template(
+            "customer_dashboard.html",
+            flights=results["flights"],
+            total_last_12=spending.total(year_start, today),
+            default_month_labels=[label for label, _ in last_six],
+            default_month_amounts=[amount for _, amount in last_six],
+            custom_total=custom_total,
+            custom_month_labels=custom_month_labels,
+            custom_month_amounts=custom_month_amounts,
+        )
+
+    return queries, render
+
+
+def _prefixed(results, prefix):
+    return {k[len(prefix):]: v for k, v in results.items() if k.startswith(prefix)}
 
 
 
@@ -528,32 +684,14 @@ def customer_dashboard():
 @app.route("/customer/search_flights", methods=["POST"])
 @login_required("customer")
 def customer_search_flights():
-    origin = request.form.get("origin")
-    destination = request.form.get("destination")
-    date_str = request.form.get("date")
+    filters = {
+        "origin": request.form.get("origin"),
+        "destination": request.form.get("destination"),
+        "date": request.form.get("date"),
+    }
 
-    conn = get_db_connection()
-    flights = []
-
-    try:
-        with conn.cursor() as cur:
-            sql = "SELECT * FROM flight WHERE status = 'upcoming'"
-            params = []
-
-            if origin:
-                sql += " AND departure_airport = %s"
-                params.append(origin)
-            if destination:
-                sql += " AND arrival_airport = %s"
-                params.append(destination)
-            if date_str:
-                sql += " AND DATE(departure_time) = %s"
-                params.append(date_str)
-
-            cur.execute(sql, params)
-            flights = cur.fetchall()
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        flights = search_flights(conn, "upcoming", filters)
 
     return render_template("customer_search_results.html", flights=flights)
 
@@ -563,105 +701,24 @@ def customer_search_flights():
 @login_required("customer")
 def customer_purchase(airline_name, flight_num):
     customer_email = session["user_id"]
-    conn = get_db_connection()
 
     if request.method == "POST":
         seat_class_id = int(request.form.get("seat_class_id"))
-        today = datetime.today().date()
-
-        try:
-            with conn.cursor() as cur:
-
-                # prevent duplicate purchase for same flight
-                cur.execute("""
-                    SELECT COUNT(*) AS cnt
-                    FROM ticket t
-                    JOIN purchases p USING(ticket_id)
-                    WHERE p.customer_email = %s
-                      AND t.airline_name = %s
-                      AND t.flight_num = %s
-                """, (customer_email, airline_name, flight_num))
-                if cur.fetchone()["cnt"] > 0:
-                    flash("You already purchased a ticket for this flight.")
-                    return redirect(url_for("customer_dashboard"))
-
-                #get flight info
-                cur.execute("""
-                    SELECT airplane_id, base_price
-                    FROM flight
-                    WHERE airline_name = %s AND flight_num = %s
-                """, (airline_name, flight_num))
-                flight = cur.fetchone()
-                if not flight:
-                    flash("Flight not found.")
-                    return redirect(url_for("customer_dashboard"))
-
-                airplane_id = flight["airplane_id"]
-                base_price = flight["base_price"]
-
-                # seat class info
-                cur.execute("""
-                    SELECT seat_capacity
-                    FROM seat_class
-                    WHERE airline_name=%s
-                      AND airplane_id=%s
-                      AND seat_class_id=%s
-                """, (airline_name, airplane_id, seat_class_id))
-                sc = cur.fetchone()
-                if not sc:
-                    flash("Seat class not found.")
-                    return redirect(url_for("customer_dashboard"))
-
-                capacity = sc["seat_capacity"]
-
-                # count seats sold of that class on this flight
-                cur.execute("""
-                    SELECT COUNT(*) AS sold
-                    FROM ticket
-                    WHERE airline_name=%s
-                      AND flight_num=%s
-                      AND airplane_id=%s
-                      AND seat_class_id=%s
-                """, (airline_name, flight_num, airplane_id, seat_class_id))
-                sold = cur.fetchone()["sold"]
-
-                if sold >= capacity:
-                    flash("Sorry, no seats left in this class.")
-                    return redirect(url_for("customer_dashboard"))
-
-                # price calculation
-                multiplier = 1.0
-                if seat_class_id == 2:
-                    multiplier = 1.5
-                elif seat_class_id == 3:
-                    multiplier = 2.0
-
-                purchase_price = float(base_price) * multiplier
-
-                # generate ticket id
-                cur.execute("SELECT COALESCE(MAX(ticket_id),0) + 1 AS next_id FROM ticket")
-                ticket_id = cur.fetchone()["next_id"]
-
-                # insert ticket
-                cur.execute("""
-                    INSERT INTO ticket (ticket_id, airline_name, flight_num, airplane_id, seat_class_id)
-                    VALUES (%s,%s,%s,%s,%s)
-                """, (ticket_id, airline_name, flight_num, airplane_id, seat_class_id))
-
-                # insert purchase record
-                cur.execute("""
-                    INSERT INTO purchases (ticket_id, customer_email, purchase_date, purchase_price)
-                    VALUES (%s,%s,%s,%s)
-                """, (ticket_id, customer_email, today, purchase_price))
 
-                flash("Your ticket has been purchased!")
+        with db_connection() as conn:
+            try:
+                reserve_seat(conn, ticket_ids, airline_name, flight_num,
+                             seat_class_id, customer_email)
+            except ReservationError as e:
+                flash(str(e))
                 return redirect(url_for("customer_dashboard"))
+        data_versions.bump(sales_version(airline_name))
 
-        finally:
-            conn.close()
+        flash("Your ticket has been purchased!")
+        return redirect(url_for("customer_dashboard"))
 
     # GET → Show seat classes
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT airplane_id
@@ -675,15 +732,7 @@ def customer_purchase(airline_name, flight_num):
 
             airplane_id = flight["airplane_id"]
 
-            cur.execute("""
-                SELECT seat_class_id, seat_capacity
-                FROM seat_class
-                WHERE airline_name=%s AND airplane_id=%s
-            """, (airline_name, airplane_id))
-            seat_classes = cur.fetchall()
-
-    finally:
-        conn.close()
+    seat_classes = reference.seat_classes(airline_name, airplane_id)
 
     return render_template(
         "customer_purchase.html",
@@ -698,48 +747,32 @@ def customer_purchase(airline_name, flight_num):
 @app.route("/customer/purchased_flights", methods=["GET", "POST"])
 @login_required("customer")
 def customer_purchased_flights():
-    customer_email = session["user_id"]
-    conn = get_db_connection()
-
-    sql = """
-        SELECT f.*
-        FROM purchases p
-        JOIN ticket t ON p.ticket_id = t.ticket_id
-        JOIN flight f ON f.airline_name = t.airline_name
-                      AND f.flight_num = t.flight_num
-        WHERE p.customer_email = %s
-    """
-    params = [customer_email]
-
-    if request.method == "POST":
-        start = request.form.get("start_date")
-        end = request.form.get("end_date")
-        origin = request.form.get("origin")
-        destination = request.form.get("destination")
-
-        if start:
-            sql += " AND DATE(f.departure_time) >= %s"
-            params.append(start)
-        if end:
-            sql += " AND DATE(f.departure_time) <= %s"
-            params.append(end)
-        if origin:
-            sql += " AND f.departure_airport = %s"
-            params.append(origin)
-        if destination:
-            sql += " AND f.arrival_airport = %s"
-            params.append(destination)
-
-    sql += " ORDER BY f.departure_time DESC"
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-            flights = cur.fetchall()
-    finally:
-        conn.close()
-
-    return render_template("customer_purchased_flights.html", flights=flights)
+    filters = {
+        "customer_email": session["user_id"],
+        "start_date": request.values.get("start_date"),
+        "end_date": request.values.get("end_date"),
+        "origin": request.values.get("origin"),
+        "destination": request.values.get("destination"),
+    }
+    paging = page_args()
+
+    with db_connection() as conn:
+        # the customer's purchases plus flight status changes
+        etag = None
+        if etag_allowed():
+            etag = page_etag(purchases_fingerprint(conn, "customer_email", filters["customer_email"]),
+                             data_versions.get("flights"), versions_window())
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        page = search_page(conn, "purchased", filters, **paging)
+
+    return with_etag(render_template(
+        "customer_purchased_flights.html",
+        flights=page["rows"],
+        page=page,
+        page_link_args=link_args(filters, paging["page_size"]),
+    ), etag)
 
 
 # Agent Features
@@ -747,116 +780,45 @@ def customer_purchased_flights():
 @app.route("/agent")
 @login_required("agent")
 def agent_dashboard():
-    email = session["user_id"]
-    conn = get_db_connection()
-
-    commission_summary = {}
-    top_customers_by_tickets = []
-    top_customers_by_commission = []
+    return run_page(agent_dashboard_plan())
 
-    try:
-        with conn.cursor() as cur:
-            # Last 30 days commission
-            end = datetime.today().date()
-            start = end - timedelta(days=30)
 
-            cur.execute("""
-                SELECT COALESCE(SUM(purchase_price * 0.1),0) AS total_commission,
-                       COALESCE(AVG(purchase_price * 0.1),0) AS avg_commission,
-                       COUNT(*) AS num_tickets
-                FROM purchases
-                WHERE booking_agent_email=%s
-                  AND purchase_date BETWEEN %s AND %s
-            """, (email, start, end))
-            commission_summary = cur.fetchone()
-
-            # Top customers by tickets (last 6 months)
-            six_start = end - timedelta(days=180)
-            cur.execute("""
-                SELECT customer_email, COUNT(*) AS num_tickets
-                FROM purchases
-                WHERE booking_agent_email=%s
-                  AND purchase_date >= %s
-                GROUP BY customer_email
-                ORDER BY num_tickets DESC
-                LIMIT 5
-            """, (email, six_start))
-            top_customers_by_tickets = cur.fetchall()
-
-            # Top customers by commission (last 12 months)
-            year_start = end - timedelta(days=365)
-            cur.execute("""
-                SELECT customer_email,
-                       SUM(purchase_price * 0.1) AS total_commission
-                FROM purchases
-                WHERE booking_agent_email=%s
-                  AND purchase_date >= %s
-                GROUP BY customer_email
-                ORDER BY total_commission DESC
-                LIMIT 5
-            """, (email, year_start))
-            top_customers_by_commission = cur.fetchall()
-
-    finally:
-        conn.close()
+def agent_dashboard_plan():
+    email = session["user_id"]
 
-    return render_template(
-        "agent_dashboard.html",
-        commission_summary=commission_summary,
-        top_customers_by_tickets=top_customers_by_tickets,
-        top_customers_by_commission=top_customers_by_commission
-    )
+    # all three read the commission rollups (commission_ledger.py)
+    end = datetime.today().date()
+    queries = {
+        # Last 30 days commission
+        "commission_summary": commission_ledger.commission_summary(
+            email, end - timedelta(days=30), end),
+        # Top customers by tickets (last 6 months)
+        "top_customers_by_tickets": commission_ledger.top_customers_by_tickets(
+            email, end - timedelta(days=180)),
+        # Top customers by commission (last 12 months)
+        "top_customers_by_commission": commission_ledger.top_customers_by_commission(
+            email, end - timedelta(days=365)),
+    }
+
+    def render(results):
+        return render_template("agent_dashboard.html", **results)
+
+    return queries, render
 
 # Agent serach page for flights to sell
 @app.route("/agent/search", methods=["GET", "POST"])
 @login_required("agent")
 def agent_search():
-    email = session["user_id"]
-    conn = get_db_connection()
-
-    flights = []
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT airline_name
-                FROM agent_airline_authorization
-                WHERE agent_email = %s
-            """, (email,))
-            authorized_airlines = [row["airline_name"] for row in cur.fetchall()]
+    # only airlines the agent is authorized for (joined in the query)
+    filters = {"agent_email": session["user_id"]}
 
-            if not authorized_airlines:
-                return render_template("agent_search_page.html", flights=[])
+    if request.method == "POST":
+        filters["origin"] = request.form.get("origin")
+        filters["destination"] = request.form.get("destination")
+        filters["date"] = request.form.get("date")
 
-            sql = """
-                SELECT *
-                FROM flight
-                WHERE airline_name IN %s
-                  AND status = 'upcoming'
-            """
-            params = [tuple(authorized_airlines)]
-
-            if request.method == "POST":
-                origin = request.form.get("origin")
-                destination = request.form.get("destination")
-                date_str = request.form.get("date")
-
-                if origin:
-                    sql += " AND departure_airport = %s"
-                    params.append(origin)
-                if destination:
-                    sql += " AND arrival_airport = %s"
-                    params.append(destination)
-                if date_str:
-                    sql += " AND DATE(departure_time) = %s"
-                    params.append(date_str)
-
-            # ALWAYS execute the query
-            cur.execute(sql, params)
-            flights = cur.fetchall()
-
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        flights = search_flights(conn, "agent", filters)
 
     return render_template("agent_search_page.html", flights=flights)
 
@@ -866,82 +828,26 @@ def agent_search():
 @login_required("agent")
 def agent_purchase(airline_name, flight_num):
     agent_email = session["user_id"]
-    conn = get_db_connection()
 
     if request.method == "POST":
-        customer_email = request.form.get("customer_email")
+        customer_email = (request.form.get("customer_email") or "").strip()
         seat_class_id = int(request.form.get("seat_class_id"))
-        today = datetime.today().date()
-
-        try:
-            with conn.cursor() as cur:
-
-                # Check authorization
-                cur.execute("""
-                    SELECT 1 FROM agent_airline_authorization
-                    WHERE agent_email=%s AND airline_name=%s
-                """, (agent_email, airline_name))
-                if not cur.fetchone():
-                    flash("Not authorized for this airline.")
-                    return redirect(url_for("agent_search"))
-
-                # Flight info
-                cur.execute("""
-                    SELECT airplane_id, base_price
-                    FROM flight
-                    WHERE airline_name=%s AND flight_num=%s
-                """, (airline_name, flight_num))
-                f = cur.fetchone()
-                airplane_id = f["airplane_id"]
-                base_price = float(f["base_price"])
-
-                # Seat class info
-                cur.execute("""
-                    SELECT seat_capacity FROM seat_class
-                    WHERE airline_name=%s AND airplane_id=%s AND seat_class_id=%s
-                """, (airline_name, airplane_id, seat_class_id))
-                cap = cur.fetchone()["seat_capacity"]
 
-                cur.execute("""
-                    SELECT COUNT(*) AS sold
-                    FROM ticket
-                    WHERE airline_name=%s AND flight_num=%s
-                      AND airplane_id=%s AND seat_class_id=%s
-                """, (airline_name, flight_num, airplane_id, seat_class_id))
-                sold = cur.fetchone()["sold"]
-
-                if sold >= cap:
-                    flash("No seats left in this class.")
-                    return redirect(url_for("agent_search"))
-
-                # Pricing
-                multiplier = {1: 1.0, 2: 1.5, 3: 2.0}[seat_class_id]
-                price = base_price * multiplier
+        with db_connection() as conn:
+            try:
+                reserve_seat(conn, ticket_ids, airline_name, flight_num,
+                             seat_class_id, customer_email,
+                             agent_email=agent_email, check_duplicate=False)
+            except ReservationError as e:
+                flash(str(e))
+                return redirect(url_for("agent_search"))
+        data_versions.bump(sales_version(airline_name))
 
-                # Create ticket
-                cur.execute("SELECT COALESCE(MAX(ticket_id),0)+1 AS next FROM ticket")
-                ticket_id = cur.fetchone()["next"]
-
-                cur.execute("""
-                    INSERT INTO ticket
-                    (ticket_id, airline_name, flight_num, airplane_id, seat_class_id)
-                    VALUES (%s,%s,%s,%s,%s)
-                """, (ticket_id, airline_name, flight_num, airplane_id, seat_class_id))
-
-                cur.execute("""
-                    INSERT INTO purchases
-                    (ticket_id, customer_email, booking_agent_email, purchase_date, purchase_price)
-                    VALUES (%s,%s,%s,%s,%s)
-                """, (ticket_id, customer_email, agent_email, today, price))
-
-                flash("Ticket purchased!")
-                return redirect(url_for("agent_dashboard"))
-
-        finally:
-            conn.close()
+        flash("Ticket purchased!")
+        return redirect(url_for("agent_dashboard"))
 
     # GET → show seat classes
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT airplane_id FROM flight
@@ -950,14 +856,7 @@ def agent_purchase(airline_name, flight_num):
             f = cur.fetchone()
             airplane_id = f["airplane_id"]
 
-            cur.execute("""
-                SELECT seat_class_id, seat_capacity
-                FROM seat_class
-                WHERE airline_name=%s AND airplane_id=%s
-            """, (airline_name, airplane_id))
-            seat_classes = cur.fetchall()
-    finally:
-        conn.close()
+    seat_classes = reference.seat_classes(airline_name, airplane_id)
 
     return render_template("purchase_agent.html",
                            airline_name=airline_name,
@@ -969,72 +868,46 @@ def agent_purchase(airline_name, flight_num):
 @app.route("/agent/bookings", methods=["GET", "POST"])
 @login_required("agent")
 def agent_view_bookings():
-    agent_email = session["user_id"]
-    conn = get_db_connection()
-    flights = []
-
-    try:
-        with conn.cursor() as cur:
-            sql = """
-                SELECT f.*, p.customer_email
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                JOIN flight f ON f.airline_name = t.airline_name
-                              AND f.flight_num = t.flight_num
-                WHERE p.booking_agent_email = %s
-            """
-            params = [agent_email]
-
-            # Filters
-            customer = request.form.get("customer_email")
-            origin = request.form.get("origin")
-            destination = request.form.get("destination")
-            start = request.form.get("start_date")
-            end = request.form.get("end_date")
-
-            if customer:
-                sql += " AND p.customer_email = %s"
-                params.append(customer)
-
-            if origin:
-                sql += " AND f.departure_airport = %s"
-                params.append(origin)
-
-            if destination:
-                sql += " AND f.arrival_airport = %s"
-                params.append(destination)
-
-            if start:
-                sql += " AND DATE(f.departure_time) >= %s"
-                params.append(start)
-
-            if end:
-                sql += " AND DATE(f.departure_time) <= %s"
-                params.append(end)
-
-            sql += " ORDER BY f.departure_time DESC"
-
-            cur.execute(sql, params)
-            flights = cur.fetchall()
-
-    finally:
-        conn.close()
-
-    return render_template("agent_view_bookings.html", flights=flights)
+    filters = {
+        "agent_email": session["user_id"],
+        "customer_email": request.values.get("customer_email"),
+        "origin": request.values.get("origin"),
+        "destination": request.values.get("destination"),
+        "start_date": request.values.get("start_date"),
+        "end_date": request.values.get("end_date"),
+    }
+    paging = page_args()
+
+    with db_connection() as conn:
+        # the agent's bookings plus flight status changes
+        etag = None
+        if etag_allowed():
+            etag = page_etag(purchases_fingerprint(conn, "booking_agent_email", filters["agent_email"]),
+                             data_versions.get("flights"), versions_window())
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        page = search_page(conn, "bookings", filters, **paging)
+
+    return with_etag(render_template(
+        "agent_view_bookings.html",
+        flights=page["rows"],
+        page=page,
+        page_link_args=link_args(filters, paging["page_size"]),
+    ), etag)
 
 # Staff features
 # Staff Dashboard
 @app.route("/staff", methods=["GET", "POST"])
 @login_required("staff")
 def staff_dashboard():
-    username = session["user_id"]
+    return run_page(staff_dashboard_plan())
+
+
+def staff_dashboard_plan():
     airline_name = session.get("airline_name")
     role = session.get("staff_role", "staff")
 
-    conn = get_db_connection()
-    flights = []
-    stats = {}
-
     # default range (next 30 days)
     today = datetime.today().date()
     default_start = today
@@ -1054,57 +927,42 @@ def staff_dashboard():
         origin = None
         destination = None
 
-    try:
-        with conn.cursor() as cur:
-
-            sql = """
-                SELECT *
-                FROM flight
-                WHERE airline_name = %s
-                  AND DATE(departure_time) BETWEEN %s AND %s
-            """
-            params = [airline_name, start, end]
-
-            if origin:
-                sql += " AND departure_airport = %s"
-                params.append(origin)
-            if destination:
-                sql += " AND arrival_airport = %s"
-                params.append(destination)
-
-            sql += " ORDER BY departure_time"
-            cur.execute(sql, params)
-            flights = cur.fetchall()
-
-            # analytics query unchanged
-            year_start = today - timedelta(days=365)
-            cur.execute("""
-                SELECT DATE_FORMAT(p.purchase_date, '%%Y-%%m') AS month,
-                       COUNT(*) AS num_tickets
-                FROM purchases p
-                JOIN ticket t ON p.ticket_id = t.ticket_id
-                WHERE t.airline_name = %s
-                  AND p.purchase_date >= %s
-                GROUP BY month
-                ORDER BY month
-            """, (airline_name, year_start))
-            stats["tickets_per_month"] = cur.fetchall()
-
-    finally:
-        conn.close()
-
-    is_admin = role in ("admin", "both")
-    is_operator = role in ("operator", "both")
-
-    return render_template(
-        "staff_dashboard.html",
-        flights=flights,
-        stats=stats,
-        role=role,
-        airline_name=airline_name,
-        is_admin=is_admin,
-        is_operator=is_operator
-    )
+    sql, params = build_search("staff", {
+        "airline_name": airline_name, "start_date": start, "end_date": end,
+        "origin": origin, "destination": destination,
+    })
+
+    versions = data_versions.get("sales", sales_version(airline_name),
+                                 flights_version(airline_name))
+    etag = page_etag(today, role, versions, versions_window())
+    cached = not_modified(etag)
+    if cached is not None:
+        return {}, lambda results: cached
+
+    fragment = fragments.lookup("staff_flights", (
+        airline_name, str(start), str(end), origin, destination, versions[2]))
+
+    queries = {
+        # tickets sold per month over the last year, from the rollup
+        "tickets_per_month": sales_rollup.tickets_per_month(
+            airline_name, today - timedelta(days=365)),
+    }
+    if fragment.html is None:
+        queries["flights"] = Query(sql, params)
+
+    def render(results):
+        return with_etag(render_template(
+            "staff_dashboard.html",
+            flights=results.get("flights"),
+            fragment=fragment,
+            stats={"tickets_per_month": results["tickets_per_month"]},
+            role=role,
+            airline_name=airline_name,
+            is_admin=role in ("admin", "both"),
+            is_operator=role in ("operator", "both"),
+        ), etag)
+
+    return queries, render
 
 
 
@@ -1112,9 +970,8 @@ def staff_dashboard():
 @app.route("/staff/passengers/<airline>/<int:flight_num>")
 @login_required("staff")
 def staff_passengers(airline, flight_num):
-    conn = get_db_connection()
     passengers = []
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT c.name, c.email
@@ -1124,8 +981,6 @@ def staff_passengers(airline, flight_num):
                 WHERE t.airline_name=%s AND t.flight_num=%s
             """, (airline, flight_num))
             passengers = cur.fetchall()
-    finally:
-        conn.close()
 
     return render_template(
         "staff_passengers.html",
@@ -1142,9 +997,8 @@ def staff_customer_history():
     airline_name = session["airline_name"]
     email = request.form.get("customer_email")
 
-    conn = get_db_connection()
     history = []
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT f.*
@@ -1157,8 +1011,6 @@ def staff_customer_history():
                 ORDER BY f.departure_time DESC
             """, (email, airline_name))
             history = cur.fetchall()
-    finally:
-        conn.close()
 
     return render_template(
         "staff_customer_history.html",
@@ -1171,107 +1023,142 @@ def staff_customer_history():
 @app.route("/staff/analytics")
 @login_required("staff")
 def staff_analytics():
+    return run_page(staff_analytics_plan())
+
+
+def staff_analytics_plan():
     airline = session["airline_name"]
-    conn = get_db_connection()
-    data = {}
+    today = datetime.today().date()
 
-    try:
-        with conn.cursor() as cur:
-            # top agents last month by tickets
-            cur.execute("""
-                SELECT booking_agent_email, COUNT(*) AS tickets
-                FROM purchases p
-                JOIN ticket t USING(ticket_id)
-                WHERE t.airline_name=%s
-                  AND p.purchase_date >= DATE_SUB(CURDATE(), INTERVAL 1 MONTH)
-                GROUP BY booking_agent_email
-                ORDER BY tickets DESC
-                LIMIT 5
-            """, (airline,))
-            data["top_agents_month"] = cur.fetchall()
-
-            # top agents last year by commission
-            cur.execute("""
-                SELECT booking_agent_email,
-                       SUM(purchase_price * 0.1) AS commission
-                FROM purchases p
-                JOIN ticket t USING(ticket_id)
-                WHERE t.airline_name=%s
-                  AND p.purchase_date >= DATE_SUB(CURDATE(), INTERVAL 1 YEAR)
-                GROUP BY booking_agent_email
-                ORDER BY commission DESC
-                LIMIT 5
-            """, (airline,))
-            data["top_agents_year"] = cur.fetchall()
-
-            # most frequent customer
-            cur.execute("""
-                SELECT p.customer_email, COUNT(*) AS flights
-                FROM purchases p
-                JOIN ticket t USING(ticket_id)
-                WHERE t.airline_name=%s
-                  AND p.purchase_date >= DATE_SUB(CURDATE(), INTERVAL 1 YEAR)
-                GROUP BY p.customer_email
-                ORDER BY flights DESC
-                LIMIT 1
-            """, (airline,))
-            data["most_frequent"] = cur.fetchone()
-
-            # tickets per month
-            cur.execute("""
-                SELECT DATE_FORMAT(p.purchase_date, '%%Y-%%m') AS month,
-                       COUNT(*) AS tickets
-                FROM purchases p
-                JOIN ticket t USING(ticket_id)
-                WHERE t.airline_name=%s
-                  AND p.purchase_date >= DATE_SUB(CURDATE(), INTERVAL 1 YEAR)
-                GROUP BY month
-                ORDER BY month
-            """, (airline,))
-            data["tickets_per_month"] = cur.fetchall()
-
-            # status counts
-            cur.execute("""
-                SELECT status, COUNT(*) AS count
-                FROM flight
-                WHERE airline_name=%s
-                GROUP BY status
-            """, (airline,))
-            data["status_counts"] = cur.fetchall()
+    # sales figures come from the daily_sales rollup (sales_rollup.py)
+    month_ago = months_before(today, 1)
+    year_ago = months_before(today, 12)
+
+    # the windows move daily, the data with the sales / flight versions
+    versions = data_versions.get("sales", sales_version(airline), flights_version(airline))
+    etag = page_etag(today, versions, versions_window())
+    cached = not_modified(etag)
+    if cached is not None:
+        return {}, lambda results: cached
+
+    fragment = fragments.lookup("staff_analytics", (airline, today, versions))
+    if fragment.html is not None:
+        return {}, lambda results: with_etag(render_template(
+            "staff_analytics.html", data={}, fragment=fragment), etag)
+
+    queries = {
+        # top agents last month by tickets
+        "top_agents_month": sales_rollup.top_agents_by_tickets(airline, month_ago),
+
+        # top agents last year by commission
+        "top_agents_year": sales_rollup.top_agents_by_commission(
+            airline, year_ago, AGENT_COMMISSION_RATE),
+
+        # most frequent customer (per customer, so not in the rollup)
+        "most_frequent": Query("""
+            SELECT p.customer_email, COUNT(*) AS flights
+            FROM purchases p
+            JOIN ticket t USING(ticket_id)
+            WHERE t.airline_name=%s
+              AND p.purchase_date >= %s
+            GROUP BY p.customer_email
+            ORDER BY flights DESC
+            LIMIT 1
+        """, (airline, year_ago), "one"),
+
+        # tickets per month
+        "tickets_per_month": sales_rollup.tickets_per_month(airline, year_ago),
+
+        # status counts
+        "status_counts": Query("""
+            SELECT status, COUNT(*) AS count
+            FROM flight
+            WHERE airline_name=%s
+            GROUP BY status
+        """, (airline,)),
+
+        # top destinations 3 months
+        "top_dest_3": sales_rollup.top_destinations(airline, months_before(today, 3)),
+
+        # top destinations 1 year
+        "top_dest_year": sales_rollup.top_destinations(airline, year_ago),
+    }
+
+    def render(results):
+        return with_etag(render_template(
+            "staff_analytics.html", data=results, fragment=fragment), etag)
+
+    return queries, render
+
+
+# Streaming exports: ?format=csv|ndjson and ?gzip=1 (see exports.py)
+def export_args():
+    fmt = request.args.get("format", "csv")
+    return {
+        "fmt": fmt if fmt in EXPORT_FORMATS else "csv",
+        "compress": request.args.get("gzip") == "1",
+        "chunk_bytes": EXPORT_CHUNK_BYTES,
+    }
+
+
+def open_export(sql, params):
+    return RowStream(get_db_connection, sql, params, fetch_size=EXPORT_FETCH_SIZE,
+                     net_write_timeout=EXPORT_NET_WRITE_TIMEOUT)
+
+
+@app.route("/staff/export/passengers/<airline>/<int:flight_num>")
+@login_required("staff")
+def export_passengers(airline, flight_num):
+    if airline != session["airline_name"]:
+        flash("You can only export your own airline's passengers.")
+        return redirect(url_for("staff_dashboard"))
 
-            # top destinations 3 months
-            cur.execute("""
-                SELECT f.arrival_airport, COUNT(*) AS trips
-                FROM ticket t
-                JOIN purchases p USING(ticket_id)
-                JOIN flight f ON f.airline_name = t.airline_name
-                             AND f.flight_num = t.flight_num
-                WHERE t.airline_name=%s
-                  AND p.purchase_date >= DATE_SUB(CURDATE(), INTERVAL 3 MONTH)
-                GROUP BY f.arrival_airport
-                ORDER BY trips DESC
-                LIMIT 5
-            """, (airline,))
-            data["top_dest_3"] = cur.fetchall()
-
-            # top destinations 1 year
-            cur.execute("""
-                SELECT f.arrival_airport, COUNT(*) AS trips
-                FROM ticket t
-                JOIN purchases p USING(ticket_id)
-                JOIN flight f ON f.airline_name = t.airline_name
-                             AND f.flight_num = t.flight_num
-                WHERE t.airline_name=%s
-                  AND p.purchase_date >= DATE_SUB(CURDATE(), INTERVAL 1 YEAR)
-                GROUP BY f.arrival_airport
-                ORDER BY trips DESC
-                LIMIT 5
-            """, (airline,))
-            data["top_dest_year"] = cur.fetchall()
-    finally:
-        conn.close()
+    stream = open_export("""
+        SELECT t.ticket_id, t.seat_class_id, c.name, c.email,
+               p.booking_agent_email, p.purchase_date, p.purchase_price
+        FROM ticket t
+        JOIN purchases p ON p.ticket_id = t.ticket_id
+        JOIN customer c ON c.email = p.customer_email
+        WHERE t.airline_name=%s AND t.flight_num=%s
+        ORDER BY t.ticket_id
+    """, (airline, flight_num))
+    return export_response(stream, filename=f"passengers-{airline}-{flight_num}",
+                           **export_args())
 
-    return render_template("staff_analytics.html", data=data)
+
+@app.route("/agent/export/bookings")
+@login_required("agent")
+def export_agent_bookings():
+    filters = {
+        "agent_email": session["user_id"],
+        "customer_email": request.args.get("customer_email"),
+        "origin": request.args.get("origin"),
+        "destination": request.args.get("destination"),
+        "start_date": request.args.get("start_date"),
+        "end_date": request.args.get("end_date"),
+    }
+    sql, params = build_search("bookings", filters)
+    return export_response(open_export(sql, params), filename="bookings",
+                           **export_args())
+
+
+@app.route("/staff/export/sales")
+@login_required("staff")
+def export_sales():
+    # daily_sales rows, optionally limited to ?start_date= / ?end_date=
+    sql = """
+        SELECT sale_date, NULLIF(agent_email, '') AS booking_agent_email,
+               arrival_airport, seat_class_id, tickets, revenue
+        FROM daily_sales
+        WHERE airline_name = %s
+          AND sale_date BETWEEN %s AND %s
+        ORDER BY sale_date, agent_email, arrival_airport, seat_class_id
+    """
+    params = (session["airline_name"],
+              request.args.get("start_date") or EARLIEST_DAY,
+              request.args.get("end_date") or LATEST_DAY)
+    return export_response(open_export(sql, params), filename="daily-sales",
+                           **export_args())
 
 
 # Staff admin/operator actions
@@ -1299,29 +1186,22 @@ def staff_create_flight():
     departure_time = request.form.get("departure_time")
     arrival_time = request.form.get("arrival_time")
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
+    # validate airports
+    for a in (departure_airport, arrival_airport):
+        if not reference.has_airport(a):
+            flash(f"Airport '{a}' does not exist.")
+            return redirect(url_for("staff_dashboard"))
 
-            # validate airports
-            for a in (departure_airport, arrival_airport):
-                cur.execute(
-                    "SELECT 1 FROM airport WHERE airport_name=%s", (a,)
-                )
-                if not cur.fetchone():
-                    flash(f"Airport '{a}' does not exist.")
-                    return redirect(url_for("staff_dashboard"))
+    # validate airplane ownership
+    if not reference.has_airplane(airline_name, airplane_id):
+        flash("Airplane does not belong to your airline.")
+        return redirect(url_for("staff_dashboard"))
 
-            # validate airplane ownership
-            cur.execute("""
-                SELECT 1 FROM airplane
-                WHERE airline_name=%s AND airplane_id=%s
-            """, (airline_name, airplane_id))
-            if not cur.fetchone():
-                flash("Airplane does not belong to your airline.")
-                return redirect(url_for("staff_dashboard"))
-
-            # insert flight
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+
+            # insert flight and its seat counters together
+            conn.begin()
             cur.execute("""
                 INSERT INTO flight
                 (airline_name, flight_num, departure_airport, departure_time,
@@ -1331,12 +1211,63 @@ def staff_create_flight():
                 airline_name, flight_num, departure_airport, departure_time,
                 arrival_airport, arrival_time, base_price, airplane_id
             ))
+            create_inventory(cur, airline_name, [flight_num])
+            conn.commit()
 
+        flights_changed(airline_name, [(departure_airport, arrival_airport)])
         flash("Flight created successfully!")
 
-    finally:
-        conn.close()
+    return redirect(url_for("staff_dashboard"))
+
+
+# Bulk schedule import: a CSV / JSON file from the dashboard form, or a JSON
+# array posted directly (answered with JSON). See schedule_import.py.
+@app.route("/staff/import_schedule", methods=["POST"])
+@login_required("staff")
+def staff_import_schedule():
+    role = session.get("staff_role")
+    airline_name = session["airline_name"]
+    as_json = request.is_json
+
+    if role not in ("admin", "both"):
+        if as_json:
+            return jsonify({"error": "You do not have admin permission."}), 403
+        flash("You do not have admin permission.")
+        return redirect(url_for("staff_dashboard"))
+
+    try:
+        if as_json:
+            rows = json_rows(request.get_json(silent=True))
+        else:
+            upload = request.files.get("schedule")
+            if not upload or not upload.filename:
+                raise ScheduleFormatError("Please choose a schedule file.")
+            fmt = "json" if upload.filename.lower().endswith(".json") else "csv"
+            rows = parse_schedule(upload.read().decode("utf-8-sig"), fmt)
+    except (ScheduleFormatError, UnicodeDecodeError) as e:
+        if as_json:
+            return jsonify({"error": str(e)}), 400
+        flash(str(e))
+        return redirect(url_for("staff_dashboard"))
+
+    with db_connection() as conn:
+        result = import_schedule(conn, airline_name, rows)
+
+    flights_changed(airline_name, {(f["departure_airport"], f["arrival_airport"])
+                                   for f in result["inserted"]})
+
+    if as_json:
+        return jsonify({
+            "inserted": [f["flight_num"] for f in result["inserted"]],
+            "errors": result["errors"],
+        })
 
+    flash(f"Imported {len(result['inserted'])} flights, "
+          f"{len(result['errors'])} rows rejected.")
+    for e in result["errors"][:10]:
+        flash(f"Row {e['row']} (flight {e['flight_num']}): {e['error']}")
+    if len(result["errors"]) > 10:
+        flash(f"... and {len(result['errors']) - 10} more rejected rows.")
     return redirect(url_for("staff_dashboard"))
 
 
@@ -1357,30 +1288,124 @@ def staff_update_status():
         flash("Please provide both a flight number and a new status.", "error")
         return redirect(url_for("staff_dashboard"))
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE flight
-                SET status = %s
-                WHERE airline_name = %s
-                  AND flight_num = %s
-                """,
-                (status, airline_name, flight_num),
-            )
-
-            if cur.rowcount == 0:
-                flash("No flight with that number exists for your airline.", "error")
-            else:
-                flash("Flight status updated successfully.", "success")
-
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        [result], events = update_statuses(
+            conn, airline_name, [(flight_num, status)], bus=flight_events)
+    flights_changed(airline_name, [(e["departure_airport"], e["arrival_airport"])
+                                   for e in events])
+
+    if result["result"] == NOT_FOUND:
+        flash("No flight with that number exists for your airline.", "error")
+    elif result["result"] == INVALID:
+        flash("Flight number must be a number and the status a known one.", "error")
+    else:
+        flash("Flight status updated successfully.", "success")
 
     return redirect(url_for("staff_dashboard"))
 
 
+# Batch status update: flight numbers + one status from the dashboard form,
+# or {"updates": [{"flight_num": .., "status": ..}, ...]} as JSON (answered
+# with per-flight results). All changes commit together.
+@app.route("/staff/update_status/batch", methods=["POST"])
+@login_required("staff")
+def staff_update_status_batch():
+    role = session.get("staff_role")
+    airline_name = session.get("airline_name")
+    as_json = request.is_json
+
+    if role not in ("operator", "both"):
+        if as_json:
+            return jsonify({"error": "You do not have operator permission."}), 403
+        flash("You do not have operator permission.", "error")
+        return redirect(url_for("staff_dashboard"))
+
+    if as_json:
+        updates = (request.get_json(silent=True) or {}).get("updates")
+        if not isinstance(updates, list) or not all(isinstance(u, dict) for u in updates):
+            return jsonify({"error": "updates must be a list of objects"}), 400
+        changes = [(u.get("flight_num"), u.get("status")) for u in updates]
+    else:
+        status = request.form.get("status")
+        flight_nums = (request.form.get("flight_nums") or "").replace(",", " ").split()
+        changes = [(n, status) for n in flight_nums]
+
+    with db_connection() as conn:
+        results, events = update_statuses(conn, airline_name, changes, bus=flight_events)
+    flights_changed(airline_name, {(e["departure_airport"], e["arrival_airport"])
+                                   for e in events})
+
+    if as_json:
+        return jsonify({"results": results})
+
+    counts = {}
+    for r in results:
+        counts[r["result"]] = counts.get(r["result"], 0) + 1
+    flash(", ".join(f"{n} {result}" for result, n in counts.items()) or "No flights given.")
+    for r in results:
+        if r["result"] in (NOT_FOUND, INVALID):
+            flash(f"Flight {r['flight_num']}: {r['result']}", "error")
+    return redirect(url_for("staff_dashboard"))
+
+
+# Live flight status (Server-Sent Events). ?flight=Airline:123 (repeatable)
+# picks flights explicitly; otherwise customers follow the flights they
+# bought, agents the flights they booked and staff their whole airline.
+@app.route("/events/flights")
+def flight_status_events():
+    flights = set()
+    for value in request.args.getlist("flight")[:FLIGHT_EVENTS["max_flights"]]:
+        airline, _, number = value.rpartition(":")
+        if airline and number.isdigit():
+            flights.add(flight_key(airline, number))
+
+    user_type = session.get("user_type")
+    airline = None
+    if not flights:
+        if user_type == "staff":
+            airline = session["airline_name"]
+        elif user_type in ("customer", "agent"):
+            column = "p.customer_email" if user_type == "customer" else "p.booking_agent_email"
+            with db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT DISTINCT t.airline_name, t.flight_num
+                        FROM purchases p
+                        JOIN ticket t ON t.ticket_id = p.ticket_id
+                        JOIN flight f ON f.airline_name = t.airline_name
+                                     AND f.flight_num = t.flight_num
+                        WHERE """ + column + """ = %s
+                          AND f.departure_time >= NOW() - INTERVAL 1 DAY
+                        LIMIT %s
+                    """, (session["user_id"], FLIGHT_EVENTS["max_flights"]))
+                    flights = {flight_key(r["airline_name"], r["flight_num"])
+                               for r in cur.fetchall()}
+
+    if not flights and airline is None:
+        return jsonify({"error": "no flights to follow"}), 400
+
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    try:
+        sub = flight_events.subscribe(flights, airline=airline, last_event_id=last_event_id)
+    except BusFull as e:
+        # the page's script reconnects after Retry-After (flight_status.js)
+        retry = FLIGHT_EVENTS["retry_after"]
+        response = app.response_class(f"retry: {retry * 1000}\n\n", status=503,
+                                      mimetype="text/event-stream")
+        response.headers["Retry-After"] = str(retry)
+        app.logger.warning("/events/flights: %s", e)
+        return response
+
+    response = app.response_class(
+        sse_stream(sub, heartbeat=FLIGHT_EVENTS["heartbeat"]),
+        mimetype="text/event-stream",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(sub.close)
+    return response
+
+
 
 @app.route("/staff/add_airplane", methods=["POST"])
 @login_required("staff")
@@ -1408,43 +1433,76 @@ def staff_add_airplane():
         flash("Airplane ID and seat capacities must be valid numbers.")
         return redirect(url_for("staff_dashboard"))
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
+    # seat classes only where capacity > 0, all in one transaction
+    capacities = {1: econ_cap, 2: bus_cap, 3: first_cap}
+    airplane = {
+        "airplane_id": airplane_id,
+        "seat_classes": [
+            {"seat_class_id": class_id, "seat_capacity": capacities[class_id],
+             "multiplier": multiplier}
+            for class_id, (_, multiplier) in STANDARD_CLASSES.items()
+            if capacities[class_id] > 0
+        ],
+    }
+
+    with db_connection() as conn:
+        result = load_fleet(conn, airline, [airplane])
+
+    if result["errors"]:
+        flash(f"Airplane not added: {result['errors'][0]['error']}.")
+    else:
+        reference.refresh()
+        flash("Airplane and seat classes added successfully!")
 
-            # Insert airplane
-            cur.execute("""
-                INSERT INTO airplane (airline_name, airplane_id)
-                VALUES (%s, %s)
-            """, (airline, airplane_id))
+    return redirect(url_for("staff_dashboard"))
 
-            # Insert seat classes only if capacity > 0
-            if econ_cap > 0:
-                cur.execute("""
-                    INSERT INTO seat_class
-                    (airline_name, airplane_id, seat_class_id, seat_capacity, multiplier)
-                    VALUES (%s, %s, 1, %s, 1.0)
-                """, (airline, airplane_id, econ_cap))
 
-            if bus_cap > 0: 
-                cur.execute("""
-                    INSERT INTO seat_class
-                    (airline_name, airplane_id, seat_class_id, seat_capacity, multiplier)
-                    VALUES (%s, %s, 2, %s, 1.5)
-                """, (airline, airplane_id, bus_cap))
+# Bulk fleet load: a CSV / JSON file from the dashboard form, or JSON posted
+# directly (answered with JSON). See fleet_loader.py.
+@app.route("/staff/load_fleet", methods=["POST"])
+@login_required("staff")
+def staff_load_fleet():
+    role = session.get("staff_role")
+    airline = session["airline_name"]
+    as_json = request.is_json
 
-            if first_cap > 0:
-                cur.execute("""
-                    INSERT INTO seat_class
-                    (airline_name, airplane_id, seat_class_id, seat_capacity, multiplier)
-                    VALUES (%s, %s, 3, %s, 2.0)
-                """, (airline, airplane_id, first_cap))
+    if role not in ("admin", "both"):
+        if as_json:
+            return jsonify({"error": "You do not have admin permission."}), 403
+        flash("You do not have admin permission.")
+        return redirect(url_for("staff_dashboard"))
 
-        flash("Airplane and seat classes added successfully!")
+    try:
+        if as_json:
+            airplanes = json_fleet(request.get_json(silent=True))
+        else:
+            upload = request.files.get("fleet")
+            if not upload or not upload.filename:
+                raise FleetFormatError("Please choose a fleet file.")
+            fmt = "json" if upload.filename.lower().endswith(".json") else "csv"
+            airplanes = parse_fleet(upload.read().decode("utf-8-sig"), fmt)
+    except (FleetFormatError, UnicodeDecodeError) as e:
+        if as_json:
+            return jsonify({"error": str(e)}), 400
+        flash(str(e))
+        return redirect(url_for("staff_dashboard"))
+
+    with db_connection() as conn:
+        result = load_fleet(conn, airline, airplanes)
 
-    finally:
-        conn.close()
+    if not result["errors"]:
+        reference.refresh()
 
+    if as_json:
+        return jsonify(result), (400 if result["errors"] else 200)
+
+    if result["errors"]:
+        flash(f"Fleet not loaded, {len(result['errors'])} airplanes rejected.")
+        for e in result["errors"][:10]:
+            flash(f"Airplane {e['airplane_id']}: {e['error']}")
+    else:
+        flash(f"Loaded {result['airplanes']} airplanes with "
+              f"{result['seat_classes']} seat classes.")
     return redirect(url_for("staff_dashboard"))
 
 
@@ -1460,16 +1518,14 @@ def staff_add_airport():
     name = request.form.get("airport_name")
     city = request.form.get("airport_city")
 
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO airport (airport_name, airport_city)
                 VALUES (%s,%s)
             """, (name, city))
+        reference.refresh()
         flash("Airport added.")
-    finally:
-        conn.close()
 
     return redirect(url_for("staff_dashboard"))
 
@@ -1485,45 +1541,278 @@ def staff_add_agent_auth():
     airline_name = session["airline_name"]
     agent_email = request.form.get("agent_email")
 
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
+    # ensure airline still exists
+    if not reference.has_airline(airline_name):
+        flash("Your airline is not valid.")
+        return redirect(url_for("staff_dashboard"))
 
-            # validate agent exists
-            cur.execute("SELECT email FROM booking_agent WHERE email=%s", (agent_email,))
-            if not cur.fetchone():
-                flash("This booking agent does not exist.")
-                return redirect(url_for("staff_dashboard"))
+    with db_connection() as conn:
+        [result] = authorize_agents(conn, airline_name, [agent_email])
 
-            # ensure airline still exists
-            cur.execute("SELECT airline_name FROM airline WHERE airline_name=%s", (airline_name,))
-            if not cur.fetchone():
-                flash("Your airline is not valid.")
-                return redirect(url_for("staff_dashboard"))
+    flash({
+        agent_auth.AUTHORIZED: "Agent successfully authorized for this airline.",
+        agent_auth.ALREADY_AUTHORIZED: "This agent is already authorized for your airline.",
+    }.get(result["result"], "This booking agent does not exist."))
 
-            # check if already authorized
-            cur.execute("""
-                SELECT *
-                FROM agent_airline_authorization
-                WHERE agent_email=%s AND airline_name=%s
-            """, (agent_email, airline_name))
+    return redirect(url_for("staff_dashboard"))
 
-            if cur.fetchone():
-                flash("This agent is already authorized for your airline.")
-                return redirect(url_for("staff_dashboard"))
 
-            # insert new authorization
-            cur.execute("""
-                INSERT INTO agent_airline_authorization (agent_email, airline_name)
-                VALUES (%s,%s)
-            """, (agent_email, airline_name))
+# Bulk agent authorization: many emails from the dashboard textarea, or
+# {"emails": [...], "action": "authorize" | "revoke"} as JSON (answered with
+# the per-email results). See agent_auth.py.
+@app.route("/staff/agent_auth/bulk", methods=["POST"])
+@login_required("staff")
+def staff_bulk_agent_auth():
+    role = session.get("staff_role")
+    airline_name = session["airline_name"]
+    as_json = request.is_json
+
+    if role not in ("admin", "both"):
+        if as_json:
+            return jsonify({"error": "You do not have admin permission."}), 403
+        flash("You do not have admin permission.")
+        return redirect(url_for("staff_dashboard"))
+
+    if as_json:
+        body = request.get_json(silent=True) or {}
+        emails = body.get("emails")
+        action = body.get("action", "authorize")
+        if not isinstance(emails, list) or not all(isinstance(e, str) for e in emails):
+            return jsonify({"error": "emails must be a list of strings"}), 400
+    else:
+        emails = split_emails(request.form.get("agent_emails"))
+        action = request.form.get("action", "authorize")
 
-            flash("Agent successfully authorized for this airline.")
-    finally:
-        conn.close()
+    if action not in ("authorize", "revoke"):
+        if as_json:
+            return jsonify({"error": "action must be authorize or revoke"}), 400
+        flash("Unknown action.")
+        return redirect(url_for("staff_dashboard"))
+
+    if not reference.has_airline(airline_name):
+        if as_json:
+            return jsonify({"error": "Your airline is not valid."}), 400
+        flash("Your airline is not valid.")
+        return redirect(url_for("staff_dashboard"))
 
+    apply = authorize_agents if action == "authorize" else revoke_agents
+    with db_connection() as conn:
+        results = apply(conn, airline_name, emails)
+
+    if as_json:
+        return jsonify({"action": action, "results": results})
+
+    counts = {}
+    for r in results:
+        counts[r["result"]] = counts.get(r["result"], 0) + 1
+    flash(", ".join(f"{n} {result}" for result, n in counts.items()) or "No emails given.")
+    for r in results:
+        if r["result"] in (agent_auth.NO_SUCH_AGENT, agent_auth.INVALID_EMAIL):
+            flash(f"{r['email']}: {r['result']}")
     return redirect(url_for("staff_dashboard"))
 
+
+# JSON API, versioned under /api/v1 (see api.py). Flight lists take the
+# filters of the matching HTML search, ?fields= and the keyset paging of
+# ?after= / ?before= / ?page_size=; their cursors come back in the body.
+@app.errorhandler(ApiError)
+def api_error(e):
+    return json_response({"error": str(e)}, e.status)
+
+
+def api_flight_page(page, fields):
+    rows = page["rows"]
+    if "seats" in fields and rows:
+        keys = [flight_key(r["airline_name"], r["flight_num"]) for r in rows]
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                rows = with_seats(rows, run_query(cur, seats_query(keys)))
+    return {
+        "flights": project(rows, fields),
+        "next_cursor": page["next_cursor"],
+        "prev_cursor": page["prev_cursor"],
+    }
+
+
+@app.route("/api/v1/flights")
+def api_flights():
+    """The public search of /search; shares its result cache."""
+    fields = parse_fields(request.args.get("fields"))
+    filters, paging, scope, key = public_search_args()
+    etag, cache_control = search_validators(scope, key)
+    cached = not_modified(etag, cache_control)
+    if cached is not None:
+        return cached
+
+    page_key = search_cache.key(scope, key)
+    page = search_cache.get(page_key)
+    if page is None:
+        with db_connection() as conn:
+            page = search_page(conn, "public", filters, **paging)
+        search_cache.set(page_key, page)
+
+    return with_etag(json_response(api_flight_page(page, fields)), etag, cache_control)
+
+
+@app.route("/api/v1/agent/flights")
+def api_agent_flights():
+    """The flights the logged-in agent may sell, as /agent/search."""
+    if session.get("user_type") != "agent":
+        raise ApiError("log in as a booking agent", 401)
+    fields = parse_fields(request.args.get("fields"))
+    filters = {"agent_email": session["user_id"]}
+    for name in ("origin", "destination", "date"):
+        filters[name] = request.args.get(name)
+
+    with db_connection() as conn:
+        page = search_page(conn, "agent", filters, **page_args())
+
+    return json_response(api_flight_page(page, fields))
+
+
+@app.route("/api/v1/flights/lookup", methods=["GET", "POST"])
+def api_flight_lookup():
+    """Many flights by key in one call: ?flight=Airline:123 (repeatable), or
+    {"flights": ["Airline:123" | [airline, num] | {..}, ...], "fields": [..]}."""
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ApiError("expected a JSON object")
+        items, fields = body.get("flights"), body.get("fields")
+    else:
+        items, fields = request.args.getlist("flight"), request.args.get("fields")
+    fields = parse_fields(fields)
+    keys = parse_keys(items, API["max_lookup"])
+
+    results = run_concurrently(db_pool, lookup_queries(keys, fields))
+    return json_response(lookup_result(keys, results, fields))
+
+
+@app.route("/api/v1/flights/<airline>/<int:flight_num>/seats")
+def api_flight_seats(airline, flight_num):
+    """Seats left and price per seat class of one flight."""
+    keys = {flight_key(airline, flight_num): [airline, flight_num]}
+    fields = ("airline_name", "flight_num", "status", "seats")
+    results = run_concurrently(db_pool, lookup_queries(keys, fields))
+    found = lookup_result(keys, results, fields)["flights"]
+    if not found:
+        raise ApiError("flight not found", 404)
+    return json_response(found[0])
+
+
+# DB pool metrics
+@app.route("/metrics/db_pool")
+@login_required("staff")
+def db_pool_metrics():
+    return jsonify(db_pool.metrics())
+
+
+# Reservation engine metrics (contention and retries)
+@app.route("/metrics/reservations")
+@login_required("staff")
+def reservation_metrics():
+    return jsonify(reservations.stats.snapshot())
+
+
+# Public search cache metrics
+@app.route("/metrics/search_cache")
+@login_required("staff")
+def search_cache_metrics():
+    return jsonify(search_cache.stats())
+
+# Flight status event bus
+@app.route("/metrics/flight_events")
+@login_required("staff")
+def flight_event_metrics():
+    return jsonify(flight_events.stats())
+
+# SQL time per endpoint and statement (only collected with SQL_PROFILING on)
+@app.route("/metrics/sql")
+@login_required("staff")
+def sql_metrics():
+    snapshot = sql_profiling.stats.snapshot(top=SQL_PROFILING["top_statements"])
+    return jsonify(dict(snapshot, enabled=SQL_PROFILING["enabled"]))
+
+# Seat inventory reconciliation: flask --app app rebuild-seat-inventory
+@app.cli.command("rebuild-seat-inventory")
+@click.option("--airline", default=None, help="Only rebuild this airline's flights.")
+def rebuild_seat_inventory_command(airline):
+    with db_connection() as conn:
+        changed = rebuild_inventory(conn, airline)
+    click.echo(f"seat_inventory rebuilt ({changed} rows affected)")
+
+# Sales rollup backfill / reconciliation: flask --app app rebuild-daily-sales
+@app.cli.command("rebuild-daily-sales")
+@click.option("--airline", default=None, help="Only rebuild this airline's sales.")
+def rebuild_daily_sales_command(airline):
+    with db_connection() as conn:
+        written = rebuild_daily_sales(conn, airline)
+    data_versions.bump(sales_version(airline) if airline else "sales")
+    click.echo(f"daily_sales rebuilt ({written} rows)")
+
+# Customer spending backfill / reconciliation: flask --app app rebuild-customer-spending
+@app.cli.command("rebuild-customer-spending")
+@click.option("--customer", default=None, help="Only rebuild this customer's months.")
+def rebuild_customer_spending_command(customer):
+    with db_connection() as conn:
+        written = rebuild_customer_spending(conn, customer)
+    click.echo(f"customer_monthly_spend rebuilt ({written} rows)")
+
+# Commission ledger backfill / reconciliation: flask --app app rebuild-commissions
+@app.cli.command("rebuild-commissions")
+@click.option("--agent", default=None, help="Only rebuild this agent's commissions.")
+def rebuild_commissions_command(agent):
+    with db_connection() as conn:
+        added = rebuild_commissions(conn, agent)
+    click.echo(f"agent commissions rebuilt ({added} ledger rows added)")
+
+# Bulk schedule import: flask --app app import-schedule "Airline" schedule.csv
+@app.cli.command("import-schedule")
+@click.argument("airline")
+@click.argument("schedule", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--format", "fmt", type=click.Choice(["csv", "json"]), default=None,
+              help="Defaults to the file extension.")
+@click.option("--batch-size", default=500, show_default=True)
+def import_schedule_command(airline, schedule, fmt, batch_size):
+    fmt = fmt or ("json" if schedule.name.lower().endswith(".json") else "csv")
+    try:
+        rows = parse_schedule(schedule.read(), fmt)
+    except ScheduleFormatError as e:
+        raise click.ClickException(str(e))
+
+    with db_connection() as conn:
+        result = import_schedule(conn, airline, rows, batch_size=batch_size)
+    flights_changed(airline, {(f["departure_airport"], f["arrival_airport"])
+                              for f in result["inserted"]})
+
+    for e in result["errors"]:
+        click.echo(f"row {e['row']} (flight {e['flight_num']}): {e['error']}", err=True)
+    click.echo(f"{len(result['inserted'])} flights imported, "
+               f"{len(result['errors'])} rows rejected")
+
+# Bulk fleet load: flask --app app load-fleet "Airline" fleet.json
+@app.cli.command("load-fleet")
+@click.argument("airline")
+@click.argument("fleet", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--format", "fmt", type=click.Choice(["csv", "json"]), default=None,
+              help="Defaults to the file extension.")
+def load_fleet_command(airline, fleet, fmt):
+    fmt = fmt or ("json" if fleet.name.lower().endswith(".json") else "csv")
+    try:
+        airplanes = parse_fleet(fleet.read(), fmt)
+    except FleetFormatError as e:
+        raise click.ClickException(str(e))
+
+    with db_connection() as conn:
+        result = load_fleet(conn, airline, airplanes)
+
+    for e in result["errors"]:
+        click.echo(f"airplane {e['airplane_id']}: {e['error']}", err=True)
+    if result["errors"]:
+        raise click.ClickException("fleet not loaded")
+    click.echo(f"{result['airplanes']} airplanes, "
+               f"{result['seat_classes']} seat classes loaded")
+
 # run everything
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,197 @@
+# asgi.py : optional ASGI entry point, `uvicorn asgi:application`
+#
+# The hot read pages (public search, the three dashboards and staff
+# analytics) are served natively: each page's independent queries, from its
+# *_plan() in app.py, run concurrently on an aiomysql pool, one connection
+# per query, and only the template is rendered by Flask. Every other request,
+# and the POST forms of those pages, go to the Flask app unchanged on
+# a2wsgi's thread pool.
+#
+# aiomysql, a2wsgi and uvicorn are needed here only; app.py still runs on
+# any WSGI server without them.
+
+import asyncio
+import contextvars
+import io
+import sys
+import time
+
+import aiomysql
+import pymysql
+from a2wsgi import WSGIMiddleware
+
+import app as views
+import sql_profiling
+from config import (
+    ASYNC_DB_POOL, DB_POOL_CONFIG, FLIGHT_EVENTS, QUERY_FANOUT, SQL_PROFILING
+)
+from db import DB_CONFIG
+from queries import ER_QUERY_TIMEOUT, QueryTimeout, time_limited
+
+# path -> (plan function, role the page requires, or None)
+NATIVE_PAGES = {
+    "/search": (views.public_search_plan, None),
+    "/customer": (views.customer_dashboard_plan, "customer"),
+    "/agent": (views.agent_dashboard_plan, "agent"),
+    "/staff": (views.staff_dashboard_plan, "staff"),
+    "/staff/analytics": (views.staff_analytics_plan, "staff"),
+}
+
+
+async def run_queries_async(pool, queries, timeout=QUERY_FANOUT["timeout"]):
+    """Run {name: Query} concurrently, each on its own pooled connection;
+    returns {name: result} like queries.run_queries. Each query carries the
+    same MAX_EXECUTION_TIME hint as under queries.run_concurrently."""
+    names = list(queries)
+    results = await asyncio.gather(*(
+        _run_query(pool, n, time_limited(queries[n], timeout)) for n in names))
+    return dict(zip(names, results))
+
+
+async def _run_query(pool, name, query):
+    try:
+        return await _fetch(pool, query)
+    except pymysql.err.MySQLError as e:
+        if e.args and e.args[0] == ER_QUERY_TIMEOUT:
+            raise QueryTimeout(f"query {name} exceeded its time limit") from e
+        raise
+
+
+async def _fetch(pool, query):
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            started = time.perf_counter()
+            await cur.execute(query.sql, query.params)
+            if SQL_PROFILING["enabled"]:
+                seconds = time.perf_counter() - started
+                endpoint, slow = sql_profiling.observe(query.sql, seconds, cur.rowcount)
+                if slow:
+                    sql_profiling.log_slow(endpoint, cur.mogrify(query.sql, query.params),
+                                           seconds)
+            if query.fetch == "one":
+                return await cur.fetchone()
+            return await cur.fetchall()
+
+
+class Application:
+    """ASGI app: native async pages, everything else through Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        # a thread per pooled connection, plus one per flight status stream,
+        # which holds its thread for as long as the page stays open
+        self.wsgi = WSGIMiddleware(
+            flask_app, workers=DB_POOL_CONFIG["max_size"] + FLIGHT_EVENTS["max_streams"])
+        self.pool = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] == "http" and scope["method"] == "GET" and self.pool is not None:
+            page = NATIVE_PAGES.get(scope["path"])
+            if page is not None:
+                await self.serve_page(scope, send, *page)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.pool = await aiomysql.create_pool(
+                        host=DB_CONFIG["host"],
+                        port=DB_CONFIG["port"],
+                        user=DB_CONFIG["user"],
+                        password=DB_CONFIG["password"],
+                        db=DB_CONFIG["database"],
+                        charset=DB_CONFIG["charset"],
+                        autocommit=True,
+                        **ASYNC_DB_POOL,
+                    )
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.pool is not None:
+                    self.pool.close()
+                    await self.pool.wait_closed()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def serve_page(self, scope, send, plan, role):
+        app = self.flask_app
+        with app.request_context(wsgi_environ(scope)):
+            try:
+                # before_request hooks (SQL profiling), then the same session
+                # checks as the view's @login_required
+                response = app.preprocess_request()
+                if response is None and role:
+                    response = views.login_required(role)(lambda: None)()
+                if response is None:
+                    # cache lookups and template rendering block: keep them
+                    # off the event loop
+                    queries, render = await in_thread(plan)
+                    results = await run_queries_async(self.pool, queries) if queries else {}
+                    response = await in_thread(render, results)
+                response = app.make_response(response)
+            except Exception as e:
+                # registered handlers first (QueryTimeout -> 503, ApiError),
+                # then a 500 for anything they do not take
+                try:
+                    response = app.make_response(app.handle_user_exception(e))
+                except Exception as e:
+                    response = app.make_response(app.handle_exception(e))
+            # after_request hooks and the session cookie
+            response = app.process_response(response)
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1"))
+                        for k, v in response.headers.to_wsgi_list()],
+        })
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def in_thread(func, *args):
+    """func(*args) on the default executor, in this request's context."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, contextvars.copy_context().run, func, *args)
+
+
+def wsgi_environ(scope):
+    """WSGI environ for a bodyless ASGI HTTP request."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+application = Application(views.app)
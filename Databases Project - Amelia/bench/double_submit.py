@@ -0,0 +1,163 @@
+# bench/double_submit.py : check that a double-submitted purchase sells one
+# ticket. Two connections buy the same flight for the same customer while a
+# third holds the seat_inventory row, so both have started their transaction
+# and are queued on the seat lock when it is released; the second must be
+# refused with AlreadyPurchased.
+#
+#   python bench/double_submit.py [--rounds 5]
+#
+# Everything is written under a scratch airline and customer that are
+# deleted afterwards. Exits non-zero when a second purchase is not refused.
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection  # noqa: E402
+from inventory import create_inventory  # noqa: E402
+from reservations import ReservationError, reserve_seat  # noqa: E402
+from ticket_ids import TicketIdAllocator  # noqa: E402
+
+SCRATCH_AIRLINE = "zz-bench-double"
+SCRATCH_AIRPORTS = ("zz-bench-dep", "zz-bench-arr")
+SCRATCH_CUSTOMER = "double-submit@bench.example"
+SEAT_CLASS = 1
+ROUNDS_MAX = 50     # one scratch flight per round
+
+# how long to wait for both buyers to queue on the seat lock
+QUEUE_TIMEOUT = 10
+
+
+def setup(conn):
+    departure = datetime.combine(date.today() + timedelta(days=30), datetime.min.time())
+    with conn.cursor() as cur:
+        cur.executemany("INSERT INTO airport (airport_name, airport_city) VALUES (%s, %s)",
+                        [(name, "Bench City") for name in SCRATCH_AIRPORTS])
+        cur.execute("INSERT INTO airline (airline_name) VALUES (%s)", (SCRATCH_AIRLINE,))
+        cur.execute("INSERT INTO airplane (airline_name, airplane_id) VALUES (%s, 1)",
+                    (SCRATCH_AIRLINE,))
+        cur.execute("""
+            INSERT INTO seat_class
+            (airline_name, airplane_id, seat_class_id, seat_capacity, multiplier)
+            VALUES (%s, 1, %s, 100, 1)
+        """, (SCRATCH_AIRLINE, SEAT_CLASS))
+        cur.execute("""
+            INSERT INTO customer
+            (email, name, password_hash, building_number, street, city, state,
+             phone_number, passport_number, passport_expiration, passport_country,
+             date_of_birth)
+            VALUES (%s, 'Double Submit', '', '1', 'Main St', 'Bench City', 'NY',
+                    '5550000000', 'P00000000', %s, 'US', %s)
+        """, (SCRATCH_CUSTOMER, date(2035, 1, 1), date(1980, 1, 1)))
+        cur.executemany("""
+            INSERT INTO flight
+            (airline_name, flight_num, departure_airport, departure_time,
+             arrival_airport, arrival_time, base_price, status, airplane_id)
+            VALUES (%s, %s, %s, %s, %s, %s, 100, 'upcoming', 1)
+        """, [(SCRATCH_AIRLINE, n, SCRATCH_AIRPORTS[0], departure,
+               SCRATCH_AIRPORTS[1], departure + timedelta(hours=2))
+              for n in range(1, ROUNDS_MAX + 1)])
+        create_inventory(cur, SCRATCH_AIRLINE, list(range(1, ROUNDS_MAX + 1)))
+
+
+def teardown(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM daily_sales WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM customer_monthly_spend WHERE customer_email = %s",
+                    (SCRATCH_CUSTOMER,))
+        cur.execute("DELETE FROM purchases WHERE customer_email = %s", (SCRATCH_CUSTOMER,))
+        cur.execute("DELETE FROM ticket WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM seat_inventory WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM flight WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM seat_class WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM airplane WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM airline WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM airport WHERE airport_name IN %s", (SCRATCH_AIRPORTS,))
+        cur.execute("DELETE FROM customer WHERE email = %s", (SCRATCH_CUSTOMER,))
+
+
+def lock_waits(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) AS waiting
+            FROM information_schema.innodb_trx
+            WHERE trx_state = 'LOCK WAIT'
+        """)
+        return cur.fetchone()["waiting"]
+
+
+def double_submit(conn, ticket_ids, flight_num):
+    """Outcome of each of the two purchases: "sold" or the refusal's class."""
+    outcomes = []
+
+    def buy():
+        buyer = get_db_connection()
+        try:
+            reserve_seat(buyer, ticket_ids, SCRATCH_AIRLINE, flight_num,
+                         SEAT_CLASS, SCRATCH_CUSTOMER)
+            outcomes.append("sold")
+        except ReservationError as e:
+            outcomes.append(type(e).__name__)
+        finally:
+            buyer.close()
+
+    holder = get_db_connection()
+    try:
+        holder.begin()
+        with holder.cursor() as cur:
+            cur.execute("""
+                SELECT seats_sold FROM seat_inventory
+                WHERE airline_name = %s AND flight_num = %s AND seat_class_id = %s
+                FOR UPDATE
+            """, (SCRATCH_AIRLINE, flight_num, SEAT_CLASS))
+
+        threads = [threading.Thread(target=buy) for _ in range(2)]
+        for t in threads:
+            t.start()
+        deadline = time.monotonic() + QUEUE_TIMEOUT
+        while lock_waits(conn) < 2:
+            if time.monotonic() > deadline:
+                sys.exit("the two purchases never queued on the seat lock")
+            time.sleep(0.05)
+        holder.rollback()
+        for t in threads:
+            t.join()
+    finally:
+        holder.close()
+    return sorted(outcomes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a double submit sells one ticket")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    if not 1 <= args.rounds <= ROUNDS_MAX:
+        parser.error(f"--rounds must be between 1 and {ROUNDS_MAX}")
+
+    conn = get_db_connection()
+    ticket_ids = TicketIdAllocator(get_db_connection, block_size=2 * args.rounds)
+    failed = 0
+    try:
+        teardown(conn)
+        setup(conn)
+        for flight_num in range(1, args.rounds + 1):
+            outcomes = double_submit(conn, ticket_ids, flight_num)
+            ok = outcomes == ["AlreadyPurchased", "sold"]
+            failed += not ok
+            print(f"  round {flight_num}: {', '.join(outcomes):<24} {'ok' if ok else 'FAILED'}")
+    finally:
+        teardown(conn)
+        conn.close()
+
+    if failed:
+        sys.exit(f"{failed} of {args.rounds} double submits were not refused")
+    print(f"{args.rounds} double submits, one ticket each")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# bench/explain_search.py : EXPLAIN + timing of the flight search queries,
+# old DATE(departure_time) filters vs the half-open ranges app.py now uses.
+#
+#   python bench/explain_search.py [--runs 20] [--page-size 50] [--json out.json]
+#
+# Run it once before applying the index migration in air_reservation.sql and
+# once after to see both effects (query shape and indexes). The current
+# statements come from flight_search.build_search / page_query, the same
+# code the routes run, including a keyset page after the first; only the
+# old DATE() forms are kept here as text.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection  # noqa: E402
+from flight_search import build_search, page_query, page_result  # noqa: E402
+from queries import run_query  # noqa: E402
+
+
+def sample_params(cur):
+    """Pick a real flight, and a customer and agent with purchases, so every
+    query has rows to find."""
+    cur.execute("""
+        SELECT airline_name, departure_airport, arrival_airport,
+               DATE(departure_time) AS day
+        FROM flight
+        ORDER BY departure_time DESC
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if not row:
+        sys.exit("flight table is empty, load sample data first")
+    cur.execute("""
+        SELECT customer_email, booking_agent_email
+        FROM purchases
+        WHERE booking_agent_email IS NOT NULL
+        LIMIT 1
+    """)
+    row.update(cur.fetchone() or {"customer_email": None, "booking_agent_email": None})
+    return row
+
+
+def cases(p):
+    day = p["day"]
+    airline = p["airline_name"]
+    origin = p["departure_airport"]
+    dest = p["arrival_airport"]
+    return [
+        {
+            "name": "public search by route + date",
+            "before": ("""
+                SELECT f.* FROM flight f
+                JOIN airport dep ON f.departure_airport = dep.airport_name
+                JOIN airport arr ON f.arrival_airport = arr.airport_name
+                WHERE status IN ('upcoming', 'in-progress')
+                  AND f.departure_airport = %s AND f.arrival_airport = %s
+                  AND DATE(f.departure_time) = %s
+                ORDER BY f.departure_time
+            """, (origin, dest, day)),
+            "after": build_search("public", {
+                "origin": origin, "destination": dest, "date": day}),
+        },
+        {
+            "name": "customer/agent search by date",
+            "before": ("""
+                SELECT * FROM flight
+                WHERE status = 'upcoming' AND DATE(departure_time) = %s
+            """, (day,)),
+            "after": build_search("upcoming", {"date": day}),
+        },
+        {
+            "name": "staff dashboard 30 days",
+            "before": ("""
+                SELECT * FROM flight
+                WHERE airline_name = %s
+                  AND DATE(departure_time) BETWEEN %s AND %s + INTERVAL 30 DAY
+                ORDER BY departure_time
+            """, (airline, day, day)),
+            "after": build_search("staff", {
+                "airline_name": airline, "start_date": day,
+                "end_date": day + timedelta(days=30)}),
+        },
+    ]
+
+
+def paged_cases(cur, p, page_size):
+    """Keyset pages as the routes read them: the first page and, when the
+    sample has one, the page after it (the cursor predicate)."""
+    searches = [
+        ("public search by route", "public",
+         {"origin": p["departure_airport"], "destination": p["arrival_airport"]}),
+        ("staff dashboard, whole schedule", "staff", {"airline_name": p["airline_name"]}),
+    ]
+    if p["customer_email"]:
+        searches += [
+            ("customer purchased flights", "purchased",
+             {"customer_email": p["customer_email"]}),
+            ("agent bookings", "bookings",
+             {"agent_email": p["booking_agent_email"]}),
+        ]
+    for name, kind, filters in searches:
+        query, state = page_query(kind, filters, page_size=page_size)
+        page = page_result(run_query(cur, query), state)
+        case = {"name": name, "first page": (query.sql, query.params)}
+        if page["next_cursor"]:
+            query, _ = page_query(kind, filters, after=page["next_cursor"],
+                                  page_size=page_size)
+            case["next page"] = (query.sql, query.params)
+        yield case
+
+
+def explain(cur, sql, params):
+    cur.execute("EXPLAIN " + sql, params)
+    return [
+        {k: row.get(k) for k in ("table", "type", "key", "rows", "Extra")}
+        for row in cur.fetchall()
+    ]
+
+
+def time_query(cur, sql, params, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the flight search queries")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    results = []
+    try:
+        with conn.cursor() as cur:
+            params = sample_params(cur)
+            for case in [*cases(params), *paged_cases(cur, params, args.page_size)]:
+                result = {"name": case.pop("name")}
+                for phase, (sql, p) in case.items():
+                    result[phase] = {
+                        "plan": explain(cur, sql, p),
+                        "median_ms": time_query(cur, sql, p, args.runs),
+                    }
+                results.append(result)
+    finally:
+        conn.close()
+
+    for r in results:
+        print(f"\n== {r['name']}")
+        for phase, run in r.items():
+            if phase == "name":
+                continue
+            print(f"  {phase}: {run['median_ms']} ms (median of {args.runs})")
+            for step in run["plan"]:
+                print(f"    {step['table']!s:<6} type={step['type']!s:<7} "
+                      f"key={step['key']} rows={step['rows']} {step['Extra'] or ''}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(results, fh, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# bench/fleet_load.py : throughput of loading a fleet, the old way (one
+# autocommitted INSERT per airplane and per seat class, as staff_add_airplane
+# used to do) vs fleet_loader.load_fleet (multi-row INSERTs, one transaction).
+#
+#   python bench/fleet_load.py [--airplanes 500] [--classes 3] [--batch-size 500] [--json out.json]
+#
+# Everything is written under a scratch airline that is deleted afterwards.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection  # noqa: E402
+from fleet_loader import load_fleet  # noqa: E402
+
+SCRATCH_AIRLINE = "zz-bench-fleet"
+
+
+def make_fleet(n_airplanes, n_classes):
+    return [
+        {
+            "airplane_id": airplane_id,
+            "seat_classes": [
+                {"seat_class_id": c, "seat_capacity": 100 // c, "multiplier": 1 + c / 2}
+                for c in range(1, n_classes + 1)
+            ],
+        }
+        for airplane_id in range(1, n_airplanes + 1)
+    ]
+
+
+def load_row_by_row(conn, airline_name, fleet):
+    # autocommit connection: every statement is its own transaction
+    with conn.cursor() as cur:
+        for plane in fleet:
+            cur.execute("INSERT INTO airplane (airline_name, airplane_id) VALUES (%s, %s)",
+                        (airline_name, plane["airplane_id"]))
+            for sc in plane["seat_classes"]:
+                cur.execute("""
+                    INSERT INTO seat_class
+                    (airline_name, airplane_id, seat_class_id, seat_capacity, multiplier)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (airline_name, plane["airplane_id"], sc["seat_class_id"],
+                      sc["seat_capacity"], sc["multiplier"]))
+
+
+def load_bulk(conn, airline_name, fleet, batch_size):
+    result = load_fleet(conn, airline_name, fleet, batch_size=batch_size)
+    if result["errors"]:
+        sys.exit(f"load_fleet refused the fleet: {result['errors'][:3]}")
+
+
+def reset(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM seat_class WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("DELETE FROM airplane WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        cur.execute("INSERT IGNORE INTO airline (airline_name) VALUES (%s)", (SCRATCH_AIRLINE,))
+
+
+def run(conn, name, load, fleet):
+    reset(conn)
+    started = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - started
+    rows = len(fleet) + sum(len(p["seat_classes"]) for p in fleet)
+    return {
+        "name": name,
+        "seconds": round(seconds, 4),
+        "airplanes_per_s": round(len(fleet) / seconds, 1),
+        "rows_per_s": round(rows / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fleet loading")
+    parser.add_argument("--airplanes", type=int, default=500)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args()
+
+    fleet = make_fleet(args.airplanes, args.classes)
+    conn = get_db_connection()
+    try:
+        results = [
+            run(conn, "row by row, autocommit",
+                lambda: load_row_by_row(conn, SCRATCH_AIRLINE, fleet), fleet),
+            run(conn, f"load_fleet, batches of {args.batch_size}",
+                lambda: load_bulk(conn, SCRATCH_AIRLINE, fleet, args.batch_size), fleet),
+        ]
+    finally:
+        reset(conn)
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM airline WHERE airline_name = %s", (SCRATCH_AIRLINE,))
+        conn.close()
+
+    print(f"{args.airplanes} airplanes x {args.classes} seat classes")
+    for r in results:
+        print(f"  {r['name']:<32} {r['seconds']:>8} s  "
+              f"{r['airplanes_per_s']:>9} airplanes/s  {r['rows_per_s']:>9} rows/s")
+    print(f"  speedup: {results[0]['seconds'] / results[1]['seconds']:.1f}x")
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# bench/gen_data.py : seeded synthetic data at benchmark scale
+#
+#   python bench/gen_data.py [--size small|medium|large] [--seed 1]
+#       [--flights N] [--tickets N] ... [--batch-size 1000] [--json out.json]
+#
+# Load it into an empty air_reservation schema: every generated name is
+# fixed, so a second run into the same database collides. The same seed
+# produces the same rows (dates are relative to the day it runs). Rows go
+# in with multi-row INSERTs (fleet_loader.insert_rows), with foreign key and
+# unique checks off for the session since the generator only produces
+# consistent data. The seat inventory and the sales / spending / commission
+# rollups are rebuilt at the end with the app's own rebuild functions.
+#
+# Every generated customer, agent and staff user has the password PASSWORD.
+# The bench scripts log in as them.
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from commission_ledger import rebuild_commissions  # noqa: E402
+from customer_spending import rebuild_customer_spending  # noqa: E402
+from db import get_db_connection  # noqa: E402
+from fleet_loader import STANDARD_CLASSES, insert_rows  # noqa: E402
+from inventory import rebuild_inventory  # noqa: E402
+from sales_rollup import rebuild_daily_sales  # noqa: E402
+from ticket_ids import TicketIdAllocator  # noqa: E402
+
+PASSWORD = "bench-password"
+
+# row counts per dataset size
+SIZES = {
+    "small": {"airlines": 5, "airports": 20, "airplanes": 10, "agents": 50,
+              "customers": 2_000, "flights": 10_000, "tickets": 50_000},
+    "medium": {"airlines": 20, "airports": 100, "airplanes": 50, "agents": 500,
+               "customers": 50_000, "flights": 200_000, "tickets": 1_000_000},
+    "large": {"airlines": 50, "airports": 300, "airplanes": 100, "agents": 2_000,
+              "customers": 500_000, "flights": 2_000_000, "tickets": 5_000_000},
+}
+
+# flights depart from a year ago to three months ahead
+PAST_DAYS = 365
+FUTURE_DAYS = 90
+
+STATUS_WEIGHTS = {"upcoming": 90, "delayed": 7, "in-progress": 3}
+CLASS_WEIGHTS = {1: 80, 2: 15, 3: 5}
+CLASS_CAPACITY = {1: (100, 200), 2: (20, 40), 3: (8, 16)}
+AGENT_SHARE = 0.3   # purchases made through an authorized agent
+
+
+def airline_name(i):
+    return f"Gen Air {i:03d}"
+
+
+def airport_name(i):
+    return f"G{i:04d}"
+
+
+def customer_email(i):
+    return f"customer{i}@gen.example"
+
+
+def agent_email(i):
+    return f"agent{i}@gen.example"
+
+
+def staff_username(i):
+    return f"gen-staff-{i:03d}"
+
+
+def generate(conn, counts, seed=1, batch_size=1000, log=print):
+    """Write the dataset described by `counts` (see SIZES); returns the
+    number of rows written per table."""
+    rng = random.Random(seed)
+    today = date.today()
+    password_hash = generate_password_hash(PASSWORD)
+    written = {}
+
+    def load(table, columns, rows):
+        started = time.perf_counter()
+        n = 0
+        with conn.cursor() as cur:
+            rows = iter(rows)
+            while True:
+                chunk = list(islice(rows, batch_size * 10))
+                if not chunk:
+                    break
+                insert_rows(cur, f"{table} ({columns})", chunk, batch_size)
+                n += len(chunk)
+        written[table] = written.get(table, 0) + n
+        log(f"  {table:<30} {n:>10} rows  {time.perf_counter() - started:8.1f} s")
+
+    n_airlines = counts["airlines"]
+    n_airports = counts["airports"]
+    n_airplanes = counts["airplanes"]
+
+    with conn.cursor() as cur:
+        cur.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+
+    load("airport", "airport_name, airport_city",
+         ((airport_name(i), f"Gen City {i // 2}") for i in range(n_airports)))
+    load("airline", "airline_name",
+         ((airline_name(i),) for i in range(n_airlines)))
+    load("airline_staff",
+         "username, password_hash, first_name, last_name, date_of_birth, airline_name, role",
+         ((staff_username(i), password_hash, "Gen", f"Staff {i}", date(1980, 1, 1),
+           airline_name(i), "both") for i in range(n_airlines)))
+
+    # fleets: every airplane gets the standard seat classes
+    capacity = {}   # (airline, airplane_id, class) -> seats
+    seat_rows = []
+    for a in range(n_airlines):
+        for plane in range(1, n_airplanes + 1):
+            for class_id, (_, multiplier) in STANDARD_CLASSES.items():
+                seats = rng.randint(*CLASS_CAPACITY[class_id])
+                capacity[a, plane, class_id] = seats
+                seat_rows.append((airline_name(a), plane, class_id, seats, multiplier))
+    load("airplane", "airline_name, airplane_id",
+         ((airline_name(a), p) for a in range(n_airlines) for p in range(1, n_airplanes + 1)))
+    load("seat_class", "airline_name, airplane_id, seat_class_id, seat_capacity, multiplier",
+         seat_rows)
+
+    # agents, each authorized for one to three airlines
+    agents_for = {a: [] for a in range(n_airlines)}
+    auth_rows = []
+    for i in range(counts["agents"]):
+        for a in rng.sample(range(n_airlines), min(n_airlines, rng.randint(1, 3))):
+            agents_for[a].append(i)
+            auth_rows.append((agent_email(i), airline_name(a)))
+    load("booking_agent", "email, password_hash",
+         ((agent_email(i), password_hash) for i in range(counts["agents"])))
+    load("agent_airline_authorization", "agent_email, airline_name", auth_rows)
+
+    load("customer",
+         "email, name, password_hash, building_number, street, city, state, phone_number, "
+         "passport_number, passport_expiration, passport_country, date_of_birth",
+         ((customer_email(i), f"Customer {i}", password_hash, str(1 + i % 500),
+           "Main St", f"Gen City {i % 50}", "NY", f"555{i:07d}"[-10:], f"P{i:08d}",
+           date(2035, 1, 1), "US", date(1970 + i % 40, 1 + i % 12, 1 + i % 28))
+          for i in range(counts["customers"])))
+
+    # flights: (airline index, flight_num, airplane_id, departure, base_price)
+    flights = []
+    first_departure = datetime.combine(today - timedelta(days=PAST_DAYS), datetime.min.time())
+    slots = (PAST_DAYS + FUTURE_DAYS) * 24 * 12     # five-minute slots
+    statuses = list(STATUS_WEIGHTS)
+    status_weights = list(STATUS_WEIGHTS.values())
+
+    def flight_rows():
+        for n in range(counts["flights"]):
+            a = n % n_airlines
+            origin, destination = rng.sample(range(n_airports), 2)
+            departure = first_departure + timedelta(minutes=5 * rng.randrange(slots))
+            arrival = departure + timedelta(minutes=rng.randint(60, 720))
+            price = rng.randint(80, 900)
+            plane = rng.randint(1, n_airplanes)
+            flight_num = 1 + n // n_airlines
+            flights.append((a, flight_num, plane, departure.date(), price))
+            yield (airline_name(a), flight_num, airport_name(origin), departure,
+                   airport_name(destination), arrival, price,
+                   rng.choices(statuses, status_weights)[0], plane)
+
+    load("flight",
+         "airline_name, flight_num, departure_airport, departure_time, "
+         "arrival_airport, arrival_time, base_price, status, airplane_id",
+         flight_rows())
+
+    # tickets and purchases; ids are one block reserved from ticket_sequence
+    ids = TicketIdAllocator(get_db_connection, block_size=max(counts["tickets"], 1))
+    first_id = ids.next_id()
+    sold = {}
+    classes = list(CLASS_WEIGHTS)
+    class_weights = list(CLASS_WEIGHTS.values())
+    skipped = 0
+
+    def sales():
+        nonlocal skipped
+        for n in range(counts["tickets"]):
+            a, flight_num, plane, departure, price = flights[rng.randrange(len(flights))]
+            class_id = rng.choices(classes, class_weights)[0]
+            key = (a, flight_num, class_id)
+            if sold.get(key, 0) >= capacity[a, plane, class_id]:
+                skipped += 1
+                continue
+            sold[key] = sold.get(key, 0) + 1
+
+            ticket_id = first_id + n
+            purchased = min(today, departure - timedelta(days=rng.randint(1, 60)))
+            agent = None
+            if agents_for[a] and rng.random() < AGENT_SHARE:
+                agent = agent_email(rng.choice(agents_for[a]))
+            yield ((ticket_id, airline_name(a), flight_num, plane, class_id),
+                   (ticket_id, customer_email(rng.randrange(counts["customers"])),
+                    agent, purchased, round(price * STANDARD_CLASSES[class_id][1])))
+
+    # written a chunk at a time, tickets before the purchases that point at them
+    started = time.perf_counter()
+    n = 0
+    rows = sales()
+    with conn.cursor() as cur:
+        while True:
+            chunk = list(islice(rows, batch_size * 10))
+            if not chunk:
+                break
+            insert_rows(cur, "ticket (ticket_id, airline_name, flight_num, airplane_id, "
+                             "seat_class_id)", [t for t, _ in chunk], batch_size)
+            insert_rows(cur, "purchases (ticket_id, customer_email, booking_agent_email, "
+                             "purchase_date, purchase_price)", [p for _, p in chunk], batch_size)
+            n += len(chunk)
+    written["ticket"] = written["purchases"] = n
+    flights.clear()
+    log(f"  {'ticket + purchases':<30} {n:>10} rows  {time.perf_counter() - started:8.1f} s")
+    if skipped:
+        log(f"  ({skipped} tickets skipped: seat class sold out)")
+
+    with conn.cursor() as cur:
+        cur.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+
+    for name, rebuild in (("seat_inventory", rebuild_inventory),
+                          ("daily_sales", rebuild_daily_sales),
+                          ("customer_monthly_spend", rebuild_customer_spending),
+                          ("agent commissions", rebuild_commissions)):
+        started = time.perf_counter()
+        rebuild(conn)
+        log(f"  {name:<30} {'rebuilt':>15}  {time.perf_counter() - started:8.1f} s")
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark data")
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    for name in SIZES["small"]:
+        parser.add_argument(f"--{name}", type=int, help=f"override the size's {name} count")
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args()
+
+    counts = dict(SIZES[args.size])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+    if counts["airports"] < 2 or min(counts.values()) < 1:
+        sys.exit("need at least 2 airports and one of everything else")
+
+    print(f"generating {args.size} dataset, seed {args.seed}: {counts}")
+    started = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        written = generate(conn, counts, seed=args.seed, batch_size=args.batch_size)
+    finally:
+        conn.close()
+    seconds = time.perf_counter() - started
+    print(f"done in {seconds:.1f} s")
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump({"size": args.size, "seed": args.seed, "counts": counts,
+                       "rows": written, "seconds": round(seconds, 1)}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# bench/load_asgi.py : requests per second of the hot read pages, under the
+# threaded WSGI server vs the ASGI server (asgi.py), with the same load.
+#
+#   flask --app app run --with-threads --port 5000
+#   uvicorn asgi:application --port 8000
+#   python bench/load_asgi.py [--sync http://127.0.0.1:5000] [--asgi http://127.0.0.1:8000]
+#       [--concurrency 32] [--seconds 10] [--login staff USERNAME PASSWORD] [--json out.json]
+#
+# Without --login only the public search is loaded; with it, that user's
+# dashboard (and staff analytics for staff) are added to the mix.
+
+import argparse
+import http.cookiejar
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+PUBLIC_PATHS = ["/search", "/search?origin=JFK", "/search?status=upcoming"]
+LOGGED_IN_PATHS = {
+    "customer": ["/customer"],
+    "agent": ["/agent"],
+    "staff": ["/staff", "/staff/analytics"],
+}
+
+
+def opener_for(base, login):
+    """urllib opener with its own cookie jar, logged in if asked to."""
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    if login:
+        user_type, identifier, password = login
+        form = urllib.parse.urlencode({
+            "user_type": user_type, "identifier": identifier, "password": password,
+        }).encode()
+        opener.open(base + "/login", form).read()
+    return opener
+
+
+def load(base, paths, login, concurrency, seconds):
+    stop = time.monotonic() + seconds
+    counts = {"ok": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        opener = opener_for(base, login)
+        i = n
+        ok, errors, mine = 0, 0, []
+        while time.monotonic() < stop:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                with opener.open(base + path) as resp:
+                    resp.read()
+                ok += 1
+                mine.append(time.perf_counter() - started)
+            except (urllib.error.URLError, OSError):
+                errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": counts["ok"],
+        "errors": counts["errors"],
+        "rps": round(counts["ok"] / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test sync vs ASGI serving")
+    parser.add_argument("--sync", default="http://127.0.0.1:5000")
+    parser.add_argument("--asgi", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--login", nargs=3, metavar=("TYPE", "IDENTIFIER", "PASSWORD"))
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args()
+
+    paths = list(PUBLIC_PATHS)
+    if args.login:
+        paths += LOGGED_IN_PATHS[args.login[0]]
+
+    results = []
+    for name, base in (("sync (WSGI)", args.sync), ("ASGI", args.asgi)):
+        r = load(base.rstrip("/"), paths, args.login, args.concurrency, args.seconds)
+        results.append(dict(r, name=name, base=base))
+
+    print(f"{len(paths)} paths, {args.concurrency} clients, {args.seconds} s each")
+    for r in results:
+        print(f"  {r['name']:<12} {r['rps']:>9} req/s  p50 {r['p50_ms']} ms  "
+              f"p95 {r['p95_ms']} ms  ({r['errors']} errors)")
+    if results[0]["rps"]:
+        print(f"  speedup: {results[1]['rps'] / results[0]['rps']:.2f}x")
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
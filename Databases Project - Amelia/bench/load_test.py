@@ -0,0 +1,325 @@
+# bench/load_test.py : per-endpoint latency and throughput of app.py
+#
+#   python bench/load_test.py [--url http://127.0.0.1:5000] [--concurrency 8]
+#       [--seconds 10] [--only staff_analytics,public_search] [--no-writes]
+#       [--json out.json] [--baseline old.json] [--fail-over 10]
+#
+# Each endpoint is loaded on its own, by `concurrency` clients for `seconds`,
+# and reported as requests/s and p50 / p95 / p99 latency. Without --url the
+# app runs in-process on Flask's test client, with sessions set directly.
+# With --url, requests go over HTTP to a running server and the clients log
+# in with the generated users' password (bench/gen_data.py). Either way the
+# users, flights and routes requested are sampled from the database in
+# config.py, so load it with gen_data.py first.
+#
+# --baseline compares against an earlier --json run. --fail-over N exits 1
+# when an endpoint's p95 grew, or its requests/s fell, by more than N%.
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection  # noqa: E402
+from gen_data import PASSWORD  # noqa: E402
+
+# request(sample, user, rng) -> (method, path, form data or None)
+Endpoint = namedtuple("Endpoint", "name role writes request")
+
+
+def _route(s, rng):
+    return rng.choice(s["routes"])
+
+
+def _flight_path(prefix, flights, rng):
+    airline, flight_num = rng.choice(flights)
+    return f"{prefix}/{urllib.parse.quote(airline)}/{flight_num}"
+
+
+ENDPOINTS = [
+    Endpoint("public_search", None, False, lambda s, u, rng: (
+        "GET", "/search?" + urllib.parse.urlencode(
+            dict(zip(("origin", "destination"), _route(s, rng)))), None)),
+    Endpoint("public_search_all", None, False, lambda s, u, rng: ("GET", "/search", None)),
+
+    Endpoint("customer_dashboard", "customer", False, lambda s, u, rng: ("GET", "/customer", None)),
+    Endpoint("customer_search", "customer", False, lambda s, u, rng: (
+        "POST", "/customer/search_flights",
+        dict(zip(("origin", "destination"), _route(s, rng))))),
+    Endpoint("customer_purchased_flights", "customer", False, lambda s, u, rng: (
+        "GET", "/customer/purchased_flights", None)),
+    Endpoint("customer_purchase", "customer", True, lambda s, u, rng: (
+        "POST", _flight_path("/customer/purchase", s["open_flights"], rng),
+        {"seat_class_id": 1})),
+
+    Endpoint("agent_dashboard", "agent", False, lambda s, u, rng: ("GET", "/agent", None)),
+    Endpoint("agent_search", "agent", False, lambda s, u, rng: (
+        "POST", "/agent/search", dict(zip(("origin", "destination"), _route(s, rng))))),
+    Endpoint("agent_bookings", "agent", False, lambda s, u, rng: ("GET", "/agent/bookings", None)),
+    Endpoint("agent_purchase", "agent", True, lambda s, u, rng: (
+        "POST", _flight_path("/agent/purchase", s["open_flights_by_airline"].get(
+            u["airline_name"]) or s["open_flights"], rng),
+        {"seat_class_id": 1, "customer_email": rng.choice(s["customers"])})),
+
+    Endpoint("staff_dashboard", "staff", False, lambda s, u, rng: ("GET", "/staff", None)),
+    Endpoint("staff_analytics", "staff", False, lambda s, u, rng: ("GET", "/staff/analytics", None)),
+    Endpoint("staff_passengers", "staff", False, lambda s, u, rng: (
+        "GET", _flight_path("/staff/passengers", s["sold_flights_by_airline"].get(
+            u["airline_name"]) or s["sold_flights"], rng), None)),
+    Endpoint("staff_customer_history", "staff", False, lambda s, u, rng: (
+        "POST", "/staff/customer_history", {"customer_email": rng.choice(s["customers"])})),
+]
+
+
+def sample(conn, limit=500):
+    """Users, routes and flights to request, from the database."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT departure_airport, arrival_airport FROM flight
+            WHERE status = 'upcoming' AND departure_time >= NOW()
+            LIMIT %s
+        """, (limit,))
+        routes = [(r["departure_airport"], r["arrival_airport"]) for r in cur.fetchall()]
+
+        cur.execute("""
+            SELECT si.airline_name, si.flight_num
+            FROM seat_inventory si
+            JOIN flight f ON f.airline_name = si.airline_name AND f.flight_num = si.flight_num
+            WHERE si.seat_class_id = 1 AND si.seats_remaining > 0
+              AND f.departure_time >= NOW()
+            LIMIT %s
+        """, (limit,))
+        open_flights = [(r["airline_name"], r["flight_num"]) for r in cur.fetchall()]
+
+        cur.execute("SELECT DISTINCT airline_name, flight_num FROM ticket LIMIT %s", (limit,))
+        sold_flights = [(r["airline_name"], r["flight_num"]) for r in cur.fetchall()]
+
+        cur.execute("SELECT DISTINCT customer_email FROM purchases LIMIT %s", (limit,))
+        customers = [r["customer_email"] for r in cur.fetchall()]
+
+        cur.execute("SELECT agent_email, airline_name FROM agent_airline_authorization LIMIT %s",
+                    (limit,))
+        agents = [{"user_type": "agent", "user_id": r["agent_email"],
+                   "airline_name": r["airline_name"]} for r in cur.fetchall()]
+
+        cur.execute("SELECT username, airline_name, role FROM airline_staff LIMIT %s", (limit,))
+        staff = [{"user_type": "staff", "user_id": r["username"],
+                  "airline_name": r["airline_name"], "staff_role": r["role"]}
+                 for r in cur.fetchall()]
+
+    if not (routes and open_flights and sold_flights and customers and agents and staff):
+        sys.exit("not enough data to sample from, run bench/gen_data.py first")
+
+    def by_airline(flights):
+        grouped = {}
+        for airline, flight_num in flights:
+            grouped.setdefault(airline, []).append((airline, flight_num))
+        return grouped
+
+    return {
+        "routes": routes,
+        "open_flights": open_flights,
+        "open_flights_by_airline": by_airline(open_flights),
+        "sold_flights": sold_flights,
+        "sold_flights_by_airline": by_airline(sold_flights),
+        "customers": customers,
+        "users": {
+            None: [{}],
+            "customer": [{"user_type": "customer", "user_id": c} for c in customers],
+            "agent": agents,
+            "staff": staff,
+        },
+    }
+
+
+class TestClientSession:
+    """In-process client; logs in by writing the session directly."""
+
+    def __init__(self, app, user):
+        self.client = app.test_client()
+        if user:
+            with self.client.session_transaction() as sess:
+                sess.update(user)
+
+    def request(self, method, path, data):
+        resp = self.client.open(path, method=method, data=data)
+        resp.close()
+        return resp.status_code
+
+
+class HttpSession:
+    """HTTP client with its own cookie jar, logged in through /login."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base, user):
+        self.base = base
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            self._NoRedirect)
+        if user:
+            self.request("POST", "/login", {"user_type": user["user_type"],
+                                            "identifier": user["user_id"],
+                                            "password": PASSWORD})
+
+    def request(self, method, path, data):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def run_endpoint(endpoint, samples, make_session, concurrency, seconds, seed):
+    users = samples["users"][endpoint.role]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(n):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + n)
+        user = users[n % len(users)]
+        session = make_session(user)
+        mine, failed = [], 0
+        ready.wait()
+        stop = time.monotonic() + seconds
+        while time.monotonic() < stop:
+            method, path, data = endpoint.request(samples, user, rng)
+            started = time.perf_counter()
+            try:
+                status = session.request(method, path, data)
+            except OSError:
+                status = None
+            if status is None or status >= 400:
+                failed += 1
+            else:
+                mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            errors += failed
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    started = time.monotonic()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    ms = [round(v * 1000, 2) for v in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def compare(results, baseline, fail_over):
+    """Print the change against a baseline run; returns the regressed names."""
+    regressed = []
+    print("\nagainst baseline:")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old or not old.get("rps") or not old.get("p95_ms") or not r["p95_ms"]:
+            continue
+        rps = (r["rps"] - old["rps"]) / old["rps"] * 100
+        p95 = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        flag = ""
+        if fail_over is not None and (p95 > fail_over or -rps > fail_over):
+            regressed.append(name)
+            flag = "  REGRESSED"
+        print(f"  {name:<28} req/s {rps:+7.1f}%   p95 {p95:+7.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test app.py endpoint by endpoint")
+    parser.add_argument("--url", help="server to load; default: in-process test client")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--only", help="comma-separated endpoint names")
+    parser.add_argument("--no-writes", action="store_true", help="skip the purchase endpoints")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_out")
+    parser.add_argument("--baseline", help="earlier --json output to compare with")
+    parser.add_argument("--fail-over", type=float, help="regression %% that fails the run")
+    args = parser.parse_args()
+
+    endpoints = ENDPOINTS
+    if args.only:
+        wanted = set(args.only.split(","))
+        unknown = wanted - {e.name for e in ENDPOINTS}
+        if unknown:
+            sys.exit(f"unknown endpoints: {', '.join(sorted(unknown))}")
+        endpoints = [e for e in endpoints if e.name in wanted]
+    if args.no_writes:
+        endpoints = [e for e in endpoints if not e.writes]
+
+    conn = get_db_connection()
+    try:
+        samples = sample(conn)
+    finally:
+        conn.close()
+
+    if args.url:
+        base = args.url.rstrip("/")
+        make_session = lambda user: HttpSession(base, user)  # noqa: E731
+    else:
+        from app import app
+        make_session = lambda user: TestClientSession(app, user)  # noqa: E731
+
+    print(f"{len(endpoints)} endpoints, {args.concurrency} clients, {args.seconds} s each, "
+          f"{args.url or 'in-process'}")
+    print(f"  {'endpoint':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    results = {}
+    for endpoint in endpoints:
+        r = run_endpoint(endpoint, samples, make_session,
+                         args.concurrency, args.seconds, args.seed)
+        results[endpoint.name] = r
+        print(f"  {endpoint.name:<28} {r['rps']:>8} {r['p50_ms']!s:>8} {r['p95_ms']!s:>8} "
+              f"{r['p99_ms']!s:>8} {r['errors']:>7}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump({"url": args.url, "concurrency": args.concurrency,
+                       "seconds": args.seconds, "endpoints": results}, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)["endpoints"]
+        if compare(results, baseline, args.fail_over):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# bench/route_bench.py : each view function of app.py timed in isolation, per
+# dataset size, with a regression gate against a saved run.
+#
+#   python bench/route_bench.py --size small=air_bench_small \
+#       [--size medium=air_bench_medium --size large=air_bench_large]
+#       [--rounds 30] [--only staff_analytics,public_search] [--no-writes]
+#       [--json bench/results.json] [--compare old.json] [--max-regression 15]
+#       [--prepared-statements on|off]
+#
+# Each --size names a MySQL database holding the schema, filled with
+# `bench/gen_data.py --size SIZE` (pass --generate to fill an empty one
+# here). The views run inside a test request context, without the HTTP
+# layer. Each one gets warmup calls and then `rounds` timed calls, with the
+# same sampled users, flights and routes as bench/load_test.py. The public
+# search cache and the rendered fragment cache are switched off so the
+# queries and the rendering are what gets timed.
+#
+# --prepared-statements overrides SEARCH_PREPARED_STATEMENTS for the run;
+# time both settings to see whether prepared searches pay for their extra
+# round trip on your server.
+#
+# --compare exits 1 when a view's median time grew by more than
+# --max-regression percent at any size found in both runs.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from gen_data import SIZES, generate  # noqa: E402
+from load_test import ENDPOINTS, sample  # noqa: E402
+from ticket_ids import TicketIdAllocator  # noqa: E402
+
+
+def use_database(views, name):
+    """Point the app at database `name`: new connections, a ticket id
+    allocator on its sequence and fresh reference data."""
+    db.DB_CONFIG["database"] = name
+    db.db_pool.close_all()
+    views.ticket_ids = TicketIdAllocator(db.get_db_connection,
+                                         block_size=views.TICKET_ID_BLOCK_SIZE)
+    views.reference.refresh()
+
+
+def table_counts(conn):
+    counts = {}
+    with conn.cursor() as cur:
+        for table in ("flight", "ticket", "purchases", "customer"):
+            cur.execute(f"SELECT COUNT(*) AS n FROM {table}")
+            counts[table] = cur.fetchone()["n"]
+    return counts
+
+
+def time_view(app, endpoint, samples, rounds, warmup, seed):
+    """Seconds per call of the view behind `endpoint`, `rounds` times."""
+    from flask import request, session
+
+    rng = random.Random(seed)
+    users = samples["users"][endpoint.role]
+    times = []
+    for i in range(warmup + rounds):
+        user = users[i % len(users)]
+        method, path, data = endpoint.request(samples, user, rng)
+        with app.test_request_context(path, method=method, data=data):
+            session.update(user)
+            view = app.view_functions[request.endpoint]
+            started = time.perf_counter()
+            response = app.make_response(view(**request.view_args))
+            elapsed = time.perf_counter() - started
+            response.close()
+        if response.status_code >= 400:
+            raise RuntimeError(f"{endpoint.name}: {method} {path} -> {response.status_code}")
+        if i >= warmup:
+            times.append(elapsed)
+    return times
+
+
+def summarize(times):
+    ms = [t * 1000 for t in times]
+    return {
+        "rounds": len(ms),
+        "min_ms": round(min(ms), 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "stdev_ms": round(statistics.stdev(ms), 3) if len(ms) > 1 else 0.0,
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def regressions(results, previous, max_regression):
+    """[(size, view, old ms, new ms, growth %)] of medians that grew too much."""
+    found = []
+    for size, run in results.items():
+        old_run = previous.get(size, {}).get("views", {})
+        for name, r in run["views"].items():
+            old = old_run.get(name)
+            if not old or not old["median_ms"]:
+                continue
+            growth = (r["median_ms"] - old["median_ms"]) / old["median_ms"] * 100
+            if growth > max_regression:
+                found.append((size, name, old["median_ms"], r["median_ms"], growth))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time app.py views per dataset size")
+    parser.add_argument("--size", action="append", required=True, metavar="SIZE=DATABASE",
+                        help=f"dataset size ({', '.join(SIZES)}) and the database holding it")
+    parser.add_argument("--generate", action="store_true",
+                        help="fill a size's database with gen_data.py if it has no flights")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", help="comma-separated view names")
+    parser.add_argument("--no-writes", action="store_true", help="skip the purchase views")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_out")
+    parser.add_argument("--compare", help="earlier --json output to gate against")
+    parser.add_argument("--max-regression", type=float, default=15.0,
+                        help="allowed growth of a median, in percent")
+    parser.add_argument("--prepared-statements", choices=("on", "off"),
+                        help="override SEARCH_PREPARED_STATEMENTS")
+    args = parser.parse_args()
+
+    sizes = []
+    for spec in args.size:
+        size, _, database = spec.partition("=")
+        if size not in SIZES or not database:
+            sys.exit(f"--size wants SIZE=DATABASE with SIZE one of {', '.join(SIZES)}")
+        sizes.append((size, database))
+
+    endpoints = ENDPOINTS
+    if args.only:
+        wanted = set(args.only.split(","))
+        endpoints = [e for e in endpoints if e.name in wanted]
+    if args.no_writes:
+        endpoints = [e for e in endpoints if not e.writes]
+
+    import app as views
+    import flight_search
+    if args.prepared_statements:
+        flight_search.SEARCH_PREPARED_STATEMENTS = args.prepared_statements == "on"
+    from result_cache import MemoryBackend
+    views.search_cache.backend = MemoryBackend(max_entries=0)
+    views.fragments.cache.backend = MemoryBackend(max_entries=0)
+
+    results = {}
+    for size, database in sizes:
+        use_database(views, database)
+        conn = db.get_db_connection()
+        try:
+            counts = table_counts(conn)
+            if not counts["flight"] and args.generate:
+                print(f"{size}: generating data into {database}")
+                generate(conn, SIZES[size], seed=args.seed)
+                counts = table_counts(conn)
+            samples = sample(conn)
+        finally:
+            conn.close()
+
+        print(f"{size} ({database}): "
+              + ", ".join(f"{n} {table}" for table, n in counts.items()))
+        run = {"database": database, "rows": counts, "views": {},
+               "prepared_statements": flight_search.SEARCH_PREPARED_STATEMENTS}
+        for endpoint in endpoints:
+            r = summarize(time_view(views.app, endpoint, samples,
+                                    args.rounds, args.warmup, args.seed))
+            run["views"][endpoint.name] = r
+            print(f"  {endpoint.name:<28} median {r['median_ms']:>9} ms  "
+                  f"min {r['min_ms']:>9} ms  stdev {r['stdev_ms']:>8} ms")
+        results[size] = run
+
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            previous = json.load(fh)
+        found = regressions(results, previous, args.max_regression)
+        for size, name, old, new, growth in found:
+            print(f"REGRESSION {size} {name}: median {old} ms -> {new} ms ({growth:+.1f}%)")
+        if found:
+            sys.exit(1)
+        print(f"no view regressed by more than {args.max_regression}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# commission_ledger.py : booking agent commissions, read by the agent dashboard
+#
+#   agent_commission           one row per agent sale, commission fixed at sale time
+#   agent_daily_commission     per agent and day
+#   agent_customer_commission  per agent, day and customer
+#
+# reservations.py writes all three inside the purchase transaction. The
+# dashboard only reads the daily rollups, as range scans on the agent's
+# primary key prefix. rebuild_commissions() fills gaps in the ledger from
+# purchases and recomputes the rollups from the ledger.
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from config import AGENT_COMMISSION_RATE
+from queries import Query
+
+
+def record_commission(cur, ticket_id, agent_email, customer_email,
+                      airline_name, sale_date, price):
+    # rounded like ROUND(purchase_price * rate, 2) in rebuild_commissions()
+    commission = (Decimal(price) * Decimal(str(AGENT_COMMISSION_RATE))).quantize(
+        Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    cur.execute("""
+        INSERT INTO agent_commission
+        (ticket_id, agent_email, customer_email, airline_name, sale_date,
+         purchase_price, commission)
+        VALUES (%s,%s,%s,%s,%s,%s,%s)
+    """, (ticket_id, agent_email, customer_email, airline_name, sale_date,
+          price, commission))
+
+    cur.execute("""
+        INSERT INTO agent_daily_commission (agent_email, sale_date, tickets, commission)
+        VALUES (%s,%s,1,%s)
+        ON DUPLICATE KEY UPDATE
+            tickets = tickets + 1,
+            commission = commission + VALUES(commission)
+    """, (agent_email, sale_date, commission))
+
+    cur.execute("""
+        INSERT INTO agent_customer_commission
+        (agent_email, sale_date, customer_email, tickets, commission)
+        VALUES (%s,%s,%s,1,%s)
+        ON DUPLICATE KEY UPDATE
+            tickets = tickets + 1,
+            commission = commission + VALUES(commission)
+    """, (agent_email, sale_date, customer_email, commission))
+
+
+def rebuild_commissions(conn, agent_email=None):
+    """Add ledger rows for agent purchases that lack one, then recompute both
+    rollups from the ledger, in one transaction.
+
+    Ledger rows that already exist keep the commission they were sold at.
+    Returns the number of ledger rows added.
+    """
+    purchases_where, where, params = "", "", []
+    if agent_email:
+        purchases_where = " AND p.booking_agent_email = %s"
+        where = " WHERE agent_email = %s"
+        params.append(agent_email)
+
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT IGNORE INTO agent_commission
+                (ticket_id, agent_email, customer_email, airline_name, sale_date,
+                 purchase_price, commission)
+                SELECT p.ticket_id, p.booking_agent_email, p.customer_email,
+                       t.airline_name, p.purchase_date, p.purchase_price,
+                       ROUND(p.purchase_price * %s, 2)
+                FROM purchases p
+                JOIN ticket t ON t.ticket_id = p.ticket_id
+                WHERE p.booking_agent_email IS NOT NULL
+            """ + purchases_where, [AGENT_COMMISSION_RATE] + params)
+            added = cur.rowcount
+
+            cur.execute("DELETE FROM agent_daily_commission" + where, params)
+            cur.execute("""
+                INSERT INTO agent_daily_commission (agent_email, sale_date, tickets, commission)
+                SELECT agent_email, sale_date, COUNT(*), SUM(commission)
+                FROM agent_commission
+            """ + where + """
+                GROUP BY agent_email, sale_date
+            """, params)
+
+            cur.execute("DELETE FROM agent_customer_commission" + where, params)
+            cur.execute("""
+                INSERT INTO agent_customer_commission
+                (agent_email, sale_date, customer_email, tickets, commission)
+                SELECT agent_email, sale_date, customer_email, COUNT(*), SUM(commission)
+                FROM agent_commission
+            """ + where + """
+                GROUP BY agent_email, sale_date, customer_email
+            """, params)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return added
+
+
+# Dashboard reports, as Query objects (see queries.py)
+
+def commission_summary(agent_email, start, end):
+    """Total and average commission and tickets sold, start..end inclusive."""
+    return Query("""
+        SELECT COALESCE(SUM(commission), 0) AS total_commission,
+               COALESCE(SUM(commission) / NULLIF(SUM(tickets), 0), 0) AS avg_commission,
+               COALESCE(SUM(tickets), 0) AS num_tickets
+        FROM agent_daily_commission
+        WHERE agent_email = %s
+          AND sale_date BETWEEN %s AND %s
+    """, (agent_email, start, end), "one")
+
+
+def top_customers_by_tickets(agent_email, since, limit=5):
+    return Query("""
+        SELECT customer_email, SUM(tickets) AS num_tickets
+        FROM agent_customer_commission
+        WHERE agent_email = %s AND sale_date >= %s
+        GROUP BY customer_email
+        ORDER BY num_tickets DESC
+        LIMIT %s
+    """, (agent_email, since, limit))
+
+
+def top_customers_by_commission(agent_email, since, limit=5):
+    return Query("""
+        SELECT customer_email, SUM(commission) AS total_commission
+        FROM agent_customer_commission
+        WHERE agent_email = %s AND sale_date >= %s
+        GROUP BY customer_email
+        ORDER BY total_commission DESC
+        LIMIT %s
+    """, (agent_email, since, limit))
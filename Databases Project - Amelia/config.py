@@ -6,3 +6,96 @@ DB_CONFIG = {
     "database": "air_reservation",
 }
 SECRET_KEY = "CHANGE_ME_TO_SOMETHING_RANDOM"
+
+# connection pool (see db.py)
+DB_POOL_CONFIG = {
+    "max_size": 10,
+    "max_lifetime": 1800,           # seconds before a connection is recycled
+    "checkout_timeout": 5.0,        # seconds to wait for a free connection
+    "health_check_interval": 30.0,  # ping idle connections older than this
+}
+DB_POOL_RETRY_AFTER = 5     # seconds a client waits after a 503 for a full pool
+
+# ticket ids reserved per worker at a time (see ticket_ids.py)
+TICKET_ID_BLOCK_SIZE = 100
+
+# flight search (see flight_search.py)
+# Server-side prepared statements skip the parse of the search, but over
+# pymysql's text protocol they cost a SET round trip before each EXECUTE.
+# Off until `bench/route_bench.py --prepared-statements on|off` shows a win.
+SEARCH_PREPARED_STATEMENTS = False
+SEARCH_STATEMENT_CACHE_SIZE = 32    # prepared statements kept per connection
+
+# keyset pagination of search results and booking histories
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# read-through cache for the public /search page (see result_cache.py)
+# backend: "memory" (per process), "local" (memcached stand-in) or "memcached"
+SEARCH_CACHE = {
+    "backend": "memory",
+    "ttl": 30,              # seconds; also bounds how stale "seats left" can be
+    "max_entries": 1024,
+    "server": "127.0.0.1:11211",
+}
+
+# seconds before other workers reload airlines / airports / seat classes
+REFERENCE_DATA_MAX_AGE = 300
+
+# booking agents earn this share of each ticket they sell
+AGENT_COMMISSION_RATE = 0.1
+
+# streaming exports (see exports.py)
+EXPORT_FETCH_SIZE = 1000        # rows read from the server per round trip
+EXPORT_CHUNK_BYTES = 64 * 1024  # bytes buffered before a chunk is sent
+EXPORT_NET_WRITE_TIMEOUT = 3600 # seconds the server waits on a slow reader
+
+# flight status events over Server-Sent Events (see flight_status.py)
+FLIGHT_EVENTS = {
+    "history": 256,     # recent events replayed to reconnecting clients
+    "max_queue": 100,   # events buffered per subscriber before dropping
+    "heartbeat": 15.0,  # seconds between keepalives on an idle stream
+    "max_flights": 100, # flights one stream may follow
+    "max_streams": 50,  # open streams per process, each holding a thread;
+                        # more are turned away with a 503 and Retry-After
+    "retry_after": 30,  # seconds a turned-away client waits to reconnect
+}
+
+# optional ASGI server, `uvicorn asgi:application` (see asgi.py)
+ASYNC_DB_POOL = {
+    "minsize": 2,
+    "maxsize": 20,          # staff analytics alone holds 7 at once
+    "pool_recycle": 1800,   # seconds before a connection is recycled
+}
+
+# independent dashboard queries run side by side (see queries.py)
+QUERY_FANOUT = {
+    "max_workers": None,    # threads shared by every request; None: one per
+                            # DB_POOL_CONFIG connection
+    "timeout": 10.0,        # seconds per query once it has a connection; the
+                            # server also stops a SELECT then
+}
+
+# per-statement SQL profiling (see sql_profiling.py); adds a little work to
+# every query, so it is off unless you are looking for something
+SQL_PROFILING = {
+    "enabled": False,
+    "slow_query_ms": 200,   # statements slower than this are logged
+    "explain_slow": True,   # ...with the EXPLAIN of the slow SELECT
+    "header": True,         # X-DB-Queries / X-DB-Time-Ms on every response
+    "top_statements": 20,   # statements listed per endpoint in /metrics/sql
+}
+
+# rendered HTML of the flight lists and analytics, keyed on data versions
+# (see fragment_cache.py); same backends as SEARCH_CACHE
+FRAGMENT_CACHE = {
+    "backend": "memory",
+    "ttl": 300,
+    "max_entries": 512,
+    "server": "127.0.0.1:11211",
+}
+
+# JSON API under /api/v1 (see api.py)
+API = {
+    "max_lookup": 100,  # flight keys per batch lookup
+}
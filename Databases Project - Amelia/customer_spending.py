@@ -0,0 +1,169 @@
+# customer_spending.py : per-customer monthly spending (customer_monthly_spend),
+# read by the customer dashboard
+#
+# reservations.py adds each purchase inside the purchase transaction.
+# rebuild_customer_spending() recomputes the table from purchases.
+#
+# A dashboard view reads one row per month of its span and keeps prefix sums,
+# so any range of days inside the span costs O(1). Ranges that start or end
+# mid-month are trimmed with a read of the purchases in those edge months
+# only, so the cost does not grow with the customer's history.
+
+import calendar
+from datetime import date, timedelta
+from itertools import accumulate
+
+from queries import Query
+
+
+def record_spend(cur, customer_email, purchase_date, price):
+    cur.execute("""
+        INSERT INTO customer_monthly_spend (customer_email, month, tickets, total)
+        VALUES (%s,%s,1,%s)
+        ON DUPLICATE KEY UPDATE
+            tickets = tickets + 1,
+            total = total + VALUES(total)
+    """, (customer_email, month_start(purchase_date), price))
+
+
+def rebuild_customer_spending(conn, customer_email=None):
+    """Recompute customer_monthly_spend from purchases, in one transaction.
+
+    Returns the number of rows written.
+    """
+    where, params = "", []
+    if customer_email:
+        where = " WHERE customer_email = %s"
+        params.append(customer_email)
+
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM customer_monthly_spend" + where, params)
+            cur.execute("""
+                INSERT INTO customer_monthly_spend (customer_email, month, tickets, total)
+                SELECT customer_email,
+                       DATE_FORMAT(purchase_date, '%%Y-%%m-01'),
+                       COUNT(*), SUM(purchase_price)
+                FROM purchases
+            """ + where + """
+                GROUP BY customer_email, DATE_FORMAT(purchase_date, '%%Y-%%m-01')
+            """, params)
+            written = cur.rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return written
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def month_label(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def spending_queries(customer_email, ranges):
+    """{name: Query} behind a SpendingSummary able to answer each (start, end)
+    date range in `ranges`; the queries are independent of each other."""
+    first, last = _span(ranges)
+    queries = {
+        "months": Query("""
+            SELECT month, total
+            FROM customer_monthly_spend
+            WHERE customer_email = %s AND month BETWEEN %s AND %s
+        """, (customer_email, first, last)),
+    }
+
+    # purchases in the part of each edge month that falls outside a range
+    edges = set()
+    for start, end in ranges:
+        if start != month_start(start):
+            edges.add((month_start(start), start - timedelta(days=1)))
+        if end != month_end(end):
+            edges.add((end + timedelta(days=1), month_end(end)))
+    if edges:
+        edges = sorted(edges)
+        queries["edges"] = Query("""
+            SELECT purchase_date, purchase_price
+            FROM purchases
+            WHERE customer_email = %s
+              AND ({})
+        """.format(" OR ".join(["purchase_date BETWEEN %s AND %s"] * len(edges))),
+            [customer_email] + [day for edge in edges for day in edge])
+    return queries
+
+
+def spending_summary(ranges, results):
+    """SpendingSummary from the results of spending_queries(.., ranges)."""
+    first, last = _span(ranges)
+    totals = {row["month"]: float(row["total"]) for row in results["months"]}
+    purchases = [(row["purchase_date"], float(row["purchase_price"]))
+                 for row in results.get("edges", ())]
+
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = month_end(month) + timedelta(days=1)
+
+    return SpendingSummary(months, [totals.get(m, 0.0) for m in months], purchases)
+
+
+def _span(ranges):
+    return (month_start(min(start for start, _ in ranges)),
+            month_start(max(end for _, end in ranges)))
+
+
+class SpendingSummary:
+    """Monthly totals of one customer over a span of months."""
+
+    def __init__(self, months, amounts, edge_purchases):
+        self.months = months
+        self.amounts = amounts
+        self._index = {m: i for i, m in enumerate(months)}
+        self._prefix = list(accumulate(amounts, initial=0.0))
+        self._edge_purchases = edge_purchases
+
+    def total(self, start, end):
+        """Amount spent from start to end, both inclusive."""
+        if start > end:
+            return 0.0
+        i, j = self._index[month_start(start)], self._index[month_start(end)]
+        return round(self._prefix[j + 1] - self._prefix[i]
+                     - self._before(start) - self._after(end), 2)
+
+    def monthly(self, start, end):
+        """[(label, amount)] for every month from start to end, both inclusive."""
+        if start > end:
+            return []
+        i, j = self._index[month_start(start)], self._index[month_start(end)]
+        amounts = self.amounts[i:j + 1]
+        amounts[0] -= self._before(start)
+        amounts[-1] -= self._after(end)
+        return [(month_label(m), round(a, 2))
+                for m, a in zip(self.months[i:j + 1], amounts)]
+
+    def _before(self, day):
+        # spent in day's month before day
+        first = month_start(day)
+        return sum(p for d, p in self._edge_purchases if first <= d < day)
+
+    def _after(self, day):
+        # spent in day's month after day
+        last = month_end(day)
+        return sum(p for d, p in self._edge_purchases if day < d <= last)
+
+
+def parse_date_range(start, end):
+    """(start, end) as dates from form values, or None if either is invalid."""
+    try:
+        return date.fromisoformat(start or ""), date.fromisoformat(end or "")
+    except ValueError:
+        return None
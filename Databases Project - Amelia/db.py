@@ -0,0 +1,204 @@
+# db.py : MySQL connection pool shared by every route
+
+import threading
+import time
+from contextlib import contextmanager
+
+import pymysql
+from pymysql.constants.SERVER_STATUS import SERVER_STATUS_IN_TRANS
+
+from config import DB_POOL_CONFIG
+from sql_profiling import cursor_class
+
+DB_CONFIG = {
+    'host': '127.0.0.1',
+    'user': 'root',
+    'password': '',
+    'port': 3306,
+    'database': 'air_reservation',
+    'charset': 'utf8mb4'
+}
+
+
+# DB Connection
+
+def get_db_connection():
+    return pymysql.connect(
+        host=DB_CONFIG['host'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        port=DB_CONFIG['port'],
+        db=DB_CONFIG['database'],
+        charset=DB_CONFIG['charset'],
+        cursorclass=cursor_class(),
+        autocommit=True
+    )
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within checkout_timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of connections made by `connect`.
+
+    Idle connections are pinged before reuse once they have sat longer than
+    health_check_interval, and any connection older than max_lifetime is
+    closed instead of being handed out again.
+    """
+
+    def __init__(self, connect, max_size=10, max_lifetime=1800,
+                 checkout_timeout=5.0, health_check_interval=30.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []       # (conn, created_at, returned_at), used as a stack
+        self._born = {}       # id(conn) -> created_at for checked-out conns
+        self._size = 0
+
+        # metrics
+        self.in_use = 0
+        self.waiting = 0
+        self.created = 0
+        self.recycled = 0
+        self.timeouts = 0
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, born, returned = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # reserve a slot, connect outside the lock
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"no database connection free after {self.checkout_timeout}s"
+                    )
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+
+        try:
+            if conn is not None and not self._usable(conn, born, returned):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                born = time.monotonic()
+                with self._cond:
+                    self.created += 1
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self.in_use -= 1
+                self._cond.notify()
+            raise
+
+        self._born[id(conn)] = born
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard and conn.server_status & SERVER_STATUS_IN_TRANS:
+            # a borrower began a transaction and never finished it; its locks
+            # must not pass to the next one
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        born = self._born.pop(id(conn), now)
+        if not discard and now - born > self.max_lifetime:
+            discard = True
+            with self._cond:
+                self.recycled += 1
+        if discard:
+            self._close_quietly(conn)
+
+        with self._cond:
+            self.in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, born, now))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            # the socket may be dead, never hand it out again
+            discard = True
+            raise
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "created": self.created,
+                "recycled": self.recycled,
+                "timeouts": self.timeouts,
+            }
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def _usable(self, conn, born, returned):
+        now = time.monotonic()
+        if now - born > self.max_lifetime:
+            with self._cond:
+                self.recycled += 1
+            return False
+        if now - returned > self.health_check_interval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+db_pool = ConnectionPool(get_db_connection, **DB_POOL_CONFIG)
+
+
+def db_connection():
+    """Check a connection out of the shared pool: `with db_connection() as conn:`"""
+    return db_pool.connection()
@@ -0,0 +1,126 @@
+# exports.py : streaming CSV / NDJSON exports
+#
+# Rows come from an unbuffered server-side cursor (SSDictCursor) and are
+# written out in chunks by a generator, so an export of any size holds only
+# one fetch batch and one output chunk in memory. Responses have no
+# Content-Length and go out with chunked transfer encoding.
+#
+# A download lasts as long as the client takes to read it, so each export
+# opens its own connection instead of holding one of the shared pool's, and
+# raises net_write_timeout for it: a slow reader stalls the server-side
+# result, which the server would otherwise abort mid-file.
+
+import csv
+import io
+import json
+import zlib
+
+import pymysql
+from flask import Response
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+class RowStream:
+    """Rows of one query, read from the server as they are iterated.
+
+    The query runs when the stream is opened, so a bad query fails before a
+    response is started. The stream opens its own connection with `connect`
+    and closes it once exhausted or closed.
+    """
+
+    def __init__(self, connect, sql, params=(), fetch_size=1000, net_write_timeout=None):
+        self.fetch_size = fetch_size
+        self._conn = connect()
+        try:
+            self._cur = self._conn.cursor(pymysql.cursors.SSDictCursor)
+            if net_write_timeout:
+                self._cur.execute("SET SESSION net_write_timeout = %s", (net_write_timeout,))
+            self._cur.execute(sql, params)
+        except BaseException:
+            self.close()
+            raise
+        self.columns = [column[0] for column in self._cur.description]
+
+    def __iter__(self):
+        try:
+            while True:
+                rows = self._cur.fetchmany(self.fetch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            self.close()
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        # the connection is the stream's own; closing it also drops the rest
+        # of an unfinished unbuffered result
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def csv_chunks(rows, columns, chunk_bytes=65536):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row[c] is None else row[c] for c in columns])
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def ndjson_chunks(rows, chunk_bytes=65536):
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(row, default=str, separators=(",", ":")) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield "".join(lines).encode()
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines).encode()
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)   # 31: gzip framing
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(stream, fmt, filename, compress=False, chunk_bytes=65536):
+    """Streaming download of a RowStream as CSV or NDJSON, optionally gzipped."""
+    mimetype, extension = FORMATS[fmt]
+    if fmt == "csv":
+        chunks = csv_chunks(stream, stream.columns, chunk_bytes)
+    else:
+        chunks = ndjson_chunks(stream, chunk_bytes)
+
+    filename = f"{filename}.{extension}"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+
+    response = Response(chunks, content_type=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    # ask reverse proxies to pass chunks straight through
+    response.headers["X-Accel-Buffering"] = "no"
+    # the generator may never start if the client goes away first
+    response.call_on_close(stream.close)
+    return response
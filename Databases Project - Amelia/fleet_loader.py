@@ -0,0 +1,176 @@
+# fleet_loader.py : add many airplanes and their seat classes at once
+#
+# A fleet is all or nothing: every airplane is checked first (formats in
+# Python, already-used ids with one query), and only a clean fleet is
+# written, with multi-row INSERTs in a single transaction. An airplane can
+# therefore never end up without its seat classes.
+
+import csv
+import io
+import json
+
+# seat classes of the single-airplane form: id -> (name, multiplier)
+STANDARD_CLASSES = {
+    1: ("economy", 1.0),
+    2: ("business", 1.5),
+    3: ("first", 2.0),
+}
+
+
+class FleetFormatError(ValueError):
+    """The upload as a whole could not be read."""
+
+
+def parse_fleet(text, fmt):
+    """Airplane dicts from JSON or CSV.
+
+    JSON: [{"airplane_id": 7, "seat_classes": [{"seat_class_id": 1,
+    "seat_capacity": 150, "multiplier": 1.0}, ...]}, ...]
+    CSV: one line per seat class, with columns airplane_id, seat_class_id,
+    seat_capacity and multiplier.
+    """
+    if fmt == "json":
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise FleetFormatError(f"invalid JSON: {e}")
+        return json_fleet(data)
+
+    reader = csv.DictReader(io.StringIO(text))
+    columns = ("airplane_id", "seat_class_id", "seat_capacity", "multiplier")
+    missing = [c for c in columns if c not in (reader.fieldnames or ())]
+    if missing:
+        raise FleetFormatError("CSV header is missing: " + ", ".join(missing))
+
+    airplanes = {}
+    for row in reader:
+        plane = airplanes.setdefault(row["airplane_id"], {
+            "airplane_id": row["airplane_id"], "seat_classes": [],
+        })
+        plane["seat_classes"].append({c: row[c] for c in columns[1:]})
+    return list(airplanes.values())
+
+
+def json_fleet(data):
+    """Airplane dicts from decoded JSON: an array, or {"airplanes": [...]}."""
+    if isinstance(data, dict):
+        data = data.get("airplanes")
+    if not isinstance(data, list) or not all(isinstance(a, dict) for a in data):
+        raise FleetFormatError("JSON fleet must be an array of airplane objects")
+    return data
+
+
+def load_fleet(conn, airline_name, airplanes, batch_size=500):
+    """Insert the airplanes and their seat classes, all or nothing.
+
+    Returns {"airplanes": n, "seat_classes": n, "errors": [{"airplane_id",
+    "error"}]}; nothing is written when errors is not empty.
+    """
+    errors = []
+    planes = []
+    seen = set()
+    for raw in airplanes:
+        try:
+            plane = _clean(raw)
+        except ValueError as e:
+            errors.append(_error(raw.get("airplane_id"), str(e)))
+            continue
+        if plane["airplane_id"] in seen:
+            errors.append(_error(plane["airplane_id"], "airplane listed twice"))
+            continue
+        seen.add(plane["airplane_id"])
+        planes.append(plane)
+
+    if not planes and not errors:
+        errors.append(_error(None, "no airplanes given"))
+    if errors:
+        return {"airplanes": 0, "seat_classes": 0, "errors": errors}
+
+    seat_rows = [
+        (airline_name, p["airplane_id"], sc["seat_class_id"],
+         sc["seat_capacity"], sc["multiplier"])
+        for p in planes for sc in p["seat_classes"]
+    ]
+
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT airplane_id FROM airplane
+                WHERE airline_name = %s AND airplane_id IN %s
+                FOR UPDATE
+            """, (airline_name, tuple(seen)))
+            taken = sorted(row["airplane_id"] for row in cur.fetchall())
+            if taken:
+                conn.rollback()
+                return {
+                    "airplanes": 0,
+                    "seat_classes": 0,
+                    "errors": [_error(a, "airplane id already exists") for a in taken],
+                }
+
+            insert_rows(cur, "airplane (airline_name, airplane_id)",
+                        [(airline_name, p["airplane_id"]) for p in planes], batch_size)
+            insert_rows(cur, """seat_class
+                (airline_name, airplane_id, seat_class_id, seat_capacity, multiplier)""",
+                        seat_rows, batch_size)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return {"airplanes": len(planes), "seat_classes": len(seat_rows), "errors": []}
+
+
+def insert_rows(cur, target, rows, batch_size=500):
+    """INSERT INTO target VALUES (...), (...), ... in batches of batch_size."""
+    if not rows:
+        return
+    placeholders = "(" + ",".join(["%s"] * len(rows[0])) + ")"
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        cur.execute(
+            f"INSERT INTO {target} VALUES " + ",".join([placeholders] * len(batch)),
+            [value for row in batch for value in row],
+        )
+
+
+def _clean(raw):
+    try:
+        airplane_id = int(raw.get("airplane_id"))
+    except (TypeError, ValueError):
+        raise ValueError("airplane_id must be a number")
+
+    classes = raw.get("seat_classes")
+    if not isinstance(classes, list) or not classes:
+        raise ValueError("an airplane needs at least one seat class")
+
+    seat_classes = []
+    class_ids = set()
+    for sc in classes:
+        if not isinstance(sc, dict):
+            raise ValueError("seat classes must be objects")
+        try:
+            seat_class_id = int(sc.get("seat_class_id"))
+            seat_capacity = int(sc.get("seat_capacity"))
+            multiplier = float(sc.get("multiplier", 1.0))
+        except (TypeError, ValueError):
+            raise ValueError("seat_class_id, seat_capacity and multiplier must be numbers")
+        if seat_class_id in class_ids:
+            raise ValueError(f"seat class {seat_class_id} listed twice")
+        if seat_capacity <= 0:
+            raise ValueError("seat_capacity must be positive")
+        if multiplier <= 0:
+            raise ValueError("multiplier must be positive")
+        class_ids.add(seat_class_id)
+        seat_classes.append({
+            "seat_class_id": seat_class_id,
+            "seat_capacity": seat_capacity,
+            "multiplier": multiplier,
+        })
+
+    return {"airplane_id": airplane_id, "seat_classes": seat_classes}
+
+
+def _error(airplane_id, message):
+    return {"airplane_id": airplane_id, "error": message}
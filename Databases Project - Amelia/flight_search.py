@@ -0,0 +1,364 @@
+# flight_search.py : canonical flight search queries shared by the search routes
+#
+# Every search is built from a fixed template per kind, with the filters
+# always appended in the same order and the departure_time range always
+# present, so the server only ever sees a handful of distinct query texts.
+# With SEARCH_PREPARED_STATEMENTS those texts run as server-side prepared
+# statements, cached per connection.
+
+import base64
+import json
+import math
+import threading
+import weakref
+from collections import OrderedDict
+
+import pymysql
+
+from config import SEARCH_PREPARED_STATEMENTS, SEARCH_STATEMENT_CACHE_SIZE
+from inventory import SEATS_REMAINING_SQL
+from queries import Query, run_query
+
+# open-ended departure range used when no date filter is given
+EARLIEST_DAY = "1000-01-01"
+LATEST_DAY = "9999-12-30"
+
+# optional filters: form field -> predicate, in the order they are appended
+FILTERS = OrderedDict([
+    ("airline_name", "f.airline_name = %s"),
+    ("flight_num", "f.flight_num = %s"),
+    ("customer_email", "p.customer_email = %s"),
+    ("origin", "f.departure_airport = %s"),
+    ("destination", "f.arrival_airport = %s"),
+    ("dep_city", "dep.airport_city = %s"),
+    ("arr_city", "arr.airport_city = %s"),
+])
+
+DEPARTURE_RANGE = "f.departure_time >= %s AND f.departure_time < %s + INTERVAL 1 DAY"
+
+# keyset for flight lists: (column, row field); histories add the ticket id
+# because one flight can appear once per ticket
+FLIGHT_KEY = (
+    ("f.departure_time", "departure_time"),
+    ("f.airline_name", "airline_name"),
+    ("f.flight_num", "flight_num"),
+)
+TICKET_KEY = FLIGHT_KEY + (("t.ticket_id", "ticket_id"),)
+
+SEARCHES = {
+    # /search: upcoming + in-progress flights with their cities
+    "public": {
+        "select": """
+            SELECT f.*,
+                   dep.airport_city AS dep_city,
+                   arr.airport_city AS arr_city,
+                   """ + SEATS_REMAINING_SQL + """ AS seats_remaining
+            FROM flight f
+            JOIN airport dep ON f.departure_airport = dep.airport_name
+            JOIN airport arr ON f.arrival_airport = arr.airport_name
+            WHERE f.status IN (%s, %s)
+        """,
+        "default_status": ("upcoming", "in-progress"),
+        "filters": ("airline_name", "flight_num", "origin", "destination",
+                    "dep_city", "arr_city"),
+        "key": FLIGHT_KEY,
+    },
+    # customer search: upcoming flights only
+    "upcoming": {
+        "select": """
+            SELECT f.*, """ + SEATS_REMAINING_SQL + """ AS seats_remaining
+            FROM flight f
+            WHERE f.status IN (%s, %s)
+        """,
+        "default_status": ("upcoming", "upcoming"),
+        "filters": ("origin", "destination"),
+        "key": FLIGHT_KEY,
+    },
+    # agent search: upcoming flights of the airlines the agent may sell
+    "agent": {
+        "select": """
+            SELECT f.*, """ + SEATS_REMAINING_SQL + """ AS seats_remaining
+            FROM flight f
+            JOIN agent_airline_authorization auth
+              ON auth.airline_name = f.airline_name
+             AND auth.agent_email = %s
+            WHERE f.status IN (%s, %s)
+        """,
+        "scope": "agent_email",
+        "default_status": ("upcoming", "upcoming"),
+        "filters": ("origin", "destination"),
+        "key": FLIGHT_KEY,
+    },
+    # staff dashboard: one airline's flights, any status
+    "staff": {
+        "select": """
+            SELECT f.*
+            FROM flight f
+            WHERE f.airline_name = %s
+        """,
+        "scope": "airline_name",
+        "filters": ("origin", "destination"),
+        "key": FLIGHT_KEY,
+    },
+    # bookings an agent has made
+    "bookings": {
+        "select": """
+            SELECT f.*, p.customer_email, t.ticket_id
+            FROM purchases p
+            JOIN ticket t ON p.ticket_id = t.ticket_id
+            JOIN flight f ON f.airline_name = t.airline_name
+                          AND f.flight_num = t.flight_num
+            WHERE p.booking_agent_email = %s
+        """,
+        "scope": "agent_email",
+        "filters": ("customer_email", "origin", "destination"),
+        "key": TICKET_KEY,
+        "descending": True,
+    },
+    # flights a customer has bought
+    "purchased": {
+        "select": """
+            SELECT f.*, t.ticket_id
+            FROM purchases p
+            JOIN ticket t ON p.ticket_id = t.ticket_id
+            JOIN flight f ON f.airline_name = t.airline_name
+                          AND f.flight_num = t.flight_num
+            WHERE p.customer_email = %s
+        """,
+        "scope": "customer_email",
+        "filters": ("origin", "destination"),
+        "key": TICKET_KEY,
+        "descending": True,
+    },
+}
+
+
+def build_search(kind, filters, cursor=None, backwards=False, limit=None):
+    """Return (sql, params) for a search of this kind.
+
+    `filters` holds form values; blank values are ignored. "date" restricts
+    to one day, "start_date" / "end_date" to an inclusive range of days.
+    `cursor` is the key of the row to continue from (see decode_cursor);
+    with backwards=True the page before it is read, in reverse order.
+    """
+    spec = SEARCHES[kind]
+    sql = spec["select"]
+    params = []
+
+    if "scope" in spec:
+        params.append(filters[spec["scope"]])
+
+    if "default_status" in spec:
+        status = filters.get("status")
+        params.extend((status, status) if status else spec["default_status"])
+
+    for name in spec["filters"]:
+        value = filters.get(name)
+        if value:
+            sql += " AND " + FILTERS[name]
+            params.append(value)
+
+    start = filters.get("date") or filters.get("start_date") or EARLIEST_DAY
+    end = filters.get("date") or filters.get("end_date") or LATEST_DAY
+    sql += " AND " + DEPARTURE_RANGE
+    params.extend((start, end))
+
+    columns = [column for column, _ in spec["key"]]
+    descending = spec.get("descending", False) != backwards
+
+    if cursor is not None:
+        # MySQL does not seek an index on a row comparison, so the leading
+        # column gets its own range and only ties compare the rest
+        op = "<" if descending else ">"
+        first, rest = columns[0], columns[1:]
+        sql += " AND {0} {1}= %s AND ({0} {1} %s OR ({0} = %s AND ({2}) {1} ({3})))".format(
+            first, op, ", ".join(rest), ", ".join(["%s"] * len(rest)),
+        )
+        params.extend([cursor[0]] * 3 + list(cursor[1:]))
+
+    direction = " DESC" if descending else ""
+    sql += " ORDER BY " + ", ".join(c + direction for c in columns)
+
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+
+    return sql, params
+
+
+def search_flights(conn, kind, filters):
+    sql, params = build_search(kind, filters)
+    return _run(conn, sql, params)
+
+
+def search_page(conn, kind, filters, after=None, before=None, page_size=50):
+    """One keyset page of a search.
+
+    Returns {"rows", "next_cursor", "prev_cursor"}; pass a cursor back as
+    `after` / `before` to move forward / back. Only page_size + 1 rows are
+    ever fetched, however long the full result is.
+    """
+    query, state = page_query(kind, filters, after, before, page_size)
+    with conn.cursor() as cur:
+        return page_result(run_query(cur, query), state)
+
+
+def page_query(kind, filters, after=None, before=None, page_size=50):
+    """(Query, state) for one page; feed the rows and state to page_result.
+    search_page() does both; this split lets asgi.py run the query itself."""
+    spec = SEARCHES[kind]
+    cursor = decode_cursor(before, spec["key"])
+    backwards = cursor is not None
+    if not backwards:
+        cursor = decode_cursor(after, spec["key"])
+
+    sql, params = build_search(kind, filters, cursor=cursor,
+                               backwards=backwards, limit=page_size + 1)
+    state = {"key": spec["key"], "backwards": backwards,
+             "has_cursor": cursor is not None, "page_size": page_size}
+    return Query(sql, params, prepared=True), state
+
+
+def page_result(rows, state):
+    page_size = state["page_size"]
+    has_more = len(rows) > page_size
+    rows = list(rows[:page_size])
+    if state["backwards"]:
+        rows.reverse()
+
+    if state["backwards"]:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, state["has_cursor"]
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1], state["key"])
+    if rows and has_prev:
+        prev_cursor = encode_cursor(rows[0], state["key"])
+
+    return {"rows": rows, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+def encode_cursor(row, key):
+    values = [row[field] for _, field in key]
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, key):
+    """Key values from a cursor token; None for a missing or bad token."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(key):
+        return None
+    # a tampered token must not reach the query as a row or a dict
+    if not all(_cursor_value(v) for v in values):
+        return None
+    return values
+
+
+def _cursor_value(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (str, int))
+
+
+def _run(conn, sql, params):
+    with conn.cursor() as cur:
+        execute_search(cur, sql, params)
+        return cur.fetchall()
+
+
+def execute_search(cur, sql, params):
+    if SEARCH_PREPARED_STATEMENTS:
+        statement_cache(cur.connection).execute(cur, sql, params)
+    else:
+        cur.execute(sql, params)
+
+
+# Prepared statements
+
+ER_UNKNOWN_STMT_HANDLER = 1243
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def statement_cache(conn):
+    """The prepared statement cache that belongs to this connection."""
+    with _caches_lock:
+        cache = _caches.get(conn)
+        if cache is None:
+            cache = _caches[conn] = StatementCache(SEARCH_STATEMENT_CACHE_SIZE)
+        return cache
+
+
+class StatementCache:
+    """LRU of server-side prepared statements on one connection.
+
+    Statements are prepared with PREPARE ... FROM and run with EXECUTE ...
+    USING user variables, which works over pymysql's text protocol but takes
+    two round trips (SET, then EXECUTE) per search. The least recently used
+    statement is deallocated once the cache is full.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._stmts = OrderedDict()     # sql -> statement name
+        self._counter = 0
+        self.hits = 0
+        self.misses = 0
+
+    def execute(self, cur, sql, params):
+        try:
+            self._execute(cur, sql, params)
+        except pymysql.err.OperationalError as e:
+            # the server forgot our statements (e.g. it was restarted)
+            if not e.args or e.args[0] != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            self._stmts.clear()
+            self._execute(cur, sql, params)
+
+    def _execute(self, cur, sql, params):
+        name = self._stmts.get(sql)
+        if name is None:
+            self.misses += 1
+            name = self._prepare(cur, sql)
+        else:
+            self.hits += 1
+            self._stmts.move_to_end(sql)
+
+        if params:
+            names = [f"@{name}_{i}" for i in range(len(params))]
+            cur.execute(
+                "SET " + ", ".join(f"{n} = %s" for n in names), params
+            )
+            execute = f"EXECUTE {name} USING " + ", ".join(names)
+        else:
+            execute = f"EXECUTE {name}"
+
+        # a profiling cursor (sql_profiling.py) times it as the search itself
+        cur.prepared_as = (sql, params)
+        try:
+            cur.execute(execute)
+        finally:
+            cur.prepared_as = None
+
+    def _prepare(self, cur, sql):
+        while len(self._stmts) >= self.size:
+            _, old = self._stmts.popitem(last=False)
+            cur.execute(f"DEALLOCATE PREPARE {old}")
+
+        self._counter += 1
+        name = f"search_{self._counter}"
+        cur.execute(f"PREPARE {name} FROM %s", (sql.replace("%s", "?"),))
+        self._stmts[sql] = name
+        return name
@@ -0,0 +1,219 @@
+# flight_status.py : batched flight status updates and the in-process event
+# bus that carries them to Server-Sent Events subscribers
+#
+# update_statuses() applies many (flight_num, status) changes in one
+# transaction and, once committed, publishes one event per flight whose
+# status actually changed. The bus lives in this process only: with several
+# worker processes a subscriber sees the changes made through its own
+# worker, so point publish() at a shared broker when running more than one.
+
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+STATUSES = ("upcoming", "in-progress", "delayed")
+
+# per-flight results of update_statuses
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not found"
+INVALID = "invalid"
+
+
+def update_statuses(conn, airline_name, changes, bus=None):
+    """Apply [(flight_num, status), ...] to airline_name's flights.
+
+    All changes commit together. Returns (results, events): results is
+    [{"flight_num", "status", "result"}] in input order (a repeated flight
+    keeps its last status), events the committed changes, already published
+    to `bus` if one is given.
+    """
+    wanted = {}
+    results = []
+    for flight_num, status in changes:
+        try:
+            flight_num = int(flight_num)
+        except (TypeError, ValueError):
+            results.append({"flight_num": flight_num, "status": status, "result": INVALID})
+            continue
+        status = (status or "").strip().lower()
+        if status not in STATUSES:
+            results.append({"flight_num": flight_num, "status": status, "result": INVALID})
+            continue
+        if flight_num not in wanted:
+            results.append({"flight_num": flight_num, "status": status, "result": None})
+        wanted[flight_num] = status
+
+    events = []
+    if wanted:
+        conn.begin()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT flight_num, status, departure_airport, arrival_airport
+                    FROM flight
+                    WHERE airline_name = %s AND flight_num IN %s
+                    FOR UPDATE
+                """, (airline_name, tuple(wanted)))
+                current = {row["flight_num"]: row for row in cur.fetchall()}
+
+                # one UPDATE per target status
+                by_status = {}
+                for flight_num, status in wanted.items():
+                    row = current.get(flight_num)
+                    if row is not None and row["status"] != status:
+                        by_status.setdefault(status, []).append(flight_num)
+                        events.append({
+                            "airline_name": airline_name,
+                            "flight_num": flight_num,
+                            "status": status,
+                            "previous": row["status"],
+                            "departure_airport": row["departure_airport"],
+                            "arrival_airport": row["arrival_airport"],
+                        })
+                for status, flight_nums in by_status.items():
+                    cur.execute("""
+                        UPDATE flight SET status = %s
+                        WHERE airline_name = %s AND flight_num IN %s
+                    """, (status, airline_name, tuple(flight_nums)))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        changed = {e["flight_num"] for e in events}
+        for r in results:
+            if r["result"] is None:
+                r["status"] = wanted[r["flight_num"]]
+                if r["flight_num"] not in current:
+                    r["result"] = NOT_FOUND
+                elif r["flight_num"] in changed:
+                    r["result"] = UPDATED
+                else:
+                    r["result"] = UNCHANGED
+
+    if bus is not None:
+        for event in events:
+            bus.publish(event)
+    return results, events
+
+
+def flight_key(airline_name, flight_num):
+    return (airline_name.lower(), int(flight_num))
+
+
+class BusFull(Exception):
+    """Raised by subscribe() when max_subscribers streams are already open."""
+
+
+class Subscription:
+    """Events for a set of flights (or a whole airline), read with get()."""
+
+    def __init__(self, bus, flights, airline, max_queue):
+        self._bus = bus
+        self.flights = flights
+        self.airline = airline
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+
+    def wants(self, event):
+        if self.airline is not None and event["airline_name"].lower() == self.airline:
+            return True
+        return flight_key(event["airline_name"], event["flight_num"]) in self.flights
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # a slow client loses its oldest event, never blocks a publisher
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(event)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class FlightEventBus:
+    """Process-wide fan-out of flight status events to subscriptions.
+
+    Events get increasing ids and the last `history` of them are kept, so a
+    reconnecting client can pass its Last-Event-ID and miss nothing recent.
+    """
+
+    def __init__(self, history=256, max_queue=100, max_subscribers=None):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subs = set()
+        self._history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.rejected = 0
+
+    def publish(self, event):
+        with self._lock:
+            event = dict(event, id=next(self._ids), time=time.time())
+            self._history.append(event)
+            self.published += 1
+            subs = [s for s in self._subs if s.wants(event)]
+        for sub in subs:
+            sub.put(event)
+        return event
+
+    def subscribe(self, flights=(), airline=None, last_event_id=None):
+        sub = Subscription(self, set(flights),
+                           airline.lower() if airline else None, self.max_queue)
+        with self._lock:
+            # each open stream holds a server thread until the client leaves
+            if self.max_subscribers is not None and len(self._subs) >= self.max_subscribers:
+                self.rejected += 1
+                raise BusFull(f"{self.max_subscribers} flight status streams already open")
+            self._subs.add(sub)
+            if last_event_id is not None:
+                for event in self._history:
+                    if event["id"] > last_event_id and sub.wants(event):
+                        sub.put(event)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subs),
+                "max_subscribers": self.max_subscribers,
+                "rejected": self.rejected,
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subs),
+            }
+
+
+def sse_stream(sub, heartbeat=15.0):
+    """Server-Sent Events text for a subscription, until the client leaves."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            event = sub.get(timeout=heartbeat)
+            if event is None:
+                # comment line: keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            yield (f"id: {event['id']}\nevent: status\n"
+                   f"data: {json.dumps(event, default=str)}\n\n")
+    finally:
+        sub.close()
@@ -0,0 +1,101 @@
+# fragment_cache.py : rendered template fragments, cached against the
+# version of the data they show
+#
+# A view looks a fragment up before running its queries:
+#
+#     fragment = fragments.lookup(scope, key_parts)
+#     if fragment.html is None: ...run the queries...
+#     render_template(..., fragment=fragment)
+#
+# and the template wraps the expensive block in {% cache fragment %} ...
+# {% endcache %}. A hit was fetched by lookup(), so the block is skipped
+# without a second trip to the cache; a miss renders the block and stores it.
+#
+# Key parts include data versions (DataVersions): a write bumps the version
+# of what it changed, so the next lookup misses and the stale HTML ages out.
+
+import hashlib
+import time
+from collections import namedtuple
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+Fragment = namedtuple("Fragment", "cache key html")
+
+
+class DataVersions:
+    """Version counters of the data behind cached fragments and ETags.
+
+    Counters live in a result_cache backend, so they are shared by every
+    worker when the backend is.
+    """
+
+    def __init__(self, backend, namespace="version"):
+        self.backend = backend
+        self.namespace = namespace
+
+    def get(self, *names):
+        return tuple(self.backend.counter(self._key(n)) for n in names)
+
+    def bump(self, *names):
+        for name in names:
+            self.backend.incr(self._key(name))
+
+    def first_served(self, etag, ttl):
+        """Unix time (whole seconds) this ETag was first sent, recorded now
+        if it is new; the Last-Modified of the version it names."""
+        key = self._key("served:" + etag)
+        served = self.backend.get(key)
+        if served is None:
+            served = int(time.time())
+            self.backend.set(key, served, ttl)
+        return served
+
+    def served(self, etag):
+        """When this ETag was first sent, or None if that is not known."""
+        return self.backend.get(self._key("served:" + etag))
+
+    def _key(self, name):
+        return f"{self.namespace}:{hashlib.sha1(name.encode()).hexdigest()}"
+
+
+class FragmentCache:
+    """HTML fragments stored in a result_cache.ResultCache."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def lookup(self, scope, key_parts):
+        # the key is fixed here, so a miss is stored under the versions it
+        # was looked up with, not whatever they are once it has rendered
+        key = self.cache.key(scope, key_parts)
+        return Fragment(self, key, self.cache.get(key))
+
+    def render(self, fragment, caller):
+        if fragment.html is not None:
+            return Markup(fragment.html)
+        html = caller()
+        self.cache.set(fragment.key, str(html))
+        return Markup(html)
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache fragment %} ... {% endcache %}; renders the block as is when
+    the fragment is None or undefined."""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        fragment = parser.parse_expression()
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render", [fragment]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, fragment, caller):
+        if not fragment:
+            return caller()
+        return fragment.cache.render(fragment, caller)
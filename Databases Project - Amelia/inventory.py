@@ -0,0 +1,81 @@
+# inventory.py : per flight / seat class seat counters (seat_inventory)
+
+# SQL fragment for search queries: seats left on flight `f` across all classes
+SEATS_REMAINING_SQL = """
+    (SELECT COALESCE(SUM(si.seats_remaining), 0)
+     FROM seat_inventory si
+     WHERE si.airline_name = f.airline_name
+       AND si.flight_num = f.flight_num)
+"""
+
+
+def create_inventory(cur, airline_name, flight_nums):
+    """Add the missing counter rows (one per seat class) for these flights."""
+    if not flight_nums:
+        return 0
+    cur.execute("""
+        INSERT IGNORE INTO seat_inventory
+        (airline_name, flight_num, seat_class_id, airplane_id, seat_capacity, seats_sold)
+        SELECT f.airline_name, f.flight_num, sc.seat_class_id,
+               f.airplane_id, sc.seat_capacity,
+               (SELECT COUNT(*)
+                FROM ticket t
+                WHERE t.airline_name = f.airline_name
+                  AND t.flight_num = f.flight_num
+                  AND t.seat_class_id = sc.seat_class_id)
+        FROM flight f
+        JOIN seat_class sc ON sc.airline_name = f.airline_name
+                          AND sc.airplane_id = f.airplane_id
+        WHERE f.airline_name = %s
+          AND f.flight_num IN %s
+    """, (airline_name, tuple(flight_nums)))
+    return cur.rowcount
+
+
+def rebuild_inventory(conn, airline_name=None):
+    """Reconcile seat_inventory against ticket and seat_class.
+
+    Adds missing rows and rewrites seat_capacity / seats_sold from the source
+    tables. Returns MySQL's affected-row count (1 per added row, 2 per
+    corrected row, 0 when nothing drifted). The rebuild runs in one
+    transaction and takes shared locks on the tickets it counts, so run it
+    off-peak.
+    """
+    sql = """
+        INSERT INTO seat_inventory
+        (airline_name, flight_num, seat_class_id, airplane_id, seat_capacity, seats_sold)
+        SELECT f.airline_name, f.flight_num, sc.seat_class_id,
+               f.airplane_id, sc.seat_capacity, COALESCE(t.sold, 0)
+        FROM flight f
+        JOIN seat_class sc ON sc.airline_name = f.airline_name
+                          AND sc.airplane_id = f.airplane_id
+        LEFT JOIN (
+            SELECT airline_name, flight_num, seat_class_id, COUNT(*) AS sold
+            FROM ticket
+            GROUP BY airline_name, flight_num, seat_class_id
+        ) t ON t.airline_name = f.airline_name
+           AND t.flight_num = f.flight_num
+           AND t.seat_class_id = sc.seat_class_id
+    """
+    params = []
+    if airline_name:
+        sql += " WHERE f.airline_name = %s"
+        params.append(airline_name)
+
+    sql += """
+        ON DUPLICATE KEY UPDATE
+            airplane_id = VALUES(airplane_id),
+            seat_capacity = VALUES(seat_capacity),
+            seats_sold = VALUES(seats_sold)
+    """
+
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            changed = cur.rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return changed
@@ -0,0 +1,137 @@
+# queries.py : read queries as data, so one page's queries can run on the
+# sync connection pool or on the async one (asgi.py) without being written
+# twice
+#
+# A page builds {name: Query} and gets back {name: rows} from either runner.
+# run_concurrently() fans independent queries out over several pooled
+# connections, so a page waits for its slowest query instead of their sum.
+
+import contextvars
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pymysql
+
+from config import DB_POOL_CONFIG, QUERY_FANOUT
+
+# fetch: "all" -> list of rows, "one" -> first row or None
+# prepared: run as a cached server-side prepared statement (flight_search.py);
+# the async runner has no prepared statements and runs it as plain text
+Query = namedtuple("Query", "sql params fetch prepared", defaults=((), "all", False))
+
+# seconds between checks on queries still queued for a thread or connection
+QUEUE_POLL = 0.05
+
+# "Query execution was interrupted, maximum statement execution time exceeded"
+ER_QUERY_TIMEOUT = 3024
+
+
+class QueryTimeout(Exception):
+    """Raised when fanned-out queries do not finish within their timeout."""
+
+
+def run_query(cur, query):
+    if query.prepared:
+        from flight_search import execute_search
+        execute_search(cur, query.sql, query.params)
+    else:
+        cur.execute(query.sql, query.params)
+    return cur.fetchone() if query.fetch == "one" else cur.fetchall()
+
+
+def run_queries(conn, queries):
+    """Run {name: Query} one after another on conn; returns {name: result}."""
+    with conn.cursor() as cur:
+        return {name: run_query(cur, q) for name, q in queries.items()}
+
+
+def run_concurrently(pool, queries, timeout=QUERY_FANOUT["timeout"]):
+    """Run {name: Query} at the same time, each on its own connection from
+    `pool`; returns {name: result}. One query runs on the calling thread,
+    the others on the process-wide bounded thread pool.
+
+    Raises QueryTimeout if any query is still running `timeout` seconds
+    after it got its connection; time spent queued for a thread or a
+    connection does not count.
+    """
+    queries = {name: time_limited(q, timeout) for name, q in queries.items()}
+    if len(queries) < 2:
+        return {name: _run_on_own_connection(pool, name, q) for name, q in queries.items()}
+
+    (here, query), *rest = queries.items()
+    executor = _executor()
+    started = {}    # name -> monotonic time the query got its connection
+    # each worker runs in a copy of the caller's context, so the queries are
+    # still counted against the request (sql_profiling.py)
+    futures = {
+        name: executor.submit(contextvars.copy_context().run,
+                              _run_on_own_connection, pool, name, q, started)
+        for name, q in rest
+    }
+    try:
+        results = {here: _run_on_own_connection(pool, here, query)}
+    except BaseException:
+        for future in futures.values():
+            future.cancel()
+        raise
+
+    pending = {f for f in futures.values() if not f.done()}
+    while pending:
+        now = time.monotonic()
+        running = [started[name] + timeout for name, f in futures.items()
+                   if f in pending and name in started]
+        late = sorted(name for name, f in futures.items()
+                      if f in pending and not f.done() and name in started
+                      and started[name] + timeout <= now)
+        if late:
+            for future in pending:
+                future.cancel()
+            raise QueryTimeout(f"queries still running after {timeout}s: {', '.join(late)}")
+        # queued queries have no deadline yet; look again soon for those
+        wait_for = min(running) - now if running else QUEUE_POLL
+        if len(running) < len(pending):
+            wait_for = min(wait_for, QUEUE_POLL)
+        _, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+    results.update((name, future.result()) for name, future in futures.items())
+    return results
+
+
+def time_limited(query, seconds):
+    """query with a MAX_EXECUTION_TIME hint, so the server gives up on it
+    too instead of running on after the page has stopped waiting."""
+    hinted = re.sub(r"^\s*SELECT\b",
+                    f"SELECT /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */",
+                    query.sql, count=1, flags=re.IGNORECASE)
+    return query._replace(sql=hinted)
+
+
+def _run_on_own_connection(pool, name, query, started=None):
+    try:
+        with pool.connection() as conn:
+            if started is not None:
+                started[name] = time.monotonic()
+            with conn.cursor() as cur:
+                return run_query(cur, query)
+    except pymysql.err.MySQLError as e:
+        if e.args and e.args[0] == ER_QUERY_TIMEOUT:
+            raise QueryTimeout(f"query {name} exceeded its time limit") from e
+        raise
+
+
+_executor_lock = threading.Lock()
+_pool = None
+
+
+def _executor():
+    global _pool
+    with _executor_lock:
+        if _pool is None:
+            # more threads than pooled connections would only wait on checkout
+            workers = QUERY_FANOUT["max_workers"] or DB_POOL_CONFIG["max_size"]
+            _pool = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix="query-fanout")
+        return _pool
@@ -0,0 +1,138 @@
+# reference_data.py : process-wide cache of airlines, airports, airplanes
+# and seat classes, which almost never change.
+#
+# Loaded when app.py is imported (warm(); on first use if that fails) and
+# reloaded after a write through refresh(). Other worker processes pick a
+# write up after max_age seconds, or sooner when a lookup misses (at most
+# once per miss_refresh_interval).
+
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class ReferenceData:
+
+    def __init__(self, pool, max_age=300, miss_refresh_interval=5):
+        self._pool = pool
+        self.max_age = max_age
+        self.miss_refresh_interval = miss_refresh_interval
+
+        self._lock = threading.Lock()
+        self._data = None
+        self._loaded_at = 0.0
+        self._last_miss_refresh = 0.0
+        self.loads = 0
+
+    # lookups
+
+    def airlines(self):
+        return self._get()["airlines"]
+
+    def airports(self):
+        """airport_name -> airport_city"""
+        return self._get()["airports"]
+
+    def has_airline(self, airline_name):
+        return self._has(lambda d: airline_name in d["airlines"])
+
+    def has_airport(self, airport_name):
+        # MySQL compares names case-insensitively, so do the same here
+        key = (airport_name or "").lower()
+        return self._has(lambda d: key in d["airport_keys"])
+
+    def has_airplane(self, airline_name, airplane_id):
+        key = ((airline_name or "").lower(), airplane_id)
+        return self._has(lambda d: key in d["airplanes"])
+
+    def seat_classes(self, airline_name, airplane_id):
+        """[{seat_class_id, seat_capacity, multiplier}, ...] for one airplane"""
+        key = ((airline_name or "").lower(), airplane_id)
+        return self._lookup(lambda d: d["seat_classes"].get(key, []))
+
+    # loading
+
+    def warm(self, connect):
+        """Load now, so the first request does not pay for it; a failure is
+        logged and the data then loads on first use.
+
+        Loads over a connection of its own, made by `connect` and closed
+        afterwards: warm() runs at import, and a pooled socket left open
+        there would be shared by every worker a pre-fork server forks.
+        """
+        try:
+            conn = connect()
+            try:
+                self._store(self._load(conn))
+            finally:
+                conn.close()
+        except Exception as e:
+            log.warning("reference data not loaded at startup: %s", e)
+
+    def refresh(self):
+        with self._pool.connection() as conn:
+            data = self._load(conn)
+        return self._store(data)
+
+    def _store(self, data):
+        with self._lock:
+            self._data = data
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        return data
+
+    def _get(self):
+        data = self._data
+        if data is None or time.monotonic() - self._loaded_at > self.max_age:
+            data = self.refresh()
+        return data
+
+    def _has(self, check):
+        return bool(self._lookup(check))
+
+    def _lookup(self, find):
+        found = find(self._get())
+        if found:
+            return found
+        # maybe another worker just added it; reload, but not on every miss
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_miss_refresh < self.miss_refresh_interval:
+                return found
+            self._last_miss_refresh = now
+        return find(self.refresh())
+
+    @staticmethod
+    def _load(conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT airline_name FROM airline ORDER BY airline_name")
+            airlines = [row["airline_name"] for row in cur.fetchall()]
+
+            cur.execute("SELECT airport_name, airport_city FROM airport")
+            airports = {row["airport_name"]: row["airport_city"] for row in cur.fetchall()}
+
+            cur.execute("SELECT airline_name, airplane_id FROM airplane")
+            airplanes = {
+                (row["airline_name"].lower(), row["airplane_id"])
+                for row in cur.fetchall()
+            }
+
+            cur.execute("""
+                SELECT airline_name, airplane_id, seat_class_id, seat_capacity, multiplier
+                FROM seat_class
+                ORDER BY airline_name, airplane_id, seat_class_id
+            """)
+            seat_classes = {}
+            for row in cur.fetchall():
+                key = (row.pop("airline_name").lower(), row.pop("airplane_id"))
+                seat_classes.setdefault(key, []).append(row)
+
+        return {
+            "airlines": airlines,
+            "airports": airports,
+            "airport_keys": {name.lower() for name in airports},
+            "airplanes": airplanes,
+            "seat_classes": seat_classes,
+        }
@@ -0,0 +1,290 @@
+# reservations.py : seat reservation engine shared by the purchase routes
+
+import random
+import threading
+import time
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+import pymysql
+
+from commission_ledger import record_commission
+from customer_spending import record_spend
+from inventory import create_inventory
+from sales_rollup import record_sale
+
+# MySQL error codes that mean "another buyer got in the way, try again"
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+RETRYABLE_ERRORS = (ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK)
+
+# purchases.purchase_price is decimal(10,0)
+PRICE_STEP = Decimal(1)
+
+# a lock wait longer than this counts as contention
+CONTENDED_LOCK_WAIT = 0.005
+
+
+class ReservationError(Exception):
+    """A purchase that cannot go through; str(e) is shown to the user."""
+
+
+class FlightNotFound(ReservationError):
+    def __init__(self):
+        super().__init__("Flight not found.")
+
+
+class SeatClassNotFound(ReservationError):
+    def __init__(self):
+        super().__init__("Seat class not found.")
+
+
+class SoldOut(ReservationError):
+    def __init__(self):
+        super().__init__("Sorry, no seats left in this class.")
+
+
+class AlreadyPurchased(ReservationError):
+    def __init__(self):
+        super().__init__("You already purchased a ticket for this flight.")
+
+
+class NotAuthorized(ReservationError):
+    def __init__(self):
+        super().__init__("Not authorized for this airline.")
+
+
+class CustomerNotFound(ReservationError):
+    def __init__(self):
+        super().__init__("No customer with that email.")
+
+
+class ReservationStats:
+    """Process-wide counters for the reservation engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.committed = 0
+        self.rejected = 0
+        self.retries = 0
+        self.deadlocks = 0
+        self.lock_wait_timeouts = 0
+        self.contended = 0
+        self.lock_wait_total = 0.0
+        self.lock_wait_max = 0.0
+
+    def record_lock_wait(self, seconds):
+        with self._lock:
+            self.lock_wait_total += seconds
+            self.lock_wait_max = max(self.lock_wait_max, seconds)
+            if seconds > CONTENDED_LOCK_WAIT:
+                self.contended += 1
+
+    def record_retry(self, errno):
+        with self._lock:
+            self.retries += 1
+            if errno == ER_LOCK_DEADLOCK:
+                self.deadlocks += 1
+            else:
+                self.lock_wait_timeouts += 1
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "committed": self.committed,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "deadlocks": self.deadlocks,
+                "lock_wait_timeouts": self.lock_wait_timeouts,
+                "contended": self.contended,
+                "lock_wait_total_ms": round(self.lock_wait_total * 1000, 3),
+                "lock_wait_max_ms": round(self.lock_wait_max * 1000, 3),
+            }
+
+
+stats = ReservationStats()
+
+
+def ticket_price(base_price, multiplier):
+    """base_price * multiplier as purchases.purchase_price stores it
+    (decimal(10,0), halves rounded up), so the rollups add the same value."""
+    price = Decimal(base_price) * Decimal(str(multiplier))
+    return price.quantize(PRICE_STEP, rounding=ROUND_HALF_UP)
+
+
+def reserve_seat(conn, ticket_ids, airline_name, flight_num, seat_class_id,
+                 customer_email, agent_email=None, check_duplicate=True,
+                 max_retries=3):
+    """Sell one seat and write ticket, purchase, the sales / spending rollups
+    and (for agent sales) the commission ledger in a single transaction.
+
+    The customer and the agent's authorization are checked first, without
+    locks. The seat is then taken with a conditional increment of the
+    seat_inventory counter, which locks that flight / class row until
+    commit, so two buyers can never both take the last seat and a refused
+    sale gives the seat back on rollback. The duplicate purchase check reads
+    committed tickets (bench/double_submit.py checks a double submit is
+    refused). Deadlocks and lock wait timeouts are retried up to
+    max_retries times. Returns a dict with ticket_id, purchase_price and
+    airplane_id; raises a ReservationError subclass when the sale is refused.
+    """
+    today = datetime.today().date()
+
+    for attempt in range(max_retries + 1):
+        stats.incr("attempts")
+        try:
+            conn.begin()
+            with conn.cursor() as cur:
+                sale = _reserve_once(
+                    cur, ticket_ids, airline_name, flight_num, seat_class_id,
+                    customer_email, agent_email, check_duplicate, today
+                )
+            conn.commit()
+            stats.incr("committed")
+            return sale
+
+        except ReservationError:
+            conn.rollback()
+            stats.incr("rejected")
+            raise
+
+        except pymysql.err.OperationalError as e:
+            conn.rollback()
+            errno = e.args[0] if e.args else None
+            if errno in RETRYABLE_ERRORS and attempt < max_retries:
+                stats.record_retry(errno)
+                # short jittered backoff so the retries do not collide again
+                time.sleep(random.uniform(0, 0.01 * (2 ** attempt)))
+                continue
+            raise
+
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def _reserve_once(cur, ticket_ids, airline_name, flight_num, seat_class_id,
+                  customer_email, agent_email, check_duplicate, today):
+
+    # buyer checks first, with plain reads: a refused sale takes no locks
+    cur.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM customer WHERE email = %s) AS customer,
+            (SELECT COUNT(*)
+             FROM agent_airline_authorization
+             WHERE agent_email = %s AND airline_name = %s) AS authorized
+    """, (customer_email, agent_email, airline_name))
+    buyer = cur.fetchone()
+    if not buyer["customer"]:
+        raise CustomerNotFound()
+    if agent_email is not None and not buyer["authorized"]:
+        raise NotAuthorized()
+
+    # take the seat: locks this flight / class counter until commit
+    started = time.monotonic()
+    taken = _take_seat(cur, airline_name, flight_num, seat_class_id)
+    stats.record_lock_wait(time.monotonic() - started)
+
+    if not taken:
+        if not _missing_inventory(cur, airline_name, flight_num, seat_class_id):
+            raise SoldOut()
+        # flight predates seat_inventory, create its counters and try again
+        create_inventory(cur, airline_name, [flight_num])
+        if not _take_seat(cur, airline_name, flight_num, seat_class_id):
+            raise SoldOut()
+
+    # price and duplicate purchase in one trip. The duplicate check is a
+    # locking read: the buyer check above fixed this transaction's snapshot,
+    # so a plain read would miss a ticket committed by a double submit that
+    # held the seat lock while we waited for it.
+    cur.execute("""
+        SELECT si.airplane_id, f.base_price, f.arrival_airport, sc.multiplier,
+            (SELECT COUNT(*)
+             FROM ticket t
+             JOIN purchases p USING(ticket_id)
+             WHERE p.customer_email = %s
+               AND t.airline_name = si.airline_name
+               AND t.flight_num = si.flight_num
+             FOR SHARE) AS already
+        FROM seat_inventory si
+        JOIN flight f ON f.airline_name = si.airline_name
+                     AND f.flight_num = si.flight_num
+        JOIN seat_class sc ON sc.airline_name = si.airline_name
+                          AND sc.airplane_id = si.airplane_id
+                          AND sc.seat_class_id = si.seat_class_id
+        WHERE si.airline_name = %s AND si.flight_num = %s
+          AND si.seat_class_id = %s
+    """, (customer_email, airline_name, flight_num, seat_class_id))
+    flight = cur.fetchone()
+
+    if check_duplicate and flight["already"] > 0:
+        raise AlreadyPurchased()
+
+    airplane_id = flight["airplane_id"]
+    purchase_price = ticket_price(flight["base_price"], flight["multiplier"])
+    ticket_id = ticket_ids.next_id()
+
+    cur.execute("""
+        INSERT INTO ticket (ticket_id, airline_name, flight_num, airplane_id, seat_class_id)
+        VALUES (%s,%s,%s,%s,%s)
+    """, (ticket_id, airline_name, flight_num, airplane_id, seat_class_id))
+
+    cur.execute("""
+        INSERT INTO purchases
+        (ticket_id, customer_email, booking_agent_email, purchase_date, purchase_price)
+        VALUES (%s,%s,%s,%s,%s)
+    """, (ticket_id, customer_email, agent_email, today, purchase_price))
+
+    record_sale(cur, airline_name, today, agent_email,
+                flight["arrival_airport"], seat_class_id, purchase_price)
+    record_spend(cur, customer_email, today, purchase_price)
+    if agent_email is not None:
+        record_commission(cur, ticket_id, agent_email, customer_email,
+                          airline_name, today, purchase_price)
+
+    return {
+        "ticket_id": ticket_id,
+        "purchase_price": purchase_price,
+        "airplane_id": airplane_id,
+    }
+
+
+def _take_seat(cur, airline_name, flight_num, seat_class_id):
+    cur.execute("""
+        UPDATE seat_inventory
+        SET seats_sold = seats_sold + 1
+        WHERE airline_name = %s AND flight_num = %s
+          AND seat_class_id = %s
+          AND seats_sold < seat_capacity
+    """, (airline_name, flight_num, seat_class_id))
+    return cur.rowcount == 1
+
+
+def _missing_inventory(cur, airline_name, flight_num, seat_class_id):
+    """Explain a failed _take_seat: True if the counter row does not exist.
+
+    Raises FlightNotFound / SeatClassNotFound when there is nothing to sell.
+    """
+    cur.execute("""
+        SELECT sc.seat_class_id, si.seats_sold
+        FROM flight f
+        LEFT JOIN seat_class sc ON sc.airline_name = f.airline_name
+                               AND sc.airplane_id = f.airplane_id
+                               AND sc.seat_class_id = %s
+        LEFT JOIN seat_inventory si ON si.airline_name = f.airline_name
+                                   AND si.flight_num = f.flight_num
+                                   AND si.seat_class_id = %s
+        WHERE f.airline_name = %s AND f.flight_num = %s
+    """, (seat_class_id, seat_class_id, airline_name, flight_num))
+    row = cur.fetchone()
+    if not row:
+        raise FlightNotFound()
+    if row["seat_class_id"] is None:
+        raise SeatClassNotFound()
+    return row["seats_sold"] is None
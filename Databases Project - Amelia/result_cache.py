@@ -0,0 +1,211 @@
+# result_cache.py : TTL + LRU result cache with pluggable backends
+#
+# Cache keys embed a "generation" number per invalidation scope. Invalidating
+# a scope just bumps its generation, so stale entries are never read again
+# and age out on their own. That works the same for the in-process backend
+# and for an external one shared by every worker.
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._counters = {}
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class ExternalBackend:
+    """Adapter for a memcached-style client (get / set / add / incr).
+
+    Values are pickled. Evictions happen inside the server, so they are not
+    counted here.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, pickle.dumps(value), expire=int(ttl))
+
+    def counter(self, key):
+        raw = self.client.get(key)
+        return 0 if raw is None else int(raw)
+
+    def incr(self, key):
+        value = self.client.incr(key, 1)
+        if value is None:
+            # first bump; add() loses to a concurrent add, then incr again
+            if not self.client.add(key, b"1", expire=0):
+                value = self.client.incr(key, 1)
+            else:
+                value = 1
+        return int(value)
+
+
+class LocalMemcache:
+    """Minimal in-process stand-in for a memcached client, for local runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}     # key -> (expires_at or None, bytes)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, expire=0):
+        with self._lock:
+            self._data[key] = (time.monotonic() + expire if expire else None, value)
+        return True
+
+    def add(self, key, value, expire=0):
+        if self.get(key) is not None:
+            return False
+        return self.set(key, value, expire)
+
+    def incr(self, key, delta):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value = int(entry[1]) + delta
+            self._data[key] = (entry[0], str(value).encode())
+            return value
+
+
+class ResultCache:
+    """Read-through cache: get_or_load(scope, key_parts, loader), or
+    key / get / set for callers that load the value themselves.
+
+    key() reads the scope's generation, so take it once, before loading, and
+    store under that key: a value loaded across an invalidation is then
+    filed under the old generation and never read.
+    """
+
+    def __init__(self, backend, ttl=30, namespace="cache"):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, scope, key_parts, loader):
+        key = self.key(scope, key_parts)
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def key(self, scope, key_parts):
+        """Backend key of key_parts under the scope's current generation."""
+        generation = self.generation(scope)
+        digest = _digest(repr(key_parts))
+        return f"{self.namespace}:{_digest(scope)}:{generation}:{digest}"
+
+    def get(self, key):
+        """Cached value or None; counts a hit or a miss."""
+        value = self.backend.get(key)
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self, *scopes):
+        for scope in scopes:
+            self.backend.incr(self._gen_key(scope))
+
+    def generation(self, scope):
+        """Number of times the scope was invalidated."""
+        return self.backend.counter(self._gen_key(scope))
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": self.backend.evictions,
+            "hit_ratio": round(hits / total, 4) if total else None,
+        }
+
+    def _gen_key(self, scope):
+        # hashed so any scope text is a valid memcached key
+        return f"{self.namespace}:gen:{_digest(scope)}"
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def make_backend(config):
+    """Backend named by config["backend"]: memory, local or memcached."""
+    kind = config.get("backend", "memory")
+    if kind == "memory":
+        return MemoryBackend(config.get("max_entries", 1024))
+    if kind == "local":
+        return ExternalBackend(LocalMemcache())
+    if kind == "memcached":
+        # optional dependency, only needed for a shared cache
+        from pymemcache.client.base import Client
+        host, _, port = config.get("server", "127.0.0.1:11211").partition(":")
+        return ExternalBackend(Client((host, int(port or 11211))))
+    raise ValueError(f"unknown cache backend: {kind}")
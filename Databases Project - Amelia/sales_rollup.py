@@ -0,0 +1,130 @@
+# sales_rollup.py : daily ticket sales per airline / agent / destination /
+# seat class (daily_sales), read by the staff analytics pages
+#
+# reservations.py adds each sale inside the purchase transaction, so the
+# rollup commits or rolls back with the ticket. rebuild_daily_sales()
+# recomputes it from purchases for backfills and reconciliation.
+#
+# Direct customer purchases have no agent; they are stored under agent ''
+# (the column is part of the primary key) and read back as NULL.
+
+import calendar
+
+from queries import Query
+
+
+def record_sale(cur, airline_name, sale_date, agent_email, arrival_airport,
+                seat_class_id, price):
+    cur.execute("""
+        INSERT INTO daily_sales
+        (airline_name, sale_date, agent_email, arrival_airport, seat_class_id,
+         tickets, revenue)
+        VALUES (%s,%s,%s,%s,%s,1,%s)
+        ON DUPLICATE KEY UPDATE
+            tickets = tickets + 1,
+            revenue = revenue + VALUES(revenue)
+    """, (airline_name, sale_date, agent_email or "", arrival_airport,
+          seat_class_id, price))
+
+
+def rebuild_daily_sales(conn, airline_name=None):
+    """Recompute daily_sales from purchases, in one transaction.
+
+    Returns the number of rollup rows written. Reads every purchase of the
+    airline(s), so run it off-peak.
+    """
+    where, params = "", []
+    if airline_name:
+        where = " WHERE t.airline_name = %s"
+        params.append(airline_name)
+
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            if airline_name:
+                cur.execute("DELETE FROM daily_sales WHERE airline_name = %s",
+                            (airline_name,))
+            else:
+                cur.execute("DELETE FROM daily_sales")
+            cur.execute("""
+                INSERT INTO daily_sales
+                (airline_name, sale_date, agent_email, arrival_airport,
+                 seat_class_id, tickets, revenue)
+                SELECT t.airline_name, p.purchase_date,
+                       COALESCE(p.booking_agent_email, ''), f.arrival_airport,
+                       t.seat_class_id, COUNT(*), SUM(p.purchase_price)
+                FROM purchases p
+                JOIN ticket t ON t.ticket_id = p.ticket_id
+                JOIN flight f ON f.airline_name = t.airline_name
+                             AND f.flight_num = t.flight_num
+            """ + where + """
+                GROUP BY t.airline_name, p.purchase_date,
+                         COALESCE(p.booking_agent_email, ''), f.arrival_airport,
+                         t.seat_class_id
+            """, params)
+            written = cur.rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return written
+
+
+def months_before(day, n):
+    """The same day n months earlier (clamped to month end), like
+    DATE_SUB(day, INTERVAL n MONTH)."""
+    month = day.month - n
+    year = day.year + (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return day.replace(year=year, month=month,
+                       day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+# Reports, as Query objects (see queries.py). Each reads at most one
+# airline's rows for the window, a few per day, however many tickets were
+# sold.
+
+def top_agents_by_tickets(airline_name, since, limit=5):
+    return Query("""
+        SELECT NULLIF(agent_email, '') AS booking_agent_email,
+               SUM(tickets) AS tickets
+        FROM daily_sales
+        WHERE airline_name = %s AND sale_date >= %s
+        GROUP BY agent_email
+        ORDER BY tickets DESC
+        LIMIT %s
+    """, (airline_name, since, limit))
+
+
+def top_agents_by_commission(airline_name, since, rate, limit=5):
+    return Query("""
+        SELECT NULLIF(agent_email, '') AS booking_agent_email,
+               SUM(revenue) * %s AS commission
+        FROM daily_sales
+        WHERE airline_name = %s AND sale_date >= %s
+        GROUP BY agent_email
+        ORDER BY commission DESC
+        LIMIT %s
+    """, (rate, airline_name, since, limit))
+
+
+def tickets_per_month(airline_name, since):
+    return Query("""
+        SELECT DATE_FORMAT(sale_date, '%%Y-%%m') AS month,
+               SUM(tickets) AS tickets
+        FROM daily_sales
+        WHERE airline_name = %s AND sale_date >= %s
+        GROUP BY month
+        ORDER BY month
+    """, (airline_name, since))
+
+
+def top_destinations(airline_name, since, limit=5):
+    return Query("""
+        SELECT arrival_airport, SUM(tickets) AS trips
+        FROM daily_sales
+        WHERE airline_name = %s AND sale_date >= %s
+        GROUP BY arrival_airport
+        ORDER BY trips DESC
+        LIMIT %s
+    """, (airline_name, since, limit))
@@ -0,0 +1,264 @@
+# schedule_import.py : bulk flight schedule import (CSV or JSON)
+#
+# Rows are checked in three steps: field formats in Python, then airports,
+# airplanes and already-used flight numbers with one set query each, then
+# the insert itself. Good rows go in with executemany batches inside one
+# transaction; a batch that hits a constraint or a value its column cannot
+# hold is retried row by row behind savepoints, so one bad row never takes
+# the rest of the schedule with it.
+
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+import pymysql
+
+from flight_status import STATUSES
+from inventory import create_inventory
+
+COLUMNS = ("flight_num", "departure_airport", "departure_time",
+           "arrival_airport", "arrival_time", "base_price", "airplane_id")
+
+INSERT_FLIGHT = """
+    INSERT INTO flight
+    (airline_name, flight_num, departure_airport, departure_time,
+     arrival_airport, arrival_time, base_price, status, airplane_id)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+"""
+
+
+# MySQL errors about a row's values that pymysql raises as OperationalError:
+# bad datetime / date value, wrong value for the column, out of range,
+# truncated, too long. Any other OperationalError is the connection's.
+ROW_DATA_ERRORS = (1292, 1366, 1264, 1265, 1406)
+
+
+class ScheduleFormatError(ValueError):
+    """The upload as a whole could not be read."""
+
+
+def parse_schedule(text, fmt):
+    """List of row dicts from CSV (with a header line) or a JSON array."""
+    if fmt == "json":
+        try:
+            return json_rows(json.loads(text))
+        except ValueError as e:
+            raise ScheduleFormatError(f"invalid JSON: {e}")
+
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [c for c in COLUMNS if c not in (reader.fieldnames or ())]
+    if missing:
+        raise ScheduleFormatError("CSV header is missing: " + ", ".join(missing))
+    return list(reader)
+
+
+def json_rows(data):
+    """Row dicts from decoded JSON: an array of objects, or {"flights": [...]}."""
+    if isinstance(data, dict):
+        data = data.get("flights")
+    if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+        raise ScheduleFormatError("JSON schedule must be an array of objects")
+    return data
+
+
+def import_schedule(conn, airline_name, rows, batch_size=500):
+    """Insert the valid rows as flights of airline_name.
+
+    Returns {"inserted": [flight dicts], "errors": [{"row", "flight_num",
+    "error"}]}, where "row" is the 1-based position in the upload.
+    """
+    errors = []
+    flights = []
+    seen = set()
+    for n, raw in enumerate(rows, start=1):
+        try:
+            flight = _clean(raw)
+        except ValueError as e:
+            errors.append(_error(n, raw.get("flight_num"), str(e)))
+            continue
+        if flight["flight_num"] in seen:
+            errors.append(_error(n, flight["flight_num"], "flight number repeated in this schedule"))
+            continue
+        seen.add(flight["flight_num"])
+        flight["row"] = n
+        flights.append(flight)
+
+    if not flights:
+        return {"inserted": [], "errors": errors}
+
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            flights = _check_references(cur, airline_name, flights, errors)
+            inserted = []
+            for i in range(0, len(flights), batch_size):
+                batch = flights[i:i + batch_size]
+                inserted += _insert_batch(cur, airline_name, batch, errors)
+            for i in range(0, len(inserted), batch_size):
+                create_inventory(cur, airline_name,
+                                 [f["flight_num"] for f in inserted[i:i + batch_size]])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    errors.sort(key=lambda e: e["row"])
+    return {"inserted": inserted, "errors": errors}
+
+
+# largest value flight.base_price (decimal(10,0)) holds
+MAX_PRICE = 10 ** 10 - 1
+
+
+def _clean(raw):
+    """The row as insert-ready values; ValueError saying what is wrong.
+
+    JSON rows can carry any type, so every field is checked for one."""
+    missing = [c for c in COLUMNS if raw.get(c) in (None, "")]
+    if missing:
+        raise ValueError("missing " + ", ".join(missing))
+    flight_num = _integer(raw["flight_num"], "flight_num")
+    airplane_id = _integer(raw["airplane_id"], "airplane_id")
+    base_price = _number(raw["base_price"], "base_price")
+    departure_time = _time(raw["departure_time"])
+    arrival_time = _time(raw["arrival_time"])
+    if arrival_time <= departure_time:
+        raise ValueError("arrival_time must be after departure_time")
+    if not 0 <= base_price <= MAX_PRICE:
+        raise ValueError(f"base_price must be between 0 and {MAX_PRICE}")
+    status = raw.get("status") or "upcoming"
+    if not isinstance(status, str) or status.strip().lower() not in STATUSES:
+        raise ValueError("status must be one of " + ", ".join(STATUSES))
+    return {
+        "flight_num": flight_num,
+        "departure_airport": _text(raw["departure_airport"], "departure_airport"),
+        "departure_time": departure_time,
+        "arrival_airport": _text(raw["arrival_airport"], "arrival_airport"),
+        "arrival_time": arrival_time,
+        "base_price": base_price,
+        "status": status.strip().lower(),
+        "airplane_id": airplane_id,
+    }
+
+
+def _integer(value, name):
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"{name} must be a whole number")
+
+
+def _number(value, name):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"{name} must be numeric")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be numeric") from None
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be numeric")
+    return number
+
+
+def _time(value):
+    try:
+        if not isinstance(value, str):
+            raise ValueError
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError("times must look like YYYY-MM-DD HH:MM:SS") from None
+
+
+def _text(value, name, max_length=50):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{name} must be text")
+    if len(value.strip()) > max_length:
+        raise ValueError(f"{name} is longer than {max_length} characters")
+    return value.strip()
+
+
+def _check_references(cur, airline_name, flights, errors):
+    """Drop (and report) rows whose airports, airplane or flight number do
+    not fit; one query per reference table."""
+    airports = {f["departure_airport"] for f in flights} | {f["arrival_airport"] for f in flights}
+    cur.execute("SELECT airport_name FROM airport WHERE airport_name IN %s",
+                (tuple(airports),))
+    known_airports = {row["airport_name"].lower() for row in cur.fetchall()}
+
+    cur.execute("""
+        SELECT airplane_id FROM airplane
+        WHERE airline_name = %s AND airplane_id IN %s
+    """, (airline_name, tuple({f["airplane_id"] for f in flights})))
+    known_airplanes = {row["airplane_id"] for row in cur.fetchall()}
+
+    cur.execute("""
+        SELECT flight_num FROM flight
+        WHERE airline_name = %s AND flight_num IN %s
+    """, (airline_name, tuple(f["flight_num"] for f in flights)))
+    taken = {row["flight_num"] for row in cur.fetchall()}
+
+    good = []
+    for f in flights:
+        unknown = [a for a in (f["departure_airport"], f["arrival_airport"])
+                   if a.lower() not in known_airports]
+        if unknown:
+            error = f"airport '{unknown[0]}' does not exist"
+        elif f["airplane_id"] not in known_airplanes:
+            error = "airplane does not belong to this airline"
+        elif f["flight_num"] in taken:
+            error = "flight number already exists"
+        else:
+            good.append(f)
+            continue
+        errors.append(_error(f["row"], f["flight_num"], error))
+    return good
+
+
+def _insert_batch(cur, airline_name, batch, errors):
+    cur.execute("SAVEPOINT schedule_batch")
+    try:
+        cur.executemany(INSERT_FLIGHT, [_values(airline_name, f) for f in batch])
+        return batch
+    except ROW_ERRORS as e:
+        if not _row_error(e):
+            raise
+        cur.execute("ROLLBACK TO SAVEPOINT schedule_batch")
+
+    # something changed under us since the checks, or a value the server
+    # will not store (a date out of range); find the rows that fail
+    inserted = []
+    for f in batch:
+        cur.execute("SAVEPOINT schedule_row")
+        try:
+            cur.execute(INSERT_FLIGHT, _values(airline_name, f))
+            inserted.append(f)
+        except ROW_ERRORS as e:
+            if not _row_error(e):
+                raise
+            cur.execute("ROLLBACK TO SAVEPOINT schedule_row")
+            errors.append(_error(f["row"], f["flight_num"], e.args[-1]))
+    return inserted
+
+
+ROW_ERRORS = (pymysql.err.IntegrityError, pymysql.err.DataError,
+              pymysql.err.OperationalError)
+
+
+def _row_error(e):
+    """True when the error is about the row, so the row can be reported."""
+    if isinstance(e, pymysql.err.OperationalError):
+        return (e.args[0] if e.args else None) in ROW_DATA_ERRORS
+    return True
+
+
+def _values(airline_name, f):
+    return (airline_name, f["flight_num"], f["departure_airport"], f["departure_time"],
+            f["arrival_airport"], f["arrival_time"], f["base_price"], f["status"],
+            f["airplane_id"])
+
+
+def _error(row, flight_num, message):
+    return {"row": row, "flight_num": flight_num, "error": message}
@@ -0,0 +1,219 @@
+# sql_profiling.py : per-statement timing, per-endpoint aggregates and a
+# slow-query log
+#
+# With SQL_PROFILING["enabled"], db.py hands out ProfilingCursor, so every
+# cur.execute in the app is timed without touching the routes. Statements
+# are grouped by their normalized text (see normalize()), and counted
+# against the endpoint of the request that ran them. The request is found
+# through a context variable, which queries.run_concurrently carries over
+# to its worker threads.
+#
+# A prepared search (flight_search.StatementCache) is reported, and
+# explained when slow, as the SELECT it executes, not as EXECUTE search_N.
+# asgi.py reports its aiomysql queries through observe(); those are not
+# explained, since EXPLAIN would need a second async round trip.
+
+import contextvars
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from pymysql.cursors import DictCursor
+
+from config import SQL_PROFILING
+
+log = logging.getLogger("sql.slow")
+
+# upper bounds (ms) of the statement duration histogram; the last is open
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_current = contextvars.ContextVar("sql_profile", default=None)
+
+
+def normalize(sql):
+    """Statement text used as the aggregation key: placeholders and literals
+    become ?, and lists of them (IN lists, multi-row VALUES) fold to one."""
+    sql = " ".join(sql.split())
+    # literals appear once pymysql has interpolated an executemany batch
+    sql = re.sub(r"'(?:[^'\\]|\\.|'')*'", "?", sql)
+    sql = re.sub(r"%s|\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\?(?:\s*,\s*\?)*\)(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))+", "(...)", sql)
+    sql = re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", sql)
+    # prepared statement names and their user variables
+    sql = re.sub(r"\bsearch_\d+", "search_N", sql)
+    return sql
+
+
+class RequestProfile:
+    """Statements run on behalf of one request."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self._lock = threading.Lock()   # fanned-out queries add concurrently
+        self.queries = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.seconds += seconds
+
+
+def begin_request(endpoint):
+    """Start counting statements for the current request."""
+    profile = RequestProfile(endpoint or "-")
+    _current.set(profile)
+    return profile
+
+
+def end_request():
+    profile = _current.get()
+    _current.set(None)
+    if profile is not None:
+        stats.record_request(profile)
+    return profile
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+        self.statements = {}    # normalized sql -> [count, seconds, max_seconds, rows]
+
+
+class SqlStats:
+    """Process-wide statement timings, per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.slow = 0
+
+    def record(self, endpoint, sql, seconds, rows):
+        with self._lock:
+            ep = self._endpoint(endpoint)
+            ep.queries += 1
+            ep.seconds += seconds
+            ep.histogram[bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+            entry = ep.statements.setdefault(sql, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += max(rows, 0)
+
+    def record_request(self, profile):
+        with self._lock:
+            self._endpoint(profile.endpoint).requests += 1
+
+    def record_slow(self):
+        with self._lock:
+            self.slow += 1
+
+    def snapshot(self, top=20):
+        with self._lock:
+            endpoints = {}
+            for name, ep in self._endpoints.items():
+                statements = sorted(ep.statements.items(), key=lambda kv: -kv[1][1])[:top]
+                endpoints[name] = {
+                    "requests": ep.requests,
+                    "queries": ep.queries,
+                    "db_ms": round(ep.seconds * 1000, 2),
+                    "queries_per_request": round(ep.queries / ep.requests, 2) if ep.requests else None,
+                    "histogram_ms": dict(zip(
+                        [f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"], ep.histogram)),
+                    "statements": [
+                        {
+                            "sql": sql,
+                            "count": count,
+                            "total_ms": round(total * 1000, 2),
+                            "avg_ms": round(total * 1000 / count, 3),
+                            "max_ms": round(longest * 1000, 2),
+                            "rows": rows,
+                        }
+                        for sql, (count, total, longest, rows) in statements
+                    ],
+                }
+            return {"slow_queries": self.slow, "endpoints": endpoints}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.slow = 0
+
+    def _endpoint(self, name):
+        ep = self._endpoints.get(name)
+        if ep is None:
+            ep = self._endpoints[name] = EndpointStats()
+        return ep
+
+
+stats = SqlStats()
+
+
+class ProfilingCursor(DictCursor):
+    """DictCursor that times each statement and reports it to `stats`.
+
+    executemany() goes through execute() too, once per batch or row.
+    """
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            self._profile(query, args, time.perf_counter() - started)
+
+    # (sql, args) of the prepared search an EXECUTE runs; set around the
+    # EXECUTE by flight_search.StatementCache
+    prepared_as = None
+
+    def _profile(self, query, args, seconds):
+        if self.prepared_as is not None:
+            query, args = self.prepared_as
+        endpoint, slow = observe(query, seconds, self.rowcount)
+        if slow:
+            self._log_slow(endpoint, query, args, seconds)
+
+    def _log_slow(self, endpoint, query, args, seconds):
+        statement = self.mogrify(query, args)
+        plan = None
+        if SQL_PROFILING["explain_slow"] and statement.lstrip()[:6].upper() == "SELECT":
+            try:
+                # plain cursor: the EXPLAIN itself is not profiled
+                with self.connection.cursor(DictCursor) as cur:
+                    cur.execute("EXPLAIN " + statement)
+                    plan = cur.fetchall()
+            except Exception as e:
+                plan = f"EXPLAIN failed: {e}"
+        log_slow(endpoint, statement, seconds, plan)
+
+
+def observe(sql, seconds, rows):
+    """Count one statement against the current request.
+
+    Returns (endpoint, whether it was slow); the caller logs a slow one.
+    """
+    profile = _current.get()
+    endpoint = profile.endpoint if profile is not None else "-"
+    if profile is not None:
+        profile.add(seconds)
+    stats.record(endpoint, normalize(sql), seconds, rows)
+
+    slow = seconds * 1000 >= SQL_PROFILING["slow_query_ms"]
+    if slow:
+        stats.record_slow()
+    return endpoint, slow
+
+
+def log_slow(endpoint, statement, seconds, plan=None):
+    log.warning("slow query %.1f ms in %s: %s\nEXPLAIN: %s",
+                seconds * 1000, endpoint, " ".join(statement.split()), plan)
+
+
+def cursor_class():
+    """Cursor class for new connections."""
+    return ProfilingCursor if SQL_PROFILING["enabled"] else DictCursor
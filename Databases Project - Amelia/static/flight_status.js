@@ -0,0 +1,34 @@
+// flight_status.js : live status updates for tables with
+// <td data-flight="Airline:123"> status cells, from /events/flights
+(function () {
+    var cells = document.querySelectorAll("td[data-flight]");
+    if (!cells.length || !window.EventSource) {
+        return;
+    }
+    var url = document.currentScript.dataset.url;
+    // a server with all its streams open answers 503, which the browser
+    // does not retry on its own (see FLIGHT_EVENTS in config.py)
+    var retryAfter = 30000;
+
+    function onStatus(e) {
+        var event = JSON.parse(e.data);
+        var key = event.airline_name + ":" + event.flight_num;
+        cells.forEach(function (cell) {
+            if (cell.dataset.flight.toLowerCase() === key.toLowerCase()) {
+                cell.textContent = event.status;
+            }
+        });
+    }
+
+    function connect() {
+        var source = new EventSource(url);
+        source.addEventListener("status", onStatus);
+        source.onerror = function () {
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, retryAfter * (1 + Math.random()));
+            }
+        };
+    }
+
+    connect();
+})();
@@ -0,0 +1,58 @@
+# ticket_ids.py : hands out ticket ids from blocks reserved in ticket_sequence
+
+import threading
+
+
+class TicketIdAllocator:
+    """Process-local ticket id allocator.
+
+    Each worker reserves `block_size` ids at a time by bumping the
+    ticket_sequence row, then serves them from memory, so a purchase never
+    scans `ticket` and two workers can never be handed the same id. Ids left
+    in a block when the worker exits are simply skipped.
+    """
+
+    def __init__(self, connect, block_size=100, sequence="ticket"):
+        self._connect = connect
+        self.block_size = block_size
+        self.sequence = sequence
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._next = 0
+        self._end = 0       # exclusive
+        self.blocks_reserved = 0
+
+    def next_id(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            ticket_id = self._next
+            self._next += 1
+            return ticket_id
+
+    def _reserve_block(self):
+        # Runs on a private autocommit connection so the reservation is
+        # committed at once and never rolled back with a failed purchase.
+        if self._conn is None:
+            self._conn = self._connect()
+        else:
+            self._conn.ping(reconnect=True)
+
+        with self._conn.cursor() as cur:
+            # LAST_INSERT_ID(expr) hands the new value back in the OK packet
+            cur.execute("""
+                UPDATE ticket_sequence
+                SET next_id = LAST_INSERT_ID(next_id + %s)
+                WHERE name = %s
+            """, (self.block_size, self.sequence))
+            if cur.rowcount == 0:
+                raise RuntimeError(
+                    f"ticket_sequence has no '{self.sequence}' row; "
+                    "run the migration in air_reservation.sql"
+                )
+            end = cur.lastrowid
+
+        self._next = end - self.block_size
+        self._end = end
+        self.blocks_reserved += 1